@@ -0,0 +1,124 @@
+import json
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+def content_key(*parts) -> str:
+    """Stable content hash for any JSON-serialisable key parts."""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """
+    Two-tier cache: an in-memory LRU bounded by (approximate) bytes, optionally
+    backed by a SQLite file that survives restarts.
+
+    Values must be JSON-serialisable. Entries are tagged with `version`; rows
+    written under another version are dropped when the cache is opened or the
+    version changes, so bumping it (e.g. rebuilding the index) invalidates everything.
+    `version=None` means "not known yet": call set_version() before using the cache.
+    """
+
+    def __init__(self, name: str, max_bytes: int, disk_path: str = None, version: str = ""):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.version = version
+        self._items = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db = None
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(name TEXT, key TEXT, version TEXT, value TEXT, PRIMARY KEY (name, key))"
+            )
+            self._drop_other_versions()
+
+    def _drop_other_versions(self):
+        if self._db is not None and self.version is not None:
+            self._db.execute("DELETE FROM cache WHERE name = ? AND version != ?", (self.name, self.version))
+            self._db.commit()
+
+    def set_version(self, version: str):
+        """Switches to `version`; everything cached under another version is dropped."""
+        if version == self.version:
+            return
+        with self._lock:
+            if version == self.version:
+                return
+            self.version = version
+            self._items.clear()
+            self._bytes = 0
+            self._drop_other_versions()
+
+    def _remember(self, key, value, size):
+        if key in self._items:
+            self._bytes -= self._items.pop(key)[1]
+        self._items[key] = (value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes and self._items:
+            _, (_, old_size) = self._items.popitem(last=False)
+            self._bytes -= old_size
+            self.evictions += 1
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key][0]
+
+            if self._db is not None:
+                # Another process sharing the file may still write rows of an older version
+                row = self._db.execute(
+                    "SELECT value FROM cache WHERE name = ? AND key = ? AND version = ?",
+                    (self.name, key, self.version),
+                ).fetchone()
+                if row:
+                    self.disk_hits += 1
+                    value = json.loads(row[0])
+                    self._remember(key, value, len(row[0]))
+                    return value
+
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        raw = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, value, len(raw))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (name, key, version, value) VALUES (?, ?, ?, ?)",
+                    (self.name, key, self.version, raw),
+                )
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache WHERE name = ?", (self.name,))
+                self._db.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._items),
+            "bytes": self._bytes,
+            "version": self.version,
+        }
@@ -0,0 +1,188 @@
+import os
+import time
+import asyncio
+import logging
+
+from pydantic import BaseModel
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from . import schema
+from .workflow import rubric_workflow, eval_workflow, EVAL_MAX_CONCURRENCY
+
+logger = logging.getLogger("checkpoints")
+
+# --- Resumable Graph Runs ---
+# Requests that carry an Idempotency-Key run on graphs compiled with a SQLite
+# checkpointer, one thread per (key, request fingerprint). LangGraph saves state after
+# every step and keeps the writes of tasks that finished inside a failed step, so a
+# retry re-runs only what failed: if one of the three grading runs raised, the other two
+# are not paid for again. A retry of a finished run returns the stored result.
+#
+# Threads are not kept forever: one untouched for CHECKPOINT_TTL_SECONDS is deleted (checked
+# at most every CHECKPOINT_PRUNE_SECONDS), and job workers forget a task's threads as soon
+# as its result is stored in the job queue.
+
+CHECKPOINT_DB = os.environ.get(
+    "CHECKPOINT_DB",
+    os.path.join(os.path.dirname(__file__), "..", "checkpoints.db"),
+)
+CHECKPOINT_TTL_SECONDS = float(os.environ.get("CHECKPOINT_TTL_SECONDS", 24 * 3600))
+CHECKPOINT_PRUNE_SECONDS = float(os.environ.get("CHECKPOINT_PRUNE_SECONDS", 600))
+
+# Last use of every thread, next to LangGraph's own tables
+THREADS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS thread_activity (
+    thread_id TEXT PRIMARY KEY,
+    key TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS thread_activity_key ON thread_activity (key);
+CREATE INDEX IF NOT EXISTS thread_activity_age ON thread_activity (updated_at);
+"""
+
+GRAPHS = {
+    "rubric": (rubric_workflow, {}),
+    "evaluate": (eval_workflow, {"max_concurrency": EVAL_MAX_CONCURRENCY}),
+}
+
+# Our state holds schema models; allow exactly those to be restored from a checkpoint
+SERDE = JsonPlusSerializer(allowed_msgpack_modules=[
+    (obj.__module__, obj.__name__)
+    for obj in vars(schema).values()
+    if isinstance(obj, type) and issubclass(obj, BaseModel) and obj.__module__ == schema.__name__
+])
+
+# The aiosqlite connection (and the saver's lock) belong to one event loop. The API and
+# each worker run a single loop; keeping them per loop also covers tests and tools
+# that start a fresh loop per call. aiosqlite runs each connection on a non-daemon
+# thread, so a loop that opened a saver must call close_savers() before it ends or the
+# process never exits.
+_loops = {}  # loop -> {"saver": Task, "apps": {}, "inflight": {}, "pruned_at": float}
+
+
+async def _open_saver():
+    # Imported here: only requests with an Idempotency-Key (and job workers) need it
+    import aiosqlite
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    conn = await aiosqlite.connect(CHECKPOINT_DB)
+    saver = AsyncSqliteSaver(conn, serde=SERDE)
+    await saver.setup()
+    await conn.executescript(THREADS_SCHEMA)
+    await conn.commit()
+    return saver
+
+
+def _loop_state() -> dict:
+    loop = asyncio.get_running_loop()
+    state = _loops.get(loop)
+    if state is None:
+        state = {"saver": loop.create_task(_open_saver()), "apps": {}, "inflight": {}, "pruned_at": 0.0}
+        _loops[loop] = state
+    return state
+
+
+async def close_savers():
+    """Closes the checkpoint connection opened on the running loop (API shutdown, worker exit)."""
+    state = _loops.pop(asyncio.get_running_loop(), None)
+    if state is None:
+        return
+    for task in list(state["inflight"].values()):
+        task.cancel()
+    try:
+        saver = await state["saver"]
+    except Exception:
+        # Never opened, so there is nothing to close
+        return
+    await saver.conn.close()
+
+
+# Statements on the saver's connection take its lock, so they never land inside one of
+# the saver's own transactions.
+
+async def _delete_threads(saver, where: str, params: tuple) -> int:
+    async with saver.lock, saver.conn.execute(f"SELECT thread_id FROM thread_activity WHERE {where}", params) as cur:
+        thread_ids = [row[0] for row in await cur.fetchall()]
+    for thread_id in thread_ids:
+        await saver.adelete_thread(thread_id)
+        async with saver.lock:
+            await saver.conn.execute("DELETE FROM thread_activity WHERE thread_id = ?", (thread_id,))
+            await saver.conn.commit()
+    return len(thread_ids)
+
+
+async def prune_checkpoints(max_age: float = None) -> int:
+    """Deletes the threads not used for `max_age` seconds (CHECKPOINT_TTL_SECONDS); returns how many."""
+    state = _loop_state()
+    state["pruned_at"] = time.time()
+    saver = await asyncio.shield(state["saver"])
+    cutoff = time.time() - (CHECKPOINT_TTL_SECONDS if max_age is None else max_age)
+    inflight = list(state["inflight"])
+    placeholders = ",".join("?" * len(inflight))
+    where = "updated_at < ?" + (f" AND thread_id NOT IN ({placeholders})" if inflight else "")
+    pruned = await _delete_threads(saver, where, (cutoff, *inflight))
+    if pruned:
+        logger.info(f"🧹 Pruned {pruned} Checkpoint Thread(s)...")
+    return pruned
+
+
+async def forget(key: str) -> int:
+    """Deletes every thread run under `key` (both graphs), once its result is stored elsewhere."""
+    saver = await asyncio.shield(_loop_state()["saver"])
+    return await _delete_threads(saver, "key = ?", (key,))
+
+
+async def _touch(thread_id: str, key: str):
+    state = _loop_state()
+    saver = await asyncio.shield(state["saver"])
+    async with saver.lock:
+        await saver.conn.execute(
+            "INSERT INTO thread_activity (thread_id, key, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(thread_id) DO UPDATE SET updated_at = excluded.updated_at",
+            (thread_id, key, time.time()),
+        )
+        await saver.conn.commit()
+    if time.time() - state["pruned_at"] > CHECKPOINT_PRUNE_SECONDS:
+        await prune_checkpoints()
+
+
+async def _durable_app(name: str):
+    state = _loop_state()
+    app = state["apps"].get(name)
+    if app is None:
+        builder, _ = GRAPHS[name]
+        app = builder.compile(checkpointer=await asyncio.shield(state["saver"]))
+        state["apps"][name] = app
+    return app
+
+
+async def _run(name: str, state: dict, key: str, thread_id: str):
+    await _touch(thread_id, key)
+    app = await _durable_app(name)
+    config = {"configurable": {"thread_id": thread_id}, **GRAPHS[name][1]}
+
+    snapshot = await app.aget_state(config)
+    if snapshot.values and not snapshot.next:
+        logger.info(f"♻️ Replaying Stored Result ({thread_id})...")
+        return snapshot.values, True
+    if snapshot.next:
+        logger.info(f"⏯️ Resuming {name} at {list(snapshot.next)} ({thread_id})...")
+        return await app.ainvoke(None, config), False
+    return await app.ainvoke(state, config), False
+
+
+async def resumable_invoke(name: str, state: dict, key: str, fingerprint: str):
+    """
+    Runs graph `name` ("rubric" or "evaluate") checkpointed under `key`.
+    Returns (final state, replayed) where `replayed` means the stored result was returned.
+    `fingerprint` identifies the request body, so a key reused for a different request
+    starts a new run instead of returning someone else's result.
+    """
+    thread_id = f"{name}:{key}:{fingerprint}"
+    inflight = _loop_state()["inflight"]
+    task = inflight.get(thread_id)
+    if task is None:
+        task = asyncio.ensure_future(_run(name, state, key, thread_id))
+        inflight[thread_id] = task
+        task.add_done_callback(lambda _: inflight.pop(thread_id, None))
+    return await asyncio.shield(task)
@@ -0,0 +1,134 @@
+import os
+import re
+import zlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from .schema import ConsensusReport
+
+# --- Grading Result Cache ---
+# Keyed on (rubric identity, normalised student answer). Identical answers reuse the
+# earlier ConsensusReport; near-identical ones (MinHash over character shingles) can
+# be reused as well, or reused and flagged for a teacher to review.
+#
+# Normalising only folds case, whitespace and sentence punctuation. Signs, relations and
+# other math symbols are kept ("-10 m/s" is not "10 m/s", "a > b" is not "a < b"), and a
+# near-duplicate must carry exactly the same numbers and symbols as the cached answer.
+
+GRADE_CACHE_RUBRICS = int(os.environ.get("GRADE_CACHE_RUBRICS", 200))        # rubrics kept
+GRADE_CACHE_PER_RUBRIC = int(os.environ.get("GRADE_CACHE_PER_RUBRIC", 500))  # answers kept per rubric
+NEAR_DUP_MODE = os.environ.get("NEAR_DUP_MODE", "off")                       # off | reuse | flag
+NEAR_DUP_THRESHOLD = float(os.environ.get("NEAR_DUP_THRESHOLD", 0.9))        # estimated Jaccard
+NUM_PERM = 64
+SHINGLE = 5
+
+_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(7)
+_A = _rng.randint(1, 2**31 - 1, NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, 2**31 - 1, NUM_PERM).astype(np.uint64)
+
+
+# Full stops and commas, except inside numbers (9.8, 1,000), and the other sentence marks
+_SENTENCE_PUNCT = re.compile(r"(?<!\d)[.,]|[.,](?!\d)|[;:!?\"'`\u2018\u2019\u201c\u201d]")
+# Signed numbers and single symbols: what a near-duplicate may not change
+_MATH_TOKENS = re.compile(r"[-+\u2212]?\d+(?:[.,]\d+)*|[^\w\s]")
+
+
+def normalize_answer(text: str) -> str:
+    text = _SENTENCE_PUNCT.sub(" ", text.casefold())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def math_tokens(norm: str) -> tuple:
+    """Numbers (with their sign) and symbols of a normalised answer, in order."""
+    return tuple(_MATH_TOKENS.findall(norm))
+
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature of the character shingles of an (already normalised) answer."""
+    shingles = {text[i:i + SHINGLE] for i in range(max(len(text) - SHINGLE + 1, 1))}
+    h = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((np.outer(h, _A) + _B) % _PRIME).min(axis=0)
+
+
+class GradeCache:
+    def __init__(self, max_rubrics: int, per_rubric: int, near_dup_mode: str = "off", threshold: float = 0.9):
+        self.max_rubrics = max_rubrics
+        self.per_rubric = per_rubric
+        self.near_dup_mode = near_dup_mode
+        self.threshold = threshold
+        self._rubrics = OrderedDict()  # rubric_id -> OrderedDict(norm_answer -> (report_dict, signature, math_tokens))
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def get(self, rubric_id: str, student_ans: str) -> Optional[ConsensusReport]:
+        norm = normalize_answer(student_ans)
+        with self._lock:
+            entries = self._rubrics.get(rubric_id)
+            if entries is None:
+                self.misses += 1
+                return None
+            self._rubrics.move_to_end(rubric_id)
+
+            if norm in entries:
+                entries.move_to_end(norm)
+                self.exact_hits += 1
+                report = ConsensusReport.model_validate(entries[norm][0])
+                report.cache_hit = "exact"
+                return report
+
+            tokens = math_tokens(norm)
+            keys = [k for k, entry in entries.items() if entry[2] == tokens] if self.near_dup_mode != "off" else []
+            if keys:
+                sigs = np.stack([entries[k][1] for k in keys])
+                similarity = (sigs == minhash(norm)).mean(axis=1)
+                best = int(similarity.argmax())
+                if similarity[best] >= self.threshold:
+                    self.near_hits += 1
+                    report = ConsensusReport.model_validate(entries[keys[best]][0])
+                    report.cache_hit = "near_duplicate"
+                    if self.near_dup_mode == "flag":
+                        report.hitl_flag = True
+                    return report
+
+            self.misses += 1
+            return None
+
+    def put(self, rubric_id: str, student_ans: str, report: ConsensusReport):
+        norm = normalize_answer(student_ans)
+        signature = minhash(norm) if self.near_dup_mode != "off" else None
+        with self._lock:
+            entries = self._rubrics.setdefault(rubric_id, OrderedDict())
+            self._rubrics.move_to_end(rubric_id)
+            entries[norm] = (report.model_dump(), signature, math_tokens(norm))
+            entries.move_to_end(norm)
+            while len(entries) > self.per_rubric:
+                entries.popitem(last=False)
+            while len(self._rubrics) > self.max_rubrics:
+                self._rubrics.popitem(last=False)
+
+    def evict_rubric(self, rubric_id: str) -> int:
+        """Drops every cached grade for one rubric; returns how many were dropped."""
+        with self._lock:
+            entries = self._rubrics.pop(rubric_id, None)
+            return len(entries) if entries else 0
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.near_hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "near_duplicate_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.near_hits) / lookups, 4) if lookups else 0.0,
+            "rubrics": len(self._rubrics),
+            "answers": sum(len(e) for e in self._rubrics.values()),
+            "near_dup_mode": self.near_dup_mode,
+        }
+
+
+grade_cache = GradeCache(GRADE_CACHE_RUBRICS, GRADE_CACHE_PER_RUBRIC, NEAR_DUP_MODE, NEAR_DUP_THRESHOLD)
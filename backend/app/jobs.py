@@ -0,0 +1,261 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from typing import Optional, List
+
+from .schema import GradingJobRequest
+from .providers import providers
+
+# --- Durable Job Queue ---
+# A grading session is one job with one task per (question, student). Tasks are
+# claimed by worker processes (app.worker) under a lease; a worker that dies simply
+# lets its lease expire and another worker picks the task up. Only the worker holding
+# the lease can record progress, so a slow worker whose task was re-claimed cannot
+# overwrite the new owner's state. Finished tasks keep their result, and a task that
+# already produced its rubric remembers the rubric_id, so nothing that completed is
+# ever redone.
+
+JOBS_DB = os.environ.get("JOBS_DB", os.path.join(os.path.dirname(__file__), "..", "jobs.db"))
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", 120))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,              -- queued | cancelled (progress is derived from tasks)
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    status TEXT NOT NULL,              -- pending | running | done | failed | cancelled
+    payload TEXT NOT NULL,
+    rubric_id TEXT,                    -- checkpoint: set once the rubric step is done
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    PRIMARY KEY (job_id, seq)
+);
+CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (status, lease_until);
+"""
+
+
+def open_jobs_db(db_path: str) -> sqlite3.Connection:
+    db = sqlite3.connect(db_path, check_same_thread=False, timeout=30, isolation_level=None)
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA journal_mode=WAL")
+    db.executescript(SCHEMA)
+    return db
+
+
+class JobQueue:
+    """`db()` returns the SQLite connection; it is called on first use, not at import."""
+
+    def __init__(self, db):
+        self._connect = db
+        self._lock = threading.Lock()
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        return self._connect()
+
+    # --- API side ---
+
+    def submit(self, request: GradingJobRequest) -> dict:
+        job_id = "job_" + uuid.uuid4().hex[:16]
+        now = time.time()
+        rows = []
+        for q_index, question in enumerate(request.questions):
+            rubric_request = question.model_dump(exclude={"answers", "rubric_id"})
+            for answer in question.answers:
+                payload = {
+                    "question_index": q_index,
+                    "student_id": answer.student_id,
+                    "student_ans": answer.student_ans,
+                    "rubric_request": {**rubric_request, "student_ans": answer.student_ans},
+                }
+                rows.append((job_id, len(rows), json.dumps(payload), question.rubric_id))
+
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute(
+                "INSERT INTO jobs (job_id, status, created_at, updated_at) VALUES (?, 'queued', ?, ?)",
+                (job_id, now, now),
+            )
+            self._db.executemany(
+                "INSERT INTO tasks (job_id, seq, status, payload, rubric_id) VALUES (?, ?, 'pending', ?, ?)", rows
+            )
+            self._db.execute("COMMIT")
+        return {"job_id": job_id, "total": len(rows)}
+
+    def status(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._db.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            counts = dict(self._db.execute(
+                "SELECT status, COUNT(*) FROM tasks WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall())
+
+        total = sum(counts.values())
+        finished = counts.get("done", 0) + counts.get("failed", 0) + counts.get("cancelled", 0)
+        if job["status"] == "cancelled":
+            status = "cancelled"
+        elif finished == total:
+            status = "completed"
+        elif counts.get("running") or finished:
+            status = "running"
+        else:
+            status = "queued"
+        return {
+            "job_id": job_id,
+            "status": status,
+            "total": total,
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "cancelled": counts.get("cancelled", 0),
+            "running": counts.get("running", 0),
+            "pending": counts.get("pending", 0),
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"],
+        }
+
+    def results(self, job_id: str, offset: int = 0, limit: int = 50) -> List[dict]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT seq, status, payload, rubric_id, result, error FROM tasks "
+                "WHERE job_id = ? ORDER BY seq LIMIT ? OFFSET ?",
+                (job_id, limit, offset),
+            ).fetchall()
+        items = []
+        for row in rows:
+            payload = json.loads(row["payload"])
+            items.append({
+                "seq": row["seq"],
+                "question_index": payload["question_index"],
+                "student_id": payload["student_id"],
+                "status": row["status"],
+                "rubric_id": row["rubric_id"],
+                "report": json.loads(row["result"]) if row["result"] else None,
+                "error": row["error"],
+            })
+        return items
+
+    def cancel(self, job_id: str) -> bool:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            cur = self._db.execute(
+                "UPDATE jobs SET status = 'cancelled', updated_at = ? WHERE job_id = ? AND status != 'cancelled'",
+                (time.time(), job_id),
+            )
+            # Running tasks finish (their LLM calls are already paid for); queued ones never start,
+            # and neither do running ones whose worker is gone (lease expired)
+            self._db.execute(
+                "UPDATE tasks SET status = 'cancelled' WHERE job_id = ? "
+                "AND (status = 'pending' OR (status = 'running' AND lease_until < ?))",
+                (job_id, time.time()),
+            )
+            self._db.execute("COMMIT")
+            return cur.rowcount > 0
+
+    # --- Worker side ---
+
+    def claim(self, worker: str) -> Optional[dict]:
+        """Leases the next pending task (or one whose worker's lease expired)."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            # Tasks of cancelled jobs are never re-claimed: once their worker is gone, they are cancelled
+            self._db.execute(
+                "UPDATE tasks SET status = 'cancelled' WHERE status = 'running' AND lease_until < ? "
+                "AND job_id IN (SELECT job_id FROM jobs WHERE status = 'cancelled')",
+                (now,),
+            )
+            while True:
+                row = self._db.execute(
+                    "SELECT t.job_id, t.seq, t.payload, t.rubric_id, t.attempts FROM tasks t "
+                    "JOIN jobs j ON j.job_id = t.job_id "
+                    "WHERE j.status != 'cancelled' AND (t.status = 'pending' OR (t.status = 'running' AND t.lease_until < ?)) "
+                    "ORDER BY j.created_at, t.seq LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None or row["attempts"] < JOB_MAX_ATTEMPTS:
+                    break
+                # Its workers kept dying: give up on it and look at the next one
+                self._db.execute(
+                    "UPDATE tasks SET status = 'failed', error = COALESCE(error, 'Worker lost') WHERE job_id = ? AND seq = ?",
+                    (row["job_id"], row["seq"]),
+                )
+            if row is not None:
+                self._db.execute(
+                    "UPDATE tasks SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1 "
+                    "WHERE job_id = ? AND seq = ?",
+                    (worker, now + JOB_LEASE_SECONDS, row["job_id"], row["seq"]),
+                )
+            self._db.execute("COMMIT")
+        if row is None:
+            return None
+        return {
+            "job_id": row["job_id"],
+            "seq": row["seq"],
+            "worker": worker,
+            "payload": json.loads(row["payload"]),
+            "rubric_id": row["rubric_id"],
+            "attempts": row["attempts"] + 1,
+        }
+
+    def renew(self, worker: str):
+        """Heartbeat: extends the lease of every task this worker is running."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE tasks SET lease_until = ? WHERE worker = ? AND status = 'running'",
+                (time.time() + JOB_LEASE_SECONDS, worker),
+            )
+
+    # The updates below only apply while `worker` still holds the task's lease; they
+    # return False when it was lost (the task was re-claimed, or its job cancelled).
+    _LEASED = "WHERE job_id = ? AND seq = ? AND worker = ? AND status = 'running'"
+
+    def checkpoint_rubric(self, job_id: str, seq: int, worker: str, rubric_id: str) -> bool:
+        with self._lock:
+            cur = self._db.execute(f"UPDATE tasks SET rubric_id = ? {self._LEASED}", (rubric_id, job_id, seq, worker))
+            return cur.rowcount > 0
+
+    def complete(self, job_id: str, seq: int, worker: str, result: dict) -> bool:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            cur = self._db.execute(
+                f"UPDATE tasks SET status = 'done', result = ?, error = NULL, lease_until = NULL {self._LEASED}",
+                (json.dumps(result), job_id, seq, worker),
+            )
+            self._db.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?", (time.time(), job_id))
+            self._db.execute("COMMIT")
+            return cur.rowcount > 0
+
+    def fail(self, job_id: str, seq: int, worker: str, error: str, attempts: int) -> bool:
+        """
+        Puts the task back for another try, or fails it for good after JOB_MAX_ATTEMPTS.
+        A task of a cancelled job is not retried: it becomes cancelled.
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            cur = self._db.execute(
+                "UPDATE tasks SET status = CASE "
+                "WHEN ? THEN 'failed' "
+                "WHEN (SELECT status FROM jobs WHERE jobs.job_id = tasks.job_id) = 'cancelled' THEN 'cancelled' "
+                f"ELSE 'pending' END, error = ?, lease_until = NULL {self._LEASED}",
+                (attempts >= JOB_MAX_ATTEMPTS, error, job_id, seq, worker),
+            )
+            self._db.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?", (time.time(), job_id))
+            self._db.execute("COMMIT")
+            return cur.rowcount > 0
+
+
+providers.register("jobs_db", lambda: open_jobs_db(JOBS_DB))
+job_queue = JobQueue(lambda: providers.get("jobs_db"))
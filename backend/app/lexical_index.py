@@ -0,0 +1,162 @@
+import os
+import re
+import json
+import math
+import uuid
+from collections import Counter
+
+import numpy as np
+
+from .vector_index import _replace_file, matches_filter
+
+# --- Lexical (BM25) Index ---
+# Built by vectorstore.py from the same chunks as the vector index. Catches exact
+# terms that dense retrieval misses: SI units, formula symbols ("x ∝ e"), activity names.
+# Answers queries with the same Pinecone-shaped matches as the vector backends.
+
+K1 = 1.2
+B = 0.75
+
+# Words, optionally joined by . / ^ (m/s2, 9.8, x^2), or a single non-ASCII symbol (∝, ×, Ω)
+TOKEN = re.compile(r"\w+(?:[./^]\w+)*|[^\w\s\x00-\x7f]")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were "
+    "what which who why how with".split()
+)
+
+
+def tokenize(text: str):
+    return [t for t in TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Inverted index with BM25 weights precomputed per posting, so a query is one
+    scatter-add per query term. Postings are stored CSR-style in NumPy arrays.
+
+    Layout of `path/`:
+        manifest.json   count, terms, k1, b, version
+        terms.json      vocabulary, in posting-list order
+        offsets.npy     int64 [terms + 1]: posting list i is docs[offsets[i]:offsets[i+1]]
+        docs.npy        int32 [postings]
+        weights.npy     float32 [postings]: tf-saturated, length-normalised, times idf
+        metadata.json   {"ids": [...], "metadata": [...], "files": [...]}
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        with open(os.path.join(path, "terms.json"), "r", encoding="utf-8") as f:
+            self.terms = {term: i for i, term in enumerate(json.load(f))}
+        with open(os.path.join(path, "metadata.json"), "r", encoding="utf-8") as f:
+            sidecar = json.load(f)
+
+        self.ids = sidecar["ids"]
+        self.metadata = sidecar["metadata"]
+        self.files = sidecar["files"]
+        self.version = self.manifest["version"]
+        self.offsets = np.load(os.path.join(path, "offsets.npy"))
+        self.docs = np.load(os.path.join(path, "docs.npy"), mmap_mode="r")
+        self.weights = np.load(os.path.join(path, "weights.npy"), mmap_mode="r")
+        self._partitions = {}
+
+    @staticmethod
+    def build(path: str, ids, texts, metadata, files, k1: float = K1, b: float = B):
+        """Writes a new index to `path` and returns it loaded."""
+        os.makedirs(path, exist_ok=True)
+        term_freqs = [Counter(tokenize(text)) for text in texts]
+        lengths = np.array([sum(tf.values()) for tf in term_freqs], dtype=np.float32)
+        avgdl = float(lengths.mean()) if len(lengths) else 1.0
+
+        postings = {}
+        for row, tf in enumerate(term_freqs):
+            for term, count in tf.items():
+                postings.setdefault(term, []).append((row, count))
+
+        vocab = sorted(postings)
+        n = len(texts)
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        docs, weights = [], []
+        for i, term in enumerate(vocab):
+            plist = postings[term]
+            idf = math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            rows = np.array([r for r, _ in plist], dtype=np.int32)
+            tf = np.array([c for _, c in plist], dtype=np.float32)
+            norm = k1 * (1 - b + b * lengths[rows] / max(avgdl, 1e-6))
+            docs.append(rows)
+            weights.append((idf * tf * (k1 + 1) / (tf + norm)).astype(np.float32))
+            offsets[i + 1] = offsets[i] + len(plist)
+
+        docs = np.concatenate(docs) if docs else np.zeros(0, dtype=np.int32)
+        weights = np.concatenate(weights) if weights else np.zeros(0, dtype=np.float32)
+        _replace_file(path, "offsets.npy", lambda f: np.save(f, offsets))
+        _replace_file(path, "docs.npy", lambda f: np.save(f, docs))
+        _replace_file(path, "weights.npy", lambda f: np.save(f, weights))
+        _replace_file(path, "terms.json", lambda f: f.write(json.dumps(vocab, ensure_ascii=False).encode("utf-8")))
+
+        sidecar = {"ids": list(ids), "metadata": list(metadata), "files": list(files)}
+        _replace_file(path, "metadata.json", lambda f: f.write(json.dumps(sidecar, ensure_ascii=False).encode("utf-8")))
+
+        manifest = {"count": n, "terms": len(vocab), "k1": k1, "b": b, "version": uuid.uuid4().hex}
+        # Manifest goes last so a half-written index is never picked up
+        _replace_file(path, "manifest.json", lambda f: f.write(json.dumps(manifest).encode("utf-8")))
+        return BM25Index(path)
+
+    def partition(self, filter: dict) -> np.ndarray:
+        """Row indices whose metadata matches `filter` (computed once per filter)."""
+        key = tuple(sorted(filter.items()))
+        rows = self._partitions.get(key)
+        if rows is None:
+            rows = np.array(
+                [i for i, meta in enumerate(self.metadata) if matches_filter(meta, filter)],
+                dtype=np.int64,
+            )
+            self._partitions[key] = rows
+        return rows
+
+    def query(self, text: str, top_k: int = 3, filter: dict = None):
+        rows = self.partition(filter) if filter else None
+        if not self.ids or (rows is not None and len(rows) == 0):
+            return []
+
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(tokenize(text)):
+            i = self.terms.get(term)
+            if i is not None:
+                start, end = self.offsets[i], self.offsets[i + 1]
+                scores[self.docs[start:end]] += self.weights[start:end]
+
+        if rows is not None:
+            candidates = rows[scores[rows] > 0]
+        else:
+            candidates = np.flatnonzero(scores)
+        if len(candidates) == 0:
+            return []
+        k = min(top_k, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [{"id": self.ids[i], "score": float(scores[i]), "metadata": self.metadata[i]} for i in top]
+
+
+def reciprocal_rank_fusion(result_lists, top_k: int, k: int = 60):
+    """
+    Merges ranked match lists: each match scores sum(1 / (k + rank)) over the lists it
+    appears in. Scores of different retrievers are not comparable, ranks are.
+    """
+    fused, first_seen, ranks = {}, {}, {}
+    for source, matches in result_lists:
+        for rank, match in enumerate(matches, start=1):
+            fused[match["id"]] = fused.get(match["id"], 0.0) + 1.0 / (k + rank)
+            first_seen.setdefault(match["id"], match)
+            ranks.setdefault(match["id"], []).append(f"{source} #{rank}")
+
+    best = sorted(fused, key=fused.get, reverse=True)[:top_k]
+    return [
+        {
+            **first_seen[chunk_id],
+            "score": fused[chunk_id],
+            "reason": f"RRF: {round(fused[chunk_id], 4)} ({', '.join(ranks[chunk_id])})",
+        }
+        for chunk_id in best
+    ]
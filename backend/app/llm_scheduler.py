@@ -0,0 +1,253 @@
+import os
+import time
+import heapq
+import random
+import asyncio
+import logging
+import itertools
+import contextvars
+
+from .metrics import LLM_QUEUE_SECONDS, PROMPT_TOKENS, timed_call, record_usage
+from .prompts import count_tokens
+
+logger = logging.getLogger("llm_scheduler")
+
+# --- Priority Lanes ---
+INTERACTIVE = 0  # single /evaluate, /generate-rubric calls: a teacher is waiting
+BATCH = 1        # /evaluate-batch, background jobs
+
+# Set by the API layer; every LLM call made while handling the request inherits it
+llm_priority = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+# --- Quota ---
+# The buckets and the AIMD limit live in one process, but the provider quota is shared by
+# the API and every `python -m app.worker`. Set LLM_PROCESSES to how many of them run:
+# each one then schedules against its share (LLM_RPM / LLM_PROCESSES, and likewise for
+# LLM_TPM and the concurrency limits), so together they stay inside the quota. An idle
+# process does not hand its share to the others; 429s still slow everyone down.
+LLM_PROCESSES = max(int(os.environ.get("LLM_PROCESSES", 1)), 1)
+LLM_RPM = int(os.environ.get("LLM_RPM", 1000))                 # requests per minute quota (all processes)
+LLM_TPM = int(os.environ.get("LLM_TPM", 1_000_000))            # tokens per minute quota (all processes)
+LLM_MIN_CONCURRENCY = int(os.environ.get("LLM_MIN_CONCURRENCY", 2))
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 64))
+LLM_INITIAL_CONCURRENCY = int(os.environ.get("LLM_INITIAL_CONCURRENCY", 16))
+LLM_TARGET_LATENCY = float(os.environ.get("LLM_TARGET_LATENCY", 30.0))  # seconds
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 5))
+EXPECTED_OUTPUT_TOKENS = 1500
+
+
+class LLMOverloadedError(Exception):
+    """Raised when an LLM call still fails with rate limiting after all retries."""
+
+    def __init__(self, message: str, retry_after: float = 30.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_rate_limited(e: Exception) -> bool:
+    code = getattr(e, "code", None) or getattr(e, "status_code", None)
+    text = str(e)
+    return code == 429 or "429" in text or "RESOURCE_EXHAUSTED" in text or "quota" in text.lower()
+
+
+def is_transient(e: Exception) -> bool:
+    code = getattr(e, "code", None) or getattr(e, "status_code", None)
+    text = str(e)
+    return (
+        isinstance(e, (asyncio.TimeoutError, ConnectionError))
+        or code in (500, 502, 503, 504)
+        or "UNAVAILABLE" in text or "DEADLINE_EXCEEDED" in text
+    )
+
+
+def estimate_tokens(prompt) -> int:
+    """Prompt tokens plus the expected completion, for the TPM budget."""
+    return count_tokens(str(prompt)) + EXPECTED_OUTPUT_TOKENS
+
+
+class TokenBucket:
+    """Continuously refilling budget of `per_minute` units."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        amount = min(amount, self.capacity)
+        async with self._lock:  # FIFO: one waiter drains the bucket at a time
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+    def drain(self):
+        """After a 429 the provider's view of our budget is what counts: start from empty."""
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+
+
+class LLMScheduler:
+    """
+    Every LLM call goes through `run`. Calls wait for a concurrency slot (lower
+    priority value first), then for request/token budget, and are retried with
+    jittered exponential backoff on 429s and transient errors.
+
+    The concurrency limit follows AIMD: +1/limit per fast success, halved on a 429,
+    and shrunk a little when latency climbs past the target.
+    """
+
+    def __init__(self, rpm: int, tpm: int, initial: int, min_limit: int, max_limit: int,
+                 target_latency: float, max_retries: int):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.in_flight = 0
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self.processes = 1
+        self.completed = 0
+        self.throttled = 0
+        self.retries = 0
+        self.failed = 0
+
+    # --- Slots ---
+
+    async def _acquire_slot(self, priority: int):
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release_slot()  # we were handed a slot but are going away
+            raise
+
+    def _release_slot(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            _, _, future = heapq.heappop(self._waiters)
+            if future.cancelled():
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+    # --- AIMD ---
+
+    def _on_success(self, latency: float):
+        self.completed += 1
+        if latency > self.target_latency:
+            self.limit = max(self.min_limit, self.limit * 0.9)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+        self._wake()
+
+    def _on_throttle(self):
+        self.throttled += 1
+        self.limit = max(self.min_limit, self.limit / 2)
+        self.requests.drain()
+
+    # --- Calls ---
+
+    async def run(self, call, est_tokens: int = EXPECTED_OUTPUT_TOKENS, priority: int = None, name: str = "llm"):
+        """Runs `call` (a zero-arg coroutine factory) under the rate limits, with retries."""
+        priority = llm_priority.get() if priority is None else priority
+        for attempt in range(self.max_retries + 1):
+            queued = time.monotonic()
+            await self._acquire_slot(priority)
+            try:
+                await self.requests.acquire(1)
+                await self.tokens.acquire(est_tokens)
+                start = time.monotonic()
+                LLM_QUEUE_SECONDS.observe(start - queued, call=name)
+                with timed_call(f"llm:{name}"):
+                    result = await call()
+                self._on_success(time.monotonic() - start)
+                return result
+            except Exception as e:
+                limited = is_rate_limited(e)
+                if not (limited or is_transient(e)) or attempt == self.max_retries:
+                    self.failed += 1
+                    if limited:
+                        raise LLMOverloadedError(f"LLM rate limit persisted after {attempt + 1} attempts: {e}") from e
+                    raise
+                if limited:
+                    self._on_throttle()
+                self.retries += 1
+                # Full jitter: spreads retries of a burst over the backoff window
+                delay = random.uniform(0, min(60.0, 2.0 * 2 ** attempt))
+                logger.warning(f"LLM call failed ({'429' if limited else 'transient'}), retry {attempt + 1} in {delay:.1f}s")
+            finally:
+                self._release_slot()
+            await asyncio.sleep(delay)
+
+    async def invoke(self, runnable, prompt, priority: int = None, name: str = "llm"):
+        """
+        `runnable.ainvoke(prompt)` through the scheduler. Structured-output runnables built
+        with include_raw=True are unwrapped here, after their token usage is recorded.
+        """
+        PROMPT_TOKENS.observe(count_tokens(str(prompt)), call=name)
+        result = await self.run(lambda: runnable.ainvoke(prompt), estimate_tokens(prompt), priority, name)
+        if isinstance(result, dict) and "parsed" in result and "raw" in result:
+            record_usage(name, result["raw"])
+            if result["parsed"] is None:
+                raise result.get("parsing_error") or ValueError("The model returned no structured output.")
+            return result["parsed"]
+        return result
+
+    @classmethod
+    def share(cls, processes: int, rpm: int, tpm: int, initial: int, min_limit: int, max_limit: int,
+              target_latency: float, max_retries: int) -> "LLMScheduler":
+        """A scheduler for one of `processes` processes that split the same quota evenly."""
+        max_limit = max(max_limit // processes, 1)
+        scheduler = cls(
+            rpm=max(rpm / processes, 1), tpm=max(tpm / processes, 1),
+            initial=min(max(initial // processes, 1), max_limit), min_limit=min(min_limit, max_limit),
+            max_limit=max_limit, target_latency=target_latency, max_retries=max_retries,
+        )
+        scheduler.processes = processes
+        return scheduler
+
+    def stats(self) -> dict:
+        return {
+            "processes": self.processes,
+            "rpm": round(self.requests.capacity, 2),
+            "tpm": round(self.tokens.capacity, 2),
+            "concurrency_limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "completed": self.completed,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "failed": self.failed,
+        }
+
+
+llm_scheduler = LLMScheduler.share(
+    processes=LLM_PROCESSES,
+    rpm=LLM_RPM,
+    tpm=LLM_TPM,
+    initial=LLM_INITIAL_CONCURRENCY,
+    min_limit=LLM_MIN_CONCURRENCY,
+    max_limit=LLM_MAX_CONCURRENCY,
+    target_latency=LLM_TARGET_LATENCY,
+    max_retries=LLM_MAX_RETRIES,
+)
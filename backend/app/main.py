@@ -1,39 +1,474 @@
-from fastapi import FastAPI, HTTPException
-from .schema import RubricRequest, EvaluationRequest, GradingReport,Rubric,ConsensusReport
-from .workflow import rubric_app, eval_app
+import os
+import json
+import time
+import asyncio
+from typing import Optional
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Header, Response
+from pydantic import ValidationError
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from .schema import RubricRequest, EvaluationRequest, BatchEvaluationRequest, Rubric, StoredRubric, ConsensusReport
+from .schema import GradingJobRequest, JobStatus, JobResultsPage, AnswerSheetRequest, AnswerSheetReport
+from .workflow import rubric_app, eval_app, sheet_app, build_eval_prefix, build_consensus, base_rubric_cache
+from .retriever import cache_stats, aget_relevant_contexts
+from .rubric_store import rubric_store, rubric_fingerprint
+from .grade_cache import grade_cache
+from .llm_scheduler import llm_scheduler, llm_priority, LLMOverloadedError, BATCH
+from .jobs import job_queue
+from .metrics import registry, MetricsMiddleware
+from .checkpoints import resumable_invoke, close_savers
+from .cache import content_key
+from .providers import providers
+from .responses import check_view, report_view, sheet_view, encode, dumps_json, view_responses
 
-app = FastAPI(title="DrnaAI Minimalist Engine", version="3.0")
+# --- Startup ---
+# Importing the app connects to nothing. At startup the providers (Pinecone, Gemini,
+# indexes) are built and their connections opened in the background, so the process
+# answers /healthz at once and /readyz turns 200 when it can serve traffic.
+WARMUP_RETRY_SECONDS = float(os.environ.get("WARMUP_RETRY_SECONDS", 10))
+# Optional query retrieved once at startup (opens the embedding connection, primes the caches)
+WARMUP_QUERY = os.environ.get("WARMUP_QUERY", "")
 
-@app.post("/generate-rubric", response_model=Rubric)
-def generate_rubric(request: RubricRequest):
+startup = {"started_at": time.time(), "ready_at": None}
+
+async def warm_up():
+    while not await asyncio.to_thread(providers.warm_up):
+        print(f"⚠️ Warm-up incomplete, retrying in {WARMUP_RETRY_SECONDS:g}s")
+        await asyncio.sleep(WARMUP_RETRY_SECONDS)
+    if WARMUP_QUERY:
+        await aget_relevant_contexts([WARMUP_QUERY])
+    startup["ready_at"] = time.time()
+    print(f"✅ Ready in {startup['ready_at'] - startup['started_at']:.2f}s")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    task = asyncio.create_task(warm_up())
+    yield
+    task.cancel()
+    await close_savers()
+
+app = FastAPI(title="DrnaAI Minimalist Engine", version="3.0", lifespan=lifespan)
+# Compression is negotiated through Accept-Encoding; small bodies are not worth it.
+# Level 5 compresses reports nearly as well as 9 for a fraction of the CPU.
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=int(os.environ.get("GZIP_MIN_BYTES", 1024)),
+    compresslevel=int(os.environ.get("GZIP_LEVEL", 5)),
+)
+app.add_middleware(MetricsMiddleware)
+
+# Max students graded at the same time within one /evaluate-batch call
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", 8))
+
+def resolve_rubric(request) -> Rubric:
+    """Returns the inline rubric, or looks up the registered one by rubric_id."""
+    if request.rubric is not None:
+        return request.rubric
+    rubric = rubric_store.get(request.rubric_id)
+    if rubric is None:
+        raise HTTPException(status_code=404, detail=f"Unknown rubric_id '{request.rubric_id}'.")
+    return rubric
+
+def overloaded(e: LLMOverloadedError) -> HTTPException:
+    """429 from the LLM quota -> 503 + Retry-After, so clients back off instead of seeing a 500."""
+    return HTTPException(
+        status_code=503,
+        detail="The grading model is over its rate limit, please retry shortly.",
+        headers={"Retry-After": str(int(e.retry_after))},
+    )
+
+def eval_state(request, rubric: Rubric, student_ans: str, **extra) -> dict:
+    """Initial eval graph state. Inline rubrics are identified by their content hash."""
+    return {
+        "inputs": {"student_ans": student_ans, "use_cache": request.use_cache},
+        "rubric": rubric,
+        "rubric_id": request.rubric_id if request.rubric is None else None,
+        **extra,
+    }
+
+@app.post("/generate-rubric", response_model=StoredRubric)
+async def generate_rubric(request: RubricRequest, response: Response,
+                          idempotency_key: Optional[str] = Header(None)):
     """
-    Step 1: Returns a full Rubric JSON. 
-    You must copy this JSON to use in Step 2.
+    Step 1: Returns a full Rubric JSON plus its 'rubric_id'.
+    Pass the rubric_id to Step 2 (no need to copy the rubric).
+    With an Idempotency-Key header, a retry resumes the failed run instead of starting over.
     """
     try:
         input_data = request.model_dump()
-        result = rubric_app.invoke({"inputs": input_data})
-        return result["rubric"]
+        if idempotency_key:
+            result, replayed = await resumable_invoke(
+                "rubric", {"inputs": input_data}, idempotency_key, content_key(input_data)
+            )
+            response.headers["Idempotent-Replayed"] = str(replayed).lower()
+        else:
+            result = await rubric_app.ainvoke({"inputs": input_data})
+        rubric = result["rubric"]
+        return StoredRubric(**rubric.model_dump(), rubric_id=rubric_store.put(rubric))
+    except LLMOverloadedError as e:
+        raise overloaded(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/evaluate", response_model=ConsensusReport)
-def evaluate_student(request: EvaluationRequest):
+@app.post("/rubrics", response_model=StoredRubric)
+def register_rubric(rubric: Rubric):
+    """Registers a rubric edited or created outside Step 1."""
+    return StoredRubric(**rubric.model_dump(), rubric_id=rubric_store.put(rubric))
+
+@app.get("/rubrics/{rubric_id}", response_model=StoredRubric)
+def get_rubric(rubric_id: str):
+    rubric = rubric_store.get(rubric_id)
+    if rubric is None:
+        raise HTTPException(status_code=404, detail=f"Unknown rubric_id '{rubric_id}'.")
+    return StoredRubric(**rubric.model_dump(), rubric_id=rubric_id)
+
+@app.delete("/rubrics/{rubric_id}")
+def delete_rubric(rubric_id: str):
+    if not rubric_store.delete(rubric_id):
+        raise HTTPException(status_code=404, detail=f"Unknown rubric_id '{rubric_id}'.")
+    grade_cache.evict_rubric(rubric_id)
+    return {"deleted": rubric_id}
+
+@app.delete("/rubrics/{rubric_id}/grades")
+def evict_rubric_grades(rubric_id: str):
+    """Forgets cached grades for one rubric (e.g. to re-grade a class from scratch)."""
+    return {"rubric_id": rubric_id, "evicted": grade_cache.evict_rubric(rubric_id)}
+
+@app.post("/evaluate", response_model=None, responses=view_responses(ConsensusReport))
+async def evaluate_student(request: EvaluationRequest, view: str = "full",
+                           idempotency_key: Optional[str] = Header(None),
+                           accept: Optional[str] = Header(None)):
     """
-    Step 2: Takes { "student_ans": "...", "rubric": { ... } }
-    Returns the grade.
+    Step 2: Takes { "student_ans": "...", "rubric_id": "..." } (or a full "rubric")
+    Returns the grade: ?view=full (default), representative or summary.
+    Send Accept: application/msgpack for MessagePack instead of JSON.
+    With an Idempotency-Key header, grading runs that already succeeded are kept when
+    another one fails, and a duplicate submission returns the stored grade.
     """
+    check_view(view)
+    rubric = resolve_rubric(request)
     try:
-        # Pydantic handles the parsing of the 'rubric' field automatically
-        input_data = request.model_dump()
-        
-        result = eval_app.invoke({"inputs": input_data})
+        # The rubric goes in already parsed, so the graph does not re-validate it
+        state = eval_state(request, rubric, request.student_ans)
+        headers = {}
+        if idempotency_key:
+            result, replayed = await resumable_invoke(
+                "evaluate", state, idempotency_key, content_key(request.model_dump())
+            )
+            headers["Idempotent-Replayed"] = str(replayed).lower()
+        else:
+            result = await eval_app.ainvoke(state)
         
         if not result.get("final_report"):
             raise HTTPException(status_code=500, detail="Evaluation failed.")
             
-        return result["final_report"]
+        response = encode(report_view(result["final_report"], view), accept)
+        response.headers.update(headers)
+        return response
         
+    except LLMOverloadedError as e:
+        raise overloaded(e)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"EVAL ERROR: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+# --- Streaming evaluation ---
+
+async def evaluation_events(state: dict):
+    """
+    Runs the eval graph with LangGraph streaming and yields (event, data) pairs:
+    "run" for every GradingReport as soon as its run finishes, "provisional" with the
+    consensus of the runs so far, then "final" (or "error").
+    """
+    runs, final = [], None
+    try:
+        async for update in eval_app.astream(state, stream_mode="updates"):
+            for node, output in update.items():
+                if not output:
+                    continue
+                if node == "grade_run":
+                    for report in output.get("runs", []):
+                        runs.append(report)
+                        yield "run", {"run_index": len(runs) - 1, "report": report.model_dump()}
+                        yield "provisional", build_consensus(runs).model_dump()
+                elif output.get("final_report") is not None:
+                    final = output["final_report"]
+    except LLMOverloadedError as e:
+        yield "error", {"detail": str(e), "retry_after": e.retry_after}
+        return
+    except Exception as e:
+        print(f"STREAM EVAL ERROR: {e}")
+        yield "error", {"detail": str(e)}
+        return
+
+    if final is None:
+        yield "error", {"detail": "Evaluation failed."}
+    else:
+        yield "final", final.model_dump()
+
+@app.post("/evaluate/stream")
+async def evaluate_stream(request: EvaluationRequest, format: str = "sse"):
+    """
+    Same as /evaluate, but streams progress (SSE, or NDJSON with ?format=ndjson):
+    each grading run as it completes, a provisional consensus, then the final one.
+    Closing the connection cancels the remaining runs.
+    """
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'sse'.")
+    rubric = resolve_rubric(request)
+
+    async def stream():
+        async for event, data in evaluation_events(eval_state(request, rubric, request.student_ans)):
+            if format == "sse":
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            else:
+                yield json.dumps({"event": event, "data": data}) + "\n"
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(stream(), media_type=media_type)
+
+@app.websocket("/evaluate/ws")
+async def evaluate_ws(websocket: WebSocket):
+    """
+    WebSocket variant of /evaluate/stream: send one EvaluationRequest as JSON, receive
+    {"event": ..., "data": ...} messages. Send {"cancel": true} (or disconnect) to stop early.
+    """
+    await websocket.accept()
+    try:
+        request = EvaluationRequest.model_validate(await websocket.receive_json())
+        rubric = resolve_rubric(request)
+    except (ValidationError, HTTPException, ValueError) as e:
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        await websocket.send_json({"event": "error", "data": {"detail": detail}})
+        await websocket.close(code=1008)
+        return
+    except WebSocketDisconnect:
+        return
+
+    async def pump():
+        async for event, data in evaluation_events(eval_state(request, rubric, request.student_ans)):
+            await websocket.send_json({"event": event, "data": data})
+
+    async def listen():
+        # Returns when the client cancels or goes away
+        while True:
+            message = await websocket.receive_json()
+            if isinstance(message, dict) and message.get("cancel"):
+                return
+
+    pump_task = asyncio.create_task(pump())
+    listen_task = asyncio.create_task(listen())
+    try:
+        done, _ = await asyncio.wait({pump_task, listen_task}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (pump_task, listen_task):
+            task.cancel()
+    if listen_task in done:
+        if isinstance(listen_task.exception(), WebSocketDisconnect):
+            return
+        await websocket.send_json({"event": "cancelled", "data": {}})
+    await websocket.close()
+
+# One JSON object per student: {"index", "student_id", "report"} or {"index", "student_id", "error"}
+BATCH_RESPONSES = {200: {
+    "description": "A stream of per-student results (NDJSON, or SSE 'result' events then 'done' with ?format=sse). "
+                   "'report' is a ConsensusReport shaped by ?view= as for /evaluate.",
+    "content": {"application/x-ndjson": {}, "text/event-stream": {}},
+}}
+
+@app.post("/evaluate-batch", response_model=None, responses=BATCH_RESPONSES)
+async def evaluate_batch(request: BatchEvaluationRequest, format: str = "ndjson", view: str = "full"):
+    """
+    Grades a whole class against one rubric.
+    Streams one result per student as soon as it is graded (NDJSON, or SSE with ?format=sse).
+    Results arrive in completion order; use "index" to match them to the input.
+    ?view=representative or summary shrinks each report (see /evaluate).
+    """
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'sse'.")
+    check_view(view)
+    if request.student_ids and len(request.student_ids) != len(request.student_answers):
+        raise HTTPException(status_code=400, detail="student_ids must match student_answers.")
+
+    # Parsed once (or fetched parsed from the store); the rubric part of the prompt is also built once
+    rubric = resolve_rubric(request)
+    rubric_id = request.rubric_id or rubric_fingerprint(rubric)
+    prefix = build_eval_prefix(rubric)
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+    async def grade(index: int, student_ans: str):
+        # Batch work yields to interactive single evaluations in the LLM scheduler
+        llm_priority.set(BATCH)
+        student_id = request.student_ids[index] if request.student_ids else None
+        async with semaphore:
+            try:
+                result = await eval_app.ainvoke(
+                    eval_state(request, rubric, student_ans, rubric_id=rubric_id, eval_prefix=prefix)
+                )
+                report = result.get("final_report")
+                if not report:
+                    return {"index": index, "student_id": student_id, "error": "Evaluation failed."}
+                if student_id:
+                    for run in report.individual_runs:
+                        run.student_id = student_id
+                return {"index": index, "student_id": student_id, "report": report_view(report, view)}
+            except Exception as e:
+                print(f"BATCH EVAL ERROR ({index}): {e}")
+                return {"index": index, "student_id": student_id, "error": str(e)}
+
+    async def stream():
+        tasks = [asyncio.create_task(grade(i, ans)) for i, ans in enumerate(request.student_answers)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item = dumps_json(await next_done).decode("utf-8")
+                yield f"event: result\ndata: {item}\n\n" if format == "sse" else f"{item}\n"
+            if format == "sse":
+                yield "event: done\ndata: {}\n\n"
+        finally:
+            # Client went away: stop grading the rest
+            for task in tasks:
+                task.cancel()
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(stream(), media_type=media_type)
+
+@app.post("/evaluate-sheet", response_model=None, responses=view_responses(AnswerSheetReport))
+async def evaluate_sheet(request: AnswerSheetRequest, view: str = "full",
+                         accept: Optional[str] = Header(None)):
+    """
+    Grades one student's whole paper: rubric + consensus grade per question, all questions
+    in parallel, with the paper total. Questions that could not be graded have no score,
+    are left out of the total and listed in "ungraded_questions" (and "flagged_questions",
+    with the ones whose runs disagreed); "complete" is then false. Over the LLM rate
+    limit the whole sheet fails with 503 + Retry-After instead.
+    ?view= and Accept shape and encode the per-question reports as for /evaluate.
+    """
+    check_view(view)
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="The answer sheet has no questions.")
+    for q in request.questions:
+        if q.rubric_id and rubric_store.get(q.rubric_id) is None:
+            raise HTTPException(status_code=404, detail=f"Unknown rubric_id '{q.rubric_id}'.")
+    try:
+        result = await sheet_app.ainvoke({"inputs": {
+            "student_id": request.student_id,
+            "use_cache": request.use_cache,
+            "questions": [q.model_dump() for q in request.questions],
+        }})
+        return encode(sheet_view(result["sheet_report"], view), accept)
+    except LLMOverloadedError as e:
+        raise overloaded(e)
+    except Exception as e:
+        print(f"SHEET EVAL ERROR: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# --- Background grading jobs (run by `python -m app.worker`) ---
+
+@app.post("/jobs")
+def submit_job(request: GradingJobRequest):
+    """
+    Queues a whole exam for grading and returns immediately with a job_id.
+    Poll GET /jobs/{job_id} for progress and page through GET /jobs/{job_id}/results.
+    """
+    if not any(q.answers for q in request.questions):
+        raise HTTPException(status_code=400, detail="The job has no answers to grade.")
+    for q in request.questions:
+        if q.rubric_id and rubric_store.get(q.rubric_id) is None:
+            raise HTTPException(status_code=404, detail=f"Unknown rubric_id '{q.rubric_id}'.")
+    return job_queue.submit(request)
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+def get_job(job_id: str):
+    status = job_queue.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job_id '{job_id}'.")
+    return status
+
+@app.get("/jobs/{job_id}/results", response_model=None, responses=view_responses(JobResultsPage))
+def get_job_results(job_id: str, offset: int = 0, limit: int = 50, view: str = "full",
+                    accept: Optional[str] = Header(None)):
+    """
+    One item per (question, student) in submission order, graded or not yet.
+    ?view= and Accept shape and encode the reports as for /evaluate.
+    """
+    check_view(view)
+    status = job_queue.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job_id '{job_id}'.")
+    limit = max(1, min(limit, 500))
+    offset = max(0, offset)
+    items = job_queue.results(job_id, offset, limit)
+    for item in items:
+        item["report"] = report_view(item["report"], view)
+    return encode({
+        "job_id": job_id,
+        "offset": offset,
+        "limit": limit,
+        "total": status["total"],
+        "items": items,
+    }, accept)
+
+@app.post("/jobs/{job_id}/cancel", response_model=JobStatus)
+def cancel_job(job_id: str):
+    """Stops queued work; answers already being graded still finish and keep their results."""
+    if job_queue.status(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job_id '{job_id}'.")
+    job_queue.cancel(job_id)
+    return job_queue.status(job_id)
+
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: 200 once warm-up has finished, 503 (with per-provider errors) until then."""
+    body = {**providers.status(), "ready": startup["ready_at"] is not None, **startup}
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    """Hit/miss counters for the retrieval and grading caches."""
+    return {**cache_stats(), "grades": grade_cache.stats()}
+
+@app.get("/scheduler/stats")
+def get_scheduler_stats():
+    """Current LLM concurrency limit, queue depth and retry/throttle counters."""
+    return llm_scheduler.stats()
+
+# --- Metrics ---
+
+def collect_runtime_metrics():
+    """Cache and scheduler counters, read at scrape time."""
+    caches = {**cache_stats(), "base_rubric": base_rubric_cache.stats()}
+    grades = grade_cache.stats()
+    scheduler = llm_scheduler.stats()
+    return [
+        ("drona_cache_hits_total", "counter", "Cache hits (memory + disk).",
+         [({"cache": n}, c["hits"] + c["disk_hits"]) for n, c in caches.items()]
+         + [({"cache": "grades"}, grades["exact_hits"] + grades["near_duplicate_hits"])]),
+        ("drona_cache_misses_total", "counter", "Cache misses.",
+         [({"cache": n}, c["misses"]) for n, c in caches.items()] + [({"cache": "grades"}, grades["misses"])]),
+        ("drona_cache_hit_ratio", "gauge", "Hits / lookups since start.",
+         [({"cache": n}, c["hit_rate"]) for n, c in caches.items()] + [({"cache": "grades"}, grades["hit_rate"])]),
+        ("drona_cache_bytes", "gauge", "Approximate in-memory size of each cache.",
+         [({"cache": n}, c["bytes"]) for n, c in caches.items()]),
+        ("drona_llm_concurrency_limit", "gauge", "Current AIMD concurrency limit.", [({}, scheduler["concurrency_limit"])]),
+        ("drona_llm_in_flight", "gauge", "LLM calls in flight.", [({}, scheduler["in_flight"])]),
+        ("drona_llm_waiting", "gauge", "LLM calls waiting for a slot.", [({}, scheduler["waiting"])]),
+        ("drona_llm_throttled_total", "counter", "429 responses from Gemini.", [({}, scheduler["throttled"])]),
+        ("drona_llm_retries_total", "counter", "Retried LLM calls.", [({}, scheduler["retries"])]),
+        ("drona_llm_failed_total", "counter", "LLM calls that failed for good.", [({}, scheduler["failed"])]),
+    ]
+
+registry.add_collector(collect_runtime_metrics)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus text format: node/external call latencies, tokens, caches, in-flight requests."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,269 @@
+import os
+import time
+import bisect
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# --- Metrics ---
+# A small Prometheus registry (text exposition format 0.0.4), so the API and the workers
+# need no extra dependency. Scraped at GET /metrics.
+#
+# With SERVER_TIMING=true every response also carries a Server-Timing header with the
+# time spent per graph node and external call while serving that request. Streaming
+# responses (SSE/NDJSON) get none: their headers go out before any grading has run, so
+# the breakdown would be empty and "total" would only time the handler, not the stream.
+
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "false").lower() == "true"
+STREAMING_TYPES = (b"text/event-stream", b"application/x-ndjson")
+
+# Seconds: LLM calls dominate, so the buckets reach well past a minute
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _labels(self.labelnames, k), v) for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _labels(self.labelnames, k), v) for k, v in self._values.items()]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        out = []
+        with self._lock:
+            items = [(k, list(c), s) for k, (c, s) in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                out.append((f"{self.name}_bucket", _labels(self.labelnames, key, f'le="{bound:g}"'), cumulative))
+            cumulative += counts[-1]
+            out.append((f"{self.name}_bucket", _labels(self.labelnames, key, 'le="+Inf"'), cumulative))
+            out.append((f"{self.name}_sum", _labels(self.labelnames, key), total))
+            out.append((f"{self.name}_count", _labels(self.labelnames, key), cumulative))
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def add_collector(self, collect):
+        """`collect()` returns [(name, type, help, [(labels_dict, value), ...]), ...] at scrape time."""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(f"{name}{labels} {value:g}" for name, labels, value in metric.samples())
+        for collect in self._collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+                continue
+            for name, type_, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {type_}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(labels.keys(), labels.values())} {float(value):g}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# --- Instruments ---
+HTTP_SECONDS = Histogram("drona_http_request_seconds", "HTTP request latency.", ("method", "route", "status"))
+HTTP_IN_FLIGHT = Gauge("drona_http_requests_in_flight", "HTTP requests being served.")
+NODE_SECONDS = Histogram("drona_node_seconds", "Latency of one graph node execution.", ("node",))
+EXTERNAL_SECONDS = Histogram(
+    "drona_external_call_seconds", "Latency of calls to Pinecone and Gemini.", ("call", "outcome")
+)
+LLM_QUEUE_SECONDS = Histogram(
+    "drona_llm_queue_seconds", "Time an LLM call waited for a scheduler slot and rate budget.", ("call",)
+)
+LLM_TOKENS = Counter("drona_llm_tokens_total", "Tokens reported by Gemini.", ("call", "kind"))
+PROMPT_TOKENS = Histogram(
+    "drona_prompt_tokens", "Estimated prompt size, counted before sending.", ("call",),
+    buckets=(250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 12000, 16000),
+)
+
+# --- Per-request timing breakdown ---
+_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def record_timing(name: str, seconds: float):
+    """Adds to the Server-Timing breakdown of the request being served (if any)."""
+    timings = _timings.get()
+    if timings is not None:
+        total, count = timings.get(name, (0.0, 0))
+        timings[name] = (total + seconds, count + 1)
+
+
+@contextmanager
+def timed_call(call: str):
+    """Times one external call (embed, index_query, llm:...) into EXTERNAL_SECONDS."""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        EXTERNAL_SECONDS.observe(elapsed, call=call, outcome=outcome)
+        record_timing(call.replace(":", "-"), elapsed)
+
+
+def timed_node(node: str):
+    """Decorator for async graph nodes: latency goes into NODE_SECONDS."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                NODE_SECONDS.observe(elapsed, node=node)
+                record_timing(f"node-{node}", elapsed)
+        return wrapper
+    return decorate
+
+
+def record_usage(call: str, message):
+    """Counts prompt/completion tokens from an AIMessage's usage_metadata."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    if usage.get("input_tokens"):
+        LLM_TOKENS.inc(usage["input_tokens"], call=call, kind="prompt")
+    if usage.get("output_tokens"):
+        LLM_TOKENS.inc(usage["output_tokens"], call=call, kind="completion")
+
+
+def _is_streaming(headers) -> bool:
+    for name, value in headers:
+        if name.lower() == b"content-type":
+            return value.split(b";")[0].strip().lower() in STREAMING_TYPES
+    return False
+
+
+def in_pool(fn):
+    """Wraps a function run on a thread pool so its timings land on the calling request."""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+class MetricsMiddleware:
+    """ASGI middleware: request latency, in-flight gauge and the optional Server-Timing header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings = {}
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                headers = list(message.get("headers", []))
+                if SERVER_TIMING and not _is_streaming(headers):
+                    entries = [
+                        f"{name};dur={total * 1000:.1f};desc=\"x{count}\""
+                        for name, (total, count) in sorted(timings.items())
+                    ]
+                    entries.append(f"total;dur={(time.perf_counter() - start) * 1000:.1f}")
+                    headers.append((b"server-timing", ", ".join(entries).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            _timings.reset(token)
+            # Route template, not the raw path, to keep label cardinality bounded
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_SECONDS.observe(time.perf_counter() - start, method=scope["method"], route=route, status=status["code"])
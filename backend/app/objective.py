@@ -0,0 +1,276 @@
+import os
+import re
+from typing import Optional, List, Tuple
+
+from .schema import (
+    Rubric, AtomicContentUnit, EvaluationLogic, ClaimVerdict, GradingReport, ConsensusReport,
+)
+
+# --- Objective Fast Path ---
+# MCQ, numeric and one-word questions are graded locally, without any LLM call.
+# Anything we are not sure about returns None and goes through the normal LLM path.
+
+OBJECTIVE_FAST_PATH = os.environ.get("OBJECTIVE_FAST_PATH", "true").lower() == "true"
+NUMERIC_TOLERANCE = float(os.environ.get("OBJECTIVE_NUMERIC_TOLERANCE", 0.01))  # relative
+MISSING_UNIT_CREDIT = float(os.environ.get("OBJECTIVE_MISSING_UNIT_CREDIT", 0.5))
+MAX_KEYWORD_WORDS = 3    # expected answers up to this long count as "one-word" answers
+MAX_STUDENT_WORDS = 8    # longer student answers are explanations: leave them to the LLM
+
+OPTION_LINE = re.compile(r"^\s*\(?([ivx]{1,4}|[a-h]|[1-9])[\.\)]\s+(.+?)\s*$", re.IGNORECASE)
+OPTION_LABEL = re.compile(r"^\s*\(?([ivx]{1,4}|[a-h]|[1-9])[\.\)]?\s*(?:\((.*)\)|(.*))$", re.IGNORECASE)
+
+UNIT_ALIASES = {
+    "kilogram": "kg", "kilograms": "kg", "gram": "g", "grams": "g",
+    "metre": "m", "meter": "m", "metres": "m", "meters": "m",
+    "second": "s", "seconds": "s", "sec": "s",
+    "newton": "n", "newtons": "n", "joule": "j", "joules": "j",
+    "watt": "w", "watts": "w", "pascal": "pa", "kelvin": "k", "ampere": "a",
+    "degree celsius": "°c", "celsius": "°c",
+}
+UNIT_SYMBOLS = ("kg", "g", "mg", "km", "cm", "mm", "m", "s", "min", "h", "n", "j", "w", "pa",
+                "k", "a", "v", "ohm", "ω", "hz", "l", "ml", "mol", "cd", "°c")
+# A unit is a product of known symbols (or one alias word) with optional exponents and
+# separators: "kg", "m/s2", "ms-2", "kg m^2 s-3", "newtons". Anything else after the number
+# ("3 states of matter") means the answer is not numeric.
+_UNIT_TOKEN = "(?:" + "|".join(re.escape(u) for u in sorted((*UNIT_ALIASES, *UNIT_SYMBOLS), key=len, reverse=True)) + ")"
+_UNIT_POWER = _UNIT_TOKEN + r"(?:\^?[-−]?\d+)?"
+UNIT = _UNIT_POWER + r"(?:\s*[·*/.]?\s*" + _UNIT_POWER + ")*"
+
+# Unit symbol -> (factor to SI, exponents of kg, m, s, A, K, mol, cd). "°c" has its own
+# dimension: with the offset to kelvin it only ever compares equal to itself.
+def _dim(kg=0, m=0, s=0, a=0, k=0, mol=0, cd=0, degc=0):
+    return (kg, m, s, a, k, mol, cd, degc)
+
+SI_UNITS = {
+    "kg": (1.0, _dim(kg=1)), "g": (1e-3, _dim(kg=1)), "mg": (1e-6, _dim(kg=1)),
+    "m": (1.0, _dim(m=1)), "km": (1e3, _dim(m=1)), "cm": (1e-2, _dim(m=1)), "mm": (1e-3, _dim(m=1)),
+    "s": (1.0, _dim(s=1)), "min": (60.0, _dim(s=1)), "h": (3600.0, _dim(s=1)),
+    "n": (1.0, _dim(kg=1, m=1, s=-2)), "j": (1.0, _dim(kg=1, m=2, s=-2)),
+    "w": (1.0, _dim(kg=1, m=2, s=-3)), "pa": (1.0, _dim(kg=1, m=-1, s=-2)),
+    "a": (1.0, _dim(a=1)), "v": (1.0, _dim(kg=1, m=2, s=-3, a=-1)),
+    "ohm": (1.0, _dim(kg=1, m=2, s=-3, a=-2)), "ω": (1.0, _dim(kg=1, m=2, s=-3, a=-2)),
+    "hz": (1.0, _dim(s=-1)), "l": (1e-3, _dim(m=3)), "ml": (1e-6, _dim(m=3)),
+    "k": (1.0, _dim(k=1)), "mol": (1.0, _dim(mol=1)), "cd": (1.0, _dim(cd=1)), "°c": (1.0, _dim(degc=1)),
+}
+_UNIT_PART = re.compile(r"\s*(?:(/)|(" + _UNIT_TOKEN + r")(?:\^?([-−]?\d+))?)\s*[·*.]?", re.IGNORECASE)
+
+NUMBER_WITH_UNIT = re.compile(
+    r"^\s*(?:ans(?:wer)?\s*[:=]?\s*)?(?:[a-z]\s*=\s*)?([-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)\s*(" + UNIT + r")?\s*\.?\s*$",
+    re.IGNORECASE,
+)
+
+def _normalize_text(text: str) -> str:
+    text = text.lower().strip()
+    text = re.sub(r"^(ans(wer)?\s*[:\-]?\s*)", "", text)
+    text = re.sub(r"[()\[\]\"'`.,;:!?]", " ", text)
+    text = re.sub(r"\b(the|a|an)\b", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+def _normalize_unit(unit: Optional[str]) -> str:
+    if not unit:
+        return ""
+    unit = unit.strip().lower().rstrip(".")
+    unit = UNIT_ALIASES.get(unit, unit)
+    unit = re.sub(r"[\s·*^]", "", unit)
+    # "m/s2" -> "ms-2", "m/s" -> "ms-1"
+    unit = re.sub(r"/([a-z°]+)(\d*)", lambda m: f"{m.group(1)}-{m.group(2) or '1'}", unit)
+    return unit
+
+def to_si(unit: str) -> Optional[Tuple[float, tuple]]:
+    """(factor, dimension) of a unit: "N/m2" and "Pa" both give (1.0, kg m-1 s-2). None if unreadable."""
+    factor, dims, sign, pos = 1.0, [0] * 8, 1, 0
+    unit = unit.strip().lower().rstrip(".")
+    while pos < len(unit):
+        m = _UNIT_PART.match(unit, pos)
+        if not m or m.end() == pos:
+            return None
+        pos = m.end()
+        if m.group(1):
+            # Everything after "/" is in the denominator: "J/kg K"
+            sign = -1
+            continue
+        symbol = UNIT_ALIASES.get(m.group(2), m.group(2))
+        power = sign * int((m.group(3) or "1").replace("−", "-"))
+        unit_factor, unit_dims = SI_UNITS[symbol]
+        factor *= unit_factor ** power
+        dims = [d + power * u for d, u in zip(dims, unit_dims)]
+    return factor, tuple(dims)
+
+def _close(got: float, expected: float) -> bool:
+    return abs(got - expected) <= NUMERIC_TOLERANCE * max(abs(expected), 1e-9)
+
+def parse_options(question: str) -> List[Tuple[str, str]]:
+    """[(label, option_text), ...] for option lines like 'iii. (kilogram)'."""
+    options = []
+    for line in question.splitlines():
+        m = OPTION_LINE.match(line)
+        if m:
+            options.append((m.group(1).lower(), _normalize_text(m.group(2))))
+    return options
+
+def _resolve_option(answer: str, options: List[Tuple[str, str]]) -> Optional[int]:
+    """Index of the single option the answer points at (by label and/or text), else None."""
+    labels = [label for label, _ in options]
+    texts = [text for _, text in options]
+    m = OPTION_LABEL.match(answer)
+    if m and m.group(1).lower() in labels:
+        label_idx = labels.index(m.group(1).lower())
+        rest = _normalize_text(m.group(2) or m.group(3) or "")
+        if not rest or rest == texts[label_idx]:
+            return label_idx
+        return None  # label and text disagree
+
+    norm = _normalize_text(answer)
+    hits = [i for i, text in enumerate(texts) if text and norm == text]
+    return hits[0] if len(hits) == 1 else None
+
+def classify(question: str, base_answer: str) -> Optional[str]:
+    """Returns 'mcq', 'numeric', 'keyword', or None for subjective questions."""
+    if not question or not base_answer:
+        return None
+    if len(base_answer.split()) > MAX_STUDENT_WORDS:
+        return None
+
+    options = parse_options(question)
+    if len(options) >= 2 and _resolve_option(base_answer, options) is not None:
+        return "mcq"
+    if NUMBER_WITH_UNIT.match(base_answer):
+        return "numeric"
+    words = _normalize_text(base_answer).split()
+    if 0 < len(words) <= MAX_KEYWORD_WORDS and not any(ch.isdigit() for ch in base_answer):
+        return "keyword"
+    return None
+
+def _grade(kind: str, question: str, base_answer: str, student_ans: str) -> Optional[Tuple[float, str, List[dict]]]:
+    """(credit fraction 0..1, explanation, deductions), or None when unsure."""
+    if len(student_ans.split()) > MAX_STUDENT_WORDS:
+        return None
+
+    if kind == "mcq":
+        options = parse_options(question)
+        expected = _resolve_option(base_answer, options)
+        chosen = _resolve_option(student_ans, options)
+        if chosen is None:
+            return None
+        label, text = options[chosen]
+        if chosen == expected:
+            return 1.0, f"Chose option {label} ({text}), which is correct.", []
+        return 0.0, f"Chose option {label} ({text}); the correct option is {options[expected][0]}.", []
+
+    if kind == "numeric":
+        exp, got = NUMBER_WITH_UNIT.match(base_answer), NUMBER_WITH_UNIT.match(student_ans)
+        if not got:
+            return None
+        exp_val, got_val = float(exp.group(1)), float(got.group(1))
+        exp_unit, got_unit = (exp.group(2) or "").strip(), (got.group(2) or "").strip()
+        if exp_unit and got_unit:
+            # Compare quantities, not spellings: "1 kg" is "1000 g", "5 N m" is "5 J"
+            exp_si, got_si = to_si(exp_unit), to_si(got_unit)
+            if exp_si is None or got_si is None:
+                return None
+            if "°c" in (exp_unit + got_unit).lower() and _normalize_unit(exp_unit) != _normalize_unit(got_unit):
+                return None  # kelvin vs celsius needs the offset, leave it to the LLM
+            if got_si[1] != exp_si[1]:
+                return 0.0, f"Wrong unit: '{got_unit}' does not measure the same quantity as '{exp_unit}'.", []
+            if not _close(got_val * got_si[0], exp_val * exp_si[0]):
+                return 0.0, f"{got_val:g} {got_unit} does not match the expected {exp_val:g} {exp_unit}.", []
+            return 1.0, f"{got_val:g} {got_unit} matches the expected {exp_val:g} {exp_unit}.", []
+        if not _close(got_val, exp_val):
+            return 0.0, f"Value {got_val} does not match the expected {exp_val}.", []
+        if exp_unit:
+            policy = {"policy": "Missing unit", "deduction": f"{round(1 - MISSING_UNIT_CREDIT, 2)} of the marks"}
+            return MISSING_UNIT_CREDIT, f"Correct value {got_val} but the unit ({exp_unit}) is missing.", [policy]
+        return 1.0, f"Value {got_val} {got_unit} matches the expected answer.".replace("  ", " "), []
+
+    if kind == "keyword":
+        expected, got = _normalize_text(base_answer), _normalize_text(student_ans)
+        if got == expected or _normalize_unit(got) == _normalize_unit(expected):
+            return 1.0, f"'{student_ans.strip()}' matches the expected answer.", []
+        # No textual match is not proof of a wrong answer (synonyms, spelling variants,
+        # "H2O" for "water"): only the LLM can mark it wrong
+        return None
+
+    return None
+
+def grade_objective(rubric: Rubric, student_ans: str) -> Optional[ConsensusReport]:
+    """Grades objective questions locally. Returns None if the LLM path should handle it."""
+    if not OBJECTIVE_FAST_PATH:
+        return None
+    kind = classify(rubric.question or "", rubric.base_answer or "")
+    if kind is None:
+        return None
+    graded = _grade(kind, rubric.question, rubric.base_answer, student_ans)
+    if graded is None:
+        return None
+
+    credit, explanation, deductions = graded
+    total = rubric.total_possible_score
+    score = round(credit * total, 2)
+    status = "Full Match" if credit == 1.0 else ("Partial Match" if credit > 0 else "Incorrect")
+
+    report = GradingReport(
+        final_score=score,
+        max_possible=total,
+        confidence_score=1.0,
+        verdicts=[ClaimVerdict(
+            student_claim=student_ans.strip(),
+            rubric_item_matched=rubric.base_answer.strip(),
+            status=status,
+            marks_awarded=score,
+            reasoning=explanation,
+            scoring_logic_summary=f"Objective ({kind}) question graded deterministically: {credit:g} x {total:g} = {score:g}.",
+        )],
+        policy_deductions=deductions,
+        hitl_flag=False,
+        feedback_for_student="Correct." if credit == 1.0 else explanation,
+    )
+    return ConsensusReport(consensus_score=score, score_variance=0.0, hitl_flag=False, individual_runs=[report])
+
+# The LLM only sees these rubrics for answers the local grader could not settle (a
+# synonym, a formula, a value in words), so they must say what else counts as correct.
+OBJECTIVE_INTENTS = {
+    "mcq": "Objective (mcq) question: the student must choose the correct option.",
+    "numeric": "Objective (numeric) question: the student must give the expected quantity.",
+    "keyword": "Objective (keyword) question: the student must name the expected term.",
+}
+OBJECTIVE_FLEXIBILITY = {
+    "mcq": "The option may be given by its label, its text, or both.",
+    "numeric": "Equivalent units ('1 kg' for '1000 g') and values written in words are correct.",
+    "keyword": (
+        "Synonyms, spelling variants, symbols and formulas of the expected term ('H2O' for "
+        "'water', 'vapourisation' for 'evaporation') earn full marks; only a different term is wrong."
+    ),
+}
+
+def objective_rubric(inputs: dict) -> Optional[Rubric]:
+    """A rubric built without the LLM for objective questions (None for subjective ones)."""
+    if not OBJECTIVE_FAST_PATH:
+        return None
+    kind = classify(inputs["question"], inputs["base_ans"])
+    if kind is None:
+        return None
+
+    return Rubric(
+        sub_class=inputs["class_level"],
+        subject=inputs["subject"],
+        chapter=inputs["chapter"],
+        total_possible_score=inputs["total_score"],
+        question=inputs["question"],
+        base_answer=inputs["base_ans"],
+        base_retrieved_context=[],
+        student_retrieved_context=[],
+        base_answer_decomposition=[AtomicContentUnit(
+            acu_type="unit" if kind == "numeric" else "concept",
+            content=inputs["base_ans"],
+            max_weight=inputs["total_score"],
+        )],
+        student_answer_decomposition=[],
+        logic_guidelines=EvaluationLogic(
+            question_intent=OBJECTIVE_INTENTS[kind],
+            # Assumptions are rendered into the eval prompt, so the flexibility rule goes there too
+            assumptions=["Case, articles and punctuation are ignored.", OBJECTIVE_FLEXIBILITY[kind]]
+                + ([f"Numeric answers within {NUMERIC_TOLERANCE:.0%} are accepted."] if kind == "numeric" else []),
+            strict_policies=["Missing unit: partial credit only."] if kind == "numeric" else [],
+            flexibility_strategy=OBJECTIVE_FLEXIBILITY[kind],
+        ),
+    )
@@ -0,0 +1,191 @@
+import os
+import re
+from textwrap import dedent
+from typing import List, Iterable
+
+from .schema import Rubric, BaseRubric, AtomicContentUnit, RetrievedChunk
+
+# --- Prompt Builder ---
+# Rubric items and textbook context are rendered as short numbered lines instead of
+# Python reprs, and retrieved context is deduplicated and cut to a token budget.
+# Every prompt is laid out static-first: fixed instructions, then per-question data,
+# then per-student data. The three consensus runs and every student of a batch share
+# the longest possible prefix, which is what provider-side context caching reuses.
+
+PROMPT_CONTEXT_TOKENS = int(os.environ.get("PROMPT_CONTEXT_TOKENS", 1200))  # textbook context per prompt
+PROMPT_CHUNK_TOKENS = int(os.environ.get("PROMPT_CHUNK_TOKENS", 300))       # any single chunk
+CHARS_PER_TOKEN = 4  # Gemini averages ~4 characters per token on English text
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count, good enough for budgeting and rate limiting."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate(text: str, max_tokens: int) -> str:
+    """Cuts `text` to about `max_tokens`, at a word boundary."""
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:limit].rsplit(" ", 1)[0]
+    return cut + " …"
+
+
+def _norm(text: str) -> str:
+    return re.sub(r"\W+", " ", text.lower()).strip()
+
+
+# --- Rendering ---
+
+def render_units(units: List[AtomicContentUnit]) -> str:
+    """'1. [concept, 1 mark] content' per unit; empty optional fields are left out."""
+    if not units:
+        return "None"
+    lines = []
+    for i, unit in enumerate(units, start=1):
+        line = f"{i}. [{unit.acu_type}, {unit.max_weight:g} mark{'s' if unit.max_weight != 1 else ''}] {unit.content}"
+        if unit.raw_student_text:
+            line += f' (student wrote: "{unit.raw_student_text}")'
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def render_list(items: Iterable[str]) -> str:
+    items = [item for item in items if item]
+    return "\n".join(f"- {item}" for item in items) if items else "None"
+
+
+def render_context(chunks: List[RetrievedChunk], budget: int = PROMPT_CONTEXT_TOKENS,
+                   exclude: Iterable[RetrievedChunk] = ()) -> str:
+    """
+    Chunks in relevance order, skipping repeats (same chunk_id or same text, also
+    against `exclude`), each cut to PROMPT_CHUNK_TOKENS, until `budget` tokens are used.
+    """
+    seen_ids = {c.chunk_id for c in exclude if c.chunk_id}
+    seen_text = {_norm(c.content) for c in exclude}
+    lines, used = [], 0
+    for chunk in chunks:
+        key = _norm(chunk.content)
+        if not key or key in seen_text or (chunk.chunk_id and chunk.chunk_id in seen_ids):
+            continue
+        seen_text.add(key)
+        if chunk.chunk_id:
+            seen_ids.add(chunk.chunk_id)
+
+        text = truncate(chunk.content.strip(), min(PROMPT_CHUNK_TOKENS, budget - used))
+        line = f"[{len(lines) + 1}] ({chunk.source_metadata}) {text}"
+        cost = count_tokens(line)
+        if lines and used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(lines) if lines else "None"
+
+
+# --- Rubric generation ---
+
+BASE_RUBRIC_INSTRUCTIONS = dedent("""\
+    ROLE: You are an expert Lead Teacher creating a precise grading rubric.
+
+    TASK: Analyze the question and perfect answer below. Use the Textbook Context as the
+    ultimate scientific truth to verify all claims.
+
+    INSTRUCTIONS:
+    1. THE BREAKDOWN: Break the Perfect Answer into the smallest individual facts or steps
+       (Information Bits). Assign a portion of the TOTAL MARKS to each bit.
+    2. INTENT & POLICY:
+       - Identify the core concept the student must prove they understand (question_intent).
+       - Set 'assumptions' (e.g., acceptable synonyms or rounding).
+       - Set 'strict_policies' (e.g., marks deducted if units are missing).
+       - Set 'flexibility_strategy': how to credit correct knowledge that is not in the perfect answer.
+    """)
+
+STUDENT_DELTA_INSTRUCTIONS = dedent("""\
+    ROLE: You are an expert Lead Teacher extending an existing grading rubric for one student.
+
+    TASK: Analyze the student response against the rubric's essential facts. Use the
+    Textbook Context as the ultimate scientific truth to verify all claims.
+
+    INSTRUCTIONS:
+    1. STUDENT ANALYSIS: Identify and list every individual claim the student made in their written answer.
+    2. FLEXIBILITY CHECK: If the student mentioned a fact that is correct according to the Textbook
+       Context but NOT in the essential facts, list it as an 'alternative_valid_point'.
+    3. MAPPING: For the student's claims, explain in the 'reasoning' field how well they match
+       the essential facts or the textbook notes.
+    """)
+
+
+def base_rubric_prompt(inputs: dict, base_context: List[RetrievedChunk]) -> str:
+    return (
+        f"{BASE_RUBRIC_INSTRUCTIONS}\n"
+        f"QUESTION: {inputs['question']}\n"
+        f"PERFECT ANSWER: {inputs['base_ans']}\n"
+        f"TOTAL MARKS: {inputs['total_score']:g}\n\n"
+        f"TEXTBOOK CONTEXT:\n{render_context(base_context)}\n"
+    )
+
+
+def student_delta_prompt(inputs: dict, base_rubric: BaseRubric, student_context: List[RetrievedChunk],
+                         base_context: List[RetrievedChunk] = ()) -> str:
+    # Question-level data first, the student's answer and context last
+    return (
+        f"{STUDENT_DELTA_INSTRUCTIONS}\n"
+        f"QUESTION: {inputs['question']}\n"
+        f"ESSENTIAL FACTS (already decided):\n{render_units(base_rubric.base_answer_decomposition)}\n\n"
+        f"STUDENT'S WRITTEN ANSWER: {inputs['student_ans']}\n\n"
+        f"TEXTBOOK CONTEXT (student-specific):\n{render_context(student_context, exclude=base_context)}\n"
+    )
+
+
+# --- Evaluation ---
+
+EVAL_INSTRUCTIONS = dedent("""\
+    ROLE: You are a Lead Academic Examiner known for extreme precision.
+
+    TASK: Grade the STUDENT ANSWER strictly against the MASTER RUBRIC.
+    You must justify every fraction of a mark awarded or deducted.
+
+    STRICT GRADING PROCEDURE:
+    STEP 1: CLAIM EXTRACTION & MATCHING
+    - Identify every distinct scientific claim in the Student Answer.
+    - Compare each claim against the ESSENTIAL FACTS.
+      - IF MATCH: Award full marks. Status = "Full Match". Quote the Rubric item matched.
+      - IF NO MATCH: Check ALTERNATIVE ALLOWED FACTS.
+        - IF MATCH: Award full marks. Status = "Alternative Correct".
+      - IF NO MATCH IN EITHER: Award 0 marks. Status = "Incorrect".
+    STEP 2: PARTIAL CREDIT CHECK
+    - If a claim is vaguely correct but missing keywords (e.g., "It pushes" instead of "Force applied"),
+      check the rubric's ASSUMPTIONS.
+    - If acceptable, award marks. If too vague, mark "Partial Match" and give 50%.
+    STEP 3: POLICY AUDIT (DEDUCTIONS)
+    - Scan the entire answer against the NEGATIVE MARKING POLICIES.
+    - If a rule is violated (e.g., "No units"), apply the deduction immediately.
+    - Record the exact policy text and the amount deducted.
+    STEP 4: FINAL CALCULATION
+    - (Sum of Marks from Claims) - (Total Deductions) = Final Score.
+    - CAP the score: it cannot exceed the TOTAL MAX SCORE or be less than 0.
+    STEP 5: GENERATE REPORT
+    - 'scoring_logic_summary': a plain-text summary of the math (e.g., "Student earned 2.0 from facts,
+      got 1.0 bonus for alternative, lost 0.5 for missing units.").
+    - 'verdicts': the judgment for every claim.
+    - 'feedback_for_student': constructive feedback based on what was missing.
+    """)
+
+
+def eval_prefix(rubric: Rubric) -> str:
+    """Instructions + rubric: identical for every run and every student graded on this rubric."""
+    logic = rubric.logic_guidelines
+    return (
+        f"{EVAL_INSTRUCTIONS}\n"
+        f"MASTER RUBRIC\n"
+        f"A. ESSENTIAL FACTS:\n{render_units(rubric.base_answer_decomposition)}\n"
+        f"B. ALTERNATIVE ALLOWED FACTS (credit these if Essential Facts are missing):\n"
+        f"{render_units(rubric.alternative_valid_points)}\n"
+        f"C. NEGATIVE MARKING POLICIES (strict deductions):\n{render_list(logic.strict_policies)}\n"
+        f"D. ASSUMPTIONS:\n{render_list(logic.assumptions)}\n"
+        f"E. TOTAL MAX SCORE: {rubric.total_possible_score:g}\n"
+    )
+
+
+def eval_prompt(prefix: str, student_ans: str) -> str:
+    return f'{prefix}\nSTUDENT ANSWER: "{student_ans}"\n'
@@ -0,0 +1,114 @@
+import os
+import time
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Provider Registry ---
+# Network clients (Pinecone, Gemini) and the on-disk indexes are built on first use,
+# once per process, and shared by every request and worker slot. Importing the app
+# therefore needs neither network access nor API keys; the API builds everything in
+# warm_up() at startup and /readyz reports when that has finished.
+
+PINECONE_INDEX = os.environ.get("PINECONE_INDEX", "dronacharya")
+# Set to the index host (from the Pinecone console) to skip the describe call at startup
+PINECONE_HOST = os.environ.get("PINECONE_HOST", "")
+# Connections kept open to the index; matches the retrieval thread pool by default
+PINECONE_POOL_THREADS = int(os.environ.get("PINECONE_POOL_THREADS", os.environ.get("RETRIEVAL_THREADS", 32)))
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
+
+
+class ProviderRegistry:
+    """Named, lazily built singletons. `get` is thread-safe and builds each provider once."""
+
+    def __init__(self):
+        self._factories = {}    # name -> (factory, warm)
+        self._instances = {}
+        self._errors = {}       # name -> last build/warm error
+        self._timings = {}      # name -> seconds spent building + warming
+        self._lock = threading.RLock()
+        self.ready = False
+
+    def register(self, name: str, factory, warm=None):
+        """`factory()` builds the provider; optional `warm(instance)` pre-opens connections."""
+        self._factories[name] = (factory, warm)
+
+    def get(self, name: str):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                start = time.perf_counter()
+                try:
+                    self._instances[name] = self._factories[name][0]()
+                except Exception as e:
+                    self._errors[name] = str(e)
+                    raise
+                self._errors.pop(name, None)
+                self._timings[name] = time.perf_counter() - start
+            return self._instances[name]
+
+    def warm_up(self) -> bool:
+        """Builds every provider and runs its warm hook. Returns True when all succeeded."""
+        ok = True
+        for name, (_, warm) in list(self._factories.items()):
+            try:
+                instance = self.get(name)
+                if warm is not None:
+                    start = time.perf_counter()
+                    warm(instance)
+                    self._timings[name] += time.perf_counter() - start
+                self._errors.pop(name, None)
+            except Exception as e:
+                print(f"⚠️ Warm-up of '{name}' failed: {e}")
+                self._errors[name] = str(e)
+                ok = False
+        self.ready = ok
+        return ok
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "providers": {
+                name: {
+                    "loaded": name in self._instances,
+                    "seconds": round(self._timings.get(name, 0.0), 3),
+                    "error": self._errors.get(name),
+                }
+                for name in self._factories
+            },
+        }
+
+
+providers = ProviderRegistry()
+
+
+# --- Clients ---
+# Modules register the providers their configuration needs (retriever.py, workflow.py),
+# so warm_up() never builds a client the process will not use.
+
+def pinecone_client():
+    from pinecone import Pinecone
+
+    return Pinecone(api_key=os.environ.get("PINECONE_API_KEY"))
+
+
+def pinecone_index():
+    """Data-plane client with a connection pool sized for concurrent queries."""
+    pc = providers.get("pinecone")
+    if PINECONE_HOST:
+        return pc.Index(host=PINECONE_HOST, pool_threads=PINECONE_POOL_THREADS)
+    return pc.Index(PINECONE_INDEX, pool_threads=PINECONE_POOL_THREADS)
+
+
+def gemini(temperature: float):
+    """Factory for a Gemini chat model (the import alone takes about a second, so it happens here)."""
+    def build():
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        # Retries are owned by llm_scheduler (backoff + AIMD), so the client does not retry on its own
+        return ChatGoogleGenerativeAI(model=GEMINI_MODEL, temperature=temperature, max_retries=0)
+    return build
@@ -0,0 +1,127 @@
+import orjson
+import ormsgpack
+from fastapi import HTTPException, Response
+from pydantic import BaseModel
+
+# --- Response Views ---
+# Grading responses can be large: every run carries its verdicts, reasoning and feedback.
+# Callers pick how much they need with ?view=:
+#   full            the whole ConsensusReport (default)
+#   representative  consensus fields + the one run closest to the consensus score
+#   summary         consensus_score, score_variance, hitl_flag, cache_hit
+# Reports are projected before encoding, so the smaller views also skip dumping the runs.
+
+VIEWS = ("full", "representative", "summary")
+SUMMARY_FIELDS = ("consensus_score", "score_variance", "hitl_flag", "cache_hit")
+
+
+def check_view(view: str) -> str:
+    if view not in VIEWS:
+        raise HTTPException(status_code=400, detail=f"view must be one of {list(VIEWS)}.")
+    return view
+
+
+def _field(obj, name):
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name)
+
+
+def representative_run(report):
+    """The run whose score is closest to the consensus (the first one on a tie)."""
+    runs = _field(report, "individual_runs") or []
+    if not runs:
+        return None
+    target = _field(report, "consensus_score")
+    return min(runs, key=lambda run: abs(_field(run, "final_score") - target))
+
+
+def report_view(report, view: str = "full"):
+    """Projects a ConsensusReport (model or dict, e.g. from the job store) onto `view`."""
+    if report is None or view == "full":
+        return report
+    out = {name: _field(report, name) for name in SUMMARY_FIELDS}
+    if view == "representative":
+        out["runs"] = len(_field(report, "individual_runs") or [])
+        out["representative_run"] = representative_run(report)
+    return out
+
+
+def sheet_view(sheet, view: str = "full"):
+    """AnswerSheetReport with every per-question report projected onto `view`."""
+    if view == "full":
+        return sheet
+    out = sheet.model_dump(exclude={"questions": {"__all__": {"report"}}})
+    for item, grade in zip(out["questions"], sheet.questions):
+        item["report"] = report_view(grade.report, view)
+    return out
+
+
+def view_responses(model) -> dict:
+    """
+    OpenAPI `responses=` for endpoints shaped by ?view= and Accept. They return a raw
+    Response, so there is no response_model: the schema shown is the full view.
+    """
+    return {200: {
+        "model": model,
+        "description": (
+            f"{model.__name__} with view=full (schema below). view=representative and view=summary "
+            f"replace every ConsensusReport with {{{', '.join(SUMMARY_FIELDS)}}} "
+            "(representative adds 'runs' and 'representative_run'). "
+            "MessagePack instead of JSON with Accept: application/msgpack."
+        ),
+        "content": {MSGPACK_TYPES[0]: {}},
+    }}
+
+
+# --- Encoding ---
+# JSON by default (orjson, or pydantic-core for a bare model); MessagePack when the
+# Accept header asks for it. Compression is negotiated separately by GZipMiddleware.
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+
+def _default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Cannot encode {type(obj).__name__}")
+
+
+def _media_ranges(accept: str) -> dict:
+    """Accept header -> {media range: q}, e.g. "application/msgpack;q=0" -> {"application/msgpack": 0.0}."""
+    ranges = {}
+    for item in (accept or "").split(","):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        if not media_type:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        media_type = media_type.lower()
+        ranges[media_type] = max(q, ranges.get(media_type, 0.0))
+    return ranges
+
+
+def wants_msgpack(accept: str) -> bool:
+    """MessagePack only when named with q > 0, and not ranked below JSON."""
+    ranges = _media_ranges(accept)
+    msgpack_q = max((ranges.get(t, 0.0) for t in MSGPACK_TYPES), default=0.0)
+    json_q = max(ranges.get(t, 0.0) for t in ("application/json", "application/*", "*/*"))
+    return msgpack_q > 0 and msgpack_q >= json_q
+
+
+def dumps_json(data) -> bytes:
+    if isinstance(data, BaseModel):
+        return data.model_dump_json().encode("utf-8")
+    return orjson.dumps(data, default=_default)
+
+
+def encode(data, accept: str = None, status_code: int = 200) -> Response:
+    """`data` is a model or plain data possibly containing models."""
+    if wants_msgpack(accept):
+        body = ormsgpack.packb(data, option=ormsgpack.OPT_SERIALIZE_PYDANTIC)
+        return Response(body, status_code=status_code, media_type="application/msgpack")
+    return Response(dumps_json(data), status_code=status_code, media_type="application/json")
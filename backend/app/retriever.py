@@ -1,35 +1,284 @@
 import os
-from pinecone import Pinecone
-from dotenv import load_dotenv
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from .schema import RetrievedChunk
+from .vector_index import PineconeBackend, LocalIndex
+from .lexical_index import BM25Index, reciprocal_rank_fusion
+from .cache import LRUCache, content_key
+from .metrics import timed_call, in_pool
+from .providers import providers, pinecone_client, pinecone_index
 
-load_dotenv()
-
-# Initialize Pinecone
-pc = Pinecone(api_key=os.environ.get("PINECONE_API_KEY"))
-index = pc.Index("dronacharya")
+# Pinecone serves the query embeddings (and the index, unless RETRIEVAL_BACKEND=local).
+# Clients and indexes come from the provider registry: nothing connects or loads at import.
 EMBED_MODEL = "llama-text-embed-v2"
 
-def get_relevant_context(query: str, top_k: int = 3):
-    """Fetches relevant context from Pinecone."""
+# Retrieval backend: "pinecone" (remote index) or "local" (built by vectorstore.py --backend local)
+RETRIEVAL_BACKEND = os.environ.get("RETRIEVAL_BACKEND", "pinecone")
+LOCAL_INDEX_DIR = os.environ.get(
+    "LOCAL_INDEX_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", "local_index"),
+)
+
+# Retrieval mode: "vector" (dense only), "hybrid" (dense + BM25 through reciprocal rank
+# fusion) or "lexical" (BM25 only: no embedding call, for when embedding is slow or down).
+# The BM25 index is built by vectorstore.py next to the vector index.
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "vector")
+LEXICAL_INDEX_DIR = os.environ.get(
+    "LEXICAL_INDEX_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", "bm25_index"),
+)
+RRF_K = int(os.environ.get("RRF_K", 60))
+HYBRID_CANDIDATES = int(os.environ.get("HYBRID_CANDIDATES", 4))  # each retriever returns top_k x this
+
+if RETRIEVAL_MODE == "hybrid" and not os.path.exists(os.path.join(LEXICAL_INDEX_DIR, "manifest.json")):
+    print(f"⚠️ No BM25 index at {LEXICAL_INDEX_DIR}: hybrid retrieval falls back to vector only.")
+    RETRIEVAL_MODE = "vector"
+
+def _pinecone_backend():
+    return PineconeBackend(pinecone_index())
+
+def _lexical_index():
+    if not os.path.exists(os.path.join(LEXICAL_INDEX_DIR, "manifest.json")):
+        raise RuntimeError(f"RETRIEVAL_MODE={RETRIEVAL_MODE} needs a BM25 index at {LEXICAL_INDEX_DIR} (run vectorstore.py).")
+    return BM25Index(LEXICAL_INDEX_DIR)
+
+# --- Providers ---
+# A missing or broken index fails its provider (reported by warm_up and /readyz), not the import.
+if RETRIEVAL_MODE != "lexical":
+    providers.register("pinecone", pinecone_client)
+    if RETRIEVAL_BACKEND == "local":
+        providers.register("vector_backend", lambda: LocalIndex(LOCAL_INDEX_DIR))
+    else:
+        # describe_index_stats opens the pooled HTTPS connection before the first real query
+        providers.register("vector_backend", _pinecone_backend, warm=lambda b: b.index.describe_index_stats())
+if RETRIEVAL_MODE in ("hybrid", "lexical"):
+    providers.register("lexical_index", _lexical_index)
+
+def index_version() -> str:
+    """Version of the indexes being served (builds them on first use)."""
+    vector = providers.get("vector_backend").version if RETRIEVAL_MODE != "lexical" else ""
+    lexical = providers.get("lexical_index").version if RETRIEVAL_MODE != "vector" else ""
+    return f"{RETRIEVAL_BACKEND}:{vector}:{RETRIEVAL_MODE}:{lexical}"
+
+# Caches: query text -> embedding, and (query, top_k) -> matches.
+# The match cache is tagged with the version of the indexes this process serves (the
+# manifest version of a local/BM25 index, INDEX_VERSION for Pinecone). Indexes are loaded
+# once, so an index rebuilt on disk is picked up, and the cache invalidated, at the next
+# restart; after re-ingesting into Pinecone, bump INDEX_VERSION and restart.
+# Set RETRIEVAL_CACHE_DB to a file path to keep both across restarts.
+RETRIEVAL_CACHE_DB = os.environ.get("RETRIEVAL_CACHE_DB")
+embed_cache = LRUCache(
+    "embed",
+    max_bytes=int(os.environ.get("EMBED_CACHE_MB", 64)) * 1024 * 1024,
+    disk_path=RETRIEVAL_CACHE_DB,
+    version=EMBED_MODEL,
+)
+query_cache = LRUCache(
+    "query",
+    max_bytes=int(os.environ.get("QUERY_CACHE_MB", 16)) * 1024 * 1024,
+    disk_path=RETRIEVAL_CACHE_DB,
+    version=None,  # set from index_version() before the first lookup
+)
+
+# The Pinecone client is blocking, so async callers run it on a dedicated pool
+# instead of the default executor (which FastAPI/anyio also draws from).
+RETRIEVAL_THREADS = int(os.environ.get("RETRIEVAL_THREADS", 32))
+_retrieval_pool = ThreadPoolExecutor(max_workers=RETRIEVAL_THREADS, thread_name_prefix="retrieval")
+
+def _sync_query_cache():
+    query_cache.set_version(index_version())
+
+def embed_queries(queries):
+    """Embeds several query strings with ONE inference call (cached ones are skipped)."""
+    keys = [content_key(EMBED_MODEL, q) for q in queries]
+    vectors = [embed_cache.get(k) for k in keys]
+    missing = [i for i, v in enumerate(vectors) if v is None]
+
+    if missing:
+        pc = providers.get("pinecone")
+        with timed_call("embed"):
+            res = pc.inference.embed(
+                model=EMBED_MODEL,
+                inputs=[queries[i] for i in missing],
+                parameters={"input_type": "query"}
+            )
+        for i, emb in zip(missing, res):
+            vectors[i] = list(emb.values)
+            embed_cache.set(keys[i], vectors[i])
+    return vectors
+
+def embed_query(query: str):
+    """Embeds a query string, served from the embedding cache when possible."""
+    return embed_queries([query])[0]
+
+def cache_stats():
+    return {"embed": embed_cache.stats(), "query": query_cache.stats()}
+
+def retrieval_scope(class_level=None, subject=None, chapter=None) -> dict:
+    """Maps request fields onto chunk metadata ("General" chapter = whole subject)."""
+    scope = {}
+    if class_level:
+        scope["class"] = str(class_level)
+    if subject:
+        scope["subject"] = subject
+    if chapter and chapter != "General":
+        if str(chapter).isdigit():
+            scope["Unit_index"] = int(chapter)
+        else:
+            # Matched case-insensitively by the backends; folded here so cache keys agree too
+            scope["Unit_name"] = chapter.casefold()
+    return scope
+
+def _scope_fallbacks(scope):
+    """Narrowest first: the full scope, then without the chapter, then the whole index."""
+    if not scope:
+        return [None]
+    chain = [scope]
+    wider = {k: v for k, v in scope.items() if k not in ("Unit_index", "Unit_name")}
+    if wider and wider != scope:
+        chain.append(wider)
+    chain.append(None)
+    return chain
+
+def _search(vector, top_k, scope):
+    backend = providers.get("vector_backend")
+    for filter in _scope_fallbacks(scope):
+        with timed_call("index_query"):
+            matches = backend.query(vector, top_k=top_k, filter=filter)
+        if matches:
+            return matches
+    return []
+
+def _lexical_search(query, top_k, scope):
+    lexical = providers.get("lexical_index")
+    for filter in _scope_fallbacks(scope):
+        with timed_call("lexical_query"):
+            matches = lexical.query(query, top_k=top_k, filter=filter)
+        if matches:
+            return [{**m, "reason": f"BM25: {round(m['score'], 4)}"} for m in matches]
+    return []
+
+def _hybrid_search(query, vector, top_k, scope):
+    """Dense and BM25 candidates for the same scope level, fused by rank."""
+    backend, lexical = providers.get("vector_backend"), providers.get("lexical_index")
+    for filter in _scope_fallbacks(scope):
+        n = top_k * HYBRID_CANDIDATES
+        with timed_call("index_query"):
+            dense = backend.query(vector, top_k=n, filter=filter)
+        with timed_call("lexical_query"):
+            sparse = lexical.query(query, top_k=n, filter=filter)
+        if dense or sparse:
+            return reciprocal_rank_fusion([("vector", dense), ("bm25", sparse)], top_k, RRF_K)
+    return []
+
+def _retrieve(query, vector, top_k, scope):
+    """Search for one query in the configured RETRIEVAL_MODE (`vector` is None in lexical mode)."""
+    if RETRIEVAL_MODE == "lexical":
+        return _lexical_search(query, top_k, scope)
+    if RETRIEVAL_MODE == "hybrid":
+        return _hybrid_search(query, vector, top_k, scope)
+    return _search(vector, top_k, scope)
+
+def _source_label(meta: dict) -> str:
+    """e.g. 'Book | Class 10 Science | Unit 1: Scientific study | p.1 | Scientific Method'"""
+    parts = [meta.get("type", "Textbook")]
+    if meta.get("class") or meta.get("subject"):
+        parts.append(f"Class {meta.get('class', '?')} {meta.get('subject', '')}".strip())
+    if "Unit_index" in meta:
+        parts.append(f"Unit {meta['Unit_index']}: {meta.get('Unit_name', '')}".rstrip(": "))
+    page = meta.get("page") or meta.get("pages")
+    if page:
+        parts.append(f"p.{page}")
+    if meta.get("topic"):
+        parts.append(meta["topic"])
+    return " | ".join(str(p) for p in parts)
+
+def _to_chunks(matches):
+    chunks = []
+    for match in matches:
+        chunks.append(RetrievedChunk(
+            chunk_id=match["id"],
+            content=match["metadata"].get("text_content", ""),
+            source_metadata=_source_label(match["metadata"]),
+            relevance_reason=match.get("reason") or f"Similarity: {round(match['score'], 4)}"
+        ))
+    return chunks
+
+def dedupe_chunks(results):
+    """Keeps each chunk_id only in the first result list it shows up in."""
+    seen = set()
+    deduped = []
+    for chunks in results:
+        kept = []
+        for chunk in chunks:
+            if chunk.chunk_id in seen:
+                continue
+            seen.add(chunk.chunk_id)
+            kept.append(chunk)
+        deduped.append(kept)
+    return deduped
+
+def get_relevant_context(query: str, top_k: int = 3, scope: dict = None):
+    """Fetches relevant context from the configured backend and RETRIEVAL_MODE, limited to `scope` if given."""
     try:
-        res = pc.inference.embed(
-            model=EMBED_MODEL,
-            inputs=[query],
-            parameters={"input_type": "query"}
-        )
-        query_vec = res[0].values
-
-        results = index.query(vector=query_vec, top_k=top_k, include_metadata=True)
-
-        chunks = []
-        for match in results["matches"]:
-            chunks.append(RetrievedChunk(
-                content=match["metadata"].get("text_content", ""),
-                source_metadata="Textbook",
-                relevance_reason=f"Similarity: {round(match['score'], 4)}"
-            ))
-        return chunks
+        _sync_query_cache()
+        query_key = content_key(query, top_k, scope)
+        matches = query_cache.get(query_key)
+        if matches is None:
+            vector = embed_query(query) if RETRIEVAL_MODE != "lexical" else None
+            matches = _retrieve(query, vector, top_k, scope)
+            query_cache.set(query_key, matches)
+        return _to_chunks(matches)
     except Exception as e:
         print(f"Error in retrieval: {e}")
         return []
+
+async def aget_scoped_contexts(queries, scopes, top_k: int = 3):
+    """
+    Like aget_relevant_contexts, but every query has its own scope (e.g. the questions
+    of a paper from different chapters). Still one embed call for all uncached queries.
+    No deduplication across queries.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        if query_cache.version is None:
+            # First lookup: the indexes may still have to be loaded, so not on the event loop
+            await loop.run_in_executor(_retrieval_pool, _sync_query_cache)
+        else:
+            _sync_query_cache()
+        keys = [content_key(q, top_k, scope) for q, scope in zip(queries, scopes)]
+        results = [query_cache.get(k) for k in keys]
+        missing = [i for i, m in enumerate(results) if m is None]
+
+        if missing:
+            texts = [queries[i] for i in missing]
+            if RETRIEVAL_MODE == "lexical":
+                vectors = [None] * len(texts)
+            else:
+                vectors = await loop.run_in_executor(_retrieval_pool, in_pool(embed_queries), texts)
+            found = await asyncio.gather(*(
+                loop.run_in_executor(_retrieval_pool, in_pool(_retrieve), queries[i], vec, top_k, scopes[i])
+                for i, vec in zip(missing, vectors)
+            ))
+            for i, matches in zip(missing, found):
+                results[i] = matches
+                query_cache.set(keys[i], matches)
+
+        return [_to_chunks(matches) for matches in results]
+    except Exception as e:
+        print(f"Error in retrieval: {e}")
+        return [[] for _ in queries]
+
+async def aget_relevant_contexts(queries, top_k: int = 3, scope: dict = None, dedupe: bool = True):
+    """
+    Multi-query retrieval: all uncached queries are embedded in one batched call,
+    then their top-k searches run concurrently. With `dedupe`, a chunk returned for
+    an earlier query is dropped from the later ones. Lexical mode makes no embed call.
+    `scope` (see retrieval_scope) narrows the search, widening again if it comes back empty.
+    """
+    chunks = await aget_scoped_contexts(queries, [scope] * len(queries), top_k)
+    return dedupe_chunks(chunks) if dedupe else chunks
+
+async def aget_relevant_context(query: str, top_k: int = 3, scope: dict = None):
+    """Async version of get_relevant_context for the async graph nodes."""
+    return (await aget_relevant_contexts([query], top_k, scope=scope))[0]
@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from .schema import Rubric
+from .cache import content_key
+from .providers import providers
+
+RUBRIC_STORE_DB = os.environ.get(
+    "RUBRIC_STORE_DB",
+    os.path.join(os.path.dirname(__file__), "..", "rubrics.db"),
+)
+RUBRIC_CACHE_SIZE = int(os.environ.get("RUBRIC_CACHE_SIZE", 256))
+
+
+def rubric_fingerprint(rubric: Rubric, body: str = None) -> str:
+    """Content-derived rubric ID: identical rubrics always get the same one. `body` is the rubric's JSON if already dumped."""
+    return "rub_" + content_key(body or rubric.model_dump_json())[:24]
+
+
+def open_rubric_db(db_path: str) -> sqlite3.Connection:
+    db = sqlite3.connect(db_path, check_same_thread=False)
+    db.execute("CREATE TABLE IF NOT EXISTS rubrics (rubric_id TEXT PRIMARY KEY, body TEXT)")
+    db.commit()
+    return db
+
+
+class RubricStore:
+    """
+    Server-side rubric registry. Rubrics are stored as JSON in SQLite under a
+    content-derived ID, and the most recently used ones are kept parsed in memory
+    so /evaluate never re-validates the same rubric twice.
+    `db()` returns the SQLite connection; it is called on first use, not at import.
+    """
+
+    def __init__(self, db, cache_size: int = 256):
+        self.cache_size = cache_size
+        self._parsed = OrderedDict()  # rubric_id -> Rubric
+        self._lock = threading.Lock()
+        self._db = db
+
+    def _remember(self, rubric_id: str, rubric: Rubric):
+        self._parsed[rubric_id] = rubric
+        self._parsed.move_to_end(rubric_id)
+        while len(self._parsed) > self.cache_size:
+            self._parsed.popitem(last=False)
+
+    def put(self, rubric: Rubric) -> str:
+        """Stores a rubric and returns its ID (identical rubrics share one ID)."""
+        body = rubric.model_dump_json()
+        rubric_id = rubric_fingerprint(rubric, body)
+        with self._lock:
+            db = self._db()
+            db.execute("INSERT OR IGNORE INTO rubrics (rubric_id, body) VALUES (?, ?)", (rubric_id, body))
+            db.commit()
+            self._remember(rubric_id, rubric)
+        return rubric_id
+
+    def get(self, rubric_id: str) -> Optional[Rubric]:
+        with self._lock:
+            rubric = self._parsed.get(rubric_id)
+            if rubric is not None:
+                self._parsed.move_to_end(rubric_id)
+                return rubric
+
+            row = self._db().execute("SELECT body FROM rubrics WHERE rubric_id = ?", (rubric_id,)).fetchone()
+            if row is None:
+                return None
+            rubric = Rubric.model_validate_json(row[0])
+            self._remember(rubric_id, rubric)
+            return rubric
+
+    def delete(self, rubric_id: str) -> bool:
+        with self._lock:
+            self._parsed.pop(rubric_id, None)
+            db = self._db()
+            cur = db.execute("DELETE FROM rubrics WHERE rubric_id = ?", (rubric_id,))
+            db.commit()
+            return cur.rowcount > 0
+
+
+providers.register("rubric_db", lambda: open_rubric_db(RUBRIC_STORE_DB))
+rubric_store = RubricStore(lambda: providers.get("rubric_db"), RUBRIC_CACHE_SIZE)
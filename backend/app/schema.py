@@ -1,8 +1,9 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import List, Literal, Optional, Dict
 
 # --- Core Models (Same as before) ---
 class RetrievedChunk(BaseModel):
+    chunk_id: Optional[str] = None
     content: str
     source_metadata: str
     relevance_reason: str
@@ -25,6 +26,8 @@ class Rubric(BaseModel):
     subject: str
     chapter: str
     total_possible_score: float
+    question: Optional[str] = None
+    base_answer: Optional[str] = None
     base_retrieved_context: List[RetrievedChunk]
     student_retrieved_context: List[RetrievedChunk]
     base_answer_decomposition: List[AtomicContentUnit]
@@ -32,6 +35,16 @@ class Rubric(BaseModel):
     logic_guidelines: EvaluationLogic
     alternative_valid_points: List[AtomicContentUnit] = []
 
+class BaseRubric(BaseModel):
+    """Student-independent half of a Rubric, generated once per question."""
+    base_answer_decomposition: List[AtomicContentUnit]
+    logic_guidelines: EvaluationLogic
+
+class StudentRubricDelta(BaseModel):
+    """Per-student half of a Rubric, layered on top of a BaseRubric."""
+    student_answer_decomposition: List[AtomicContentUnit]
+    alternative_valid_points: List[AtomicContentUnit] = []
+
 # app/schema.py
 
 # ... (Keep Rubric and other models the same) ...
@@ -69,6 +82,7 @@ class ConsensusReport(BaseModel):
     
     # This list holds the full detailed report for EACH of the 3 runs
     individual_runs: List[GradingReport]
+    cache_hit: Optional[Literal["exact", "near_duplicate"]] = Field(None, description="Set when the grade was reused from an earlier identical/similar answer.")
 
     
 class RubricRequest(BaseModel):
@@ -81,7 +95,116 @@ class RubricRequest(BaseModel):
     subject: str = "Science"
     chapter: str = "General"
 
+class StoredRubric(Rubric):
+    """A Rubric plus the ID it is registered under on the server."""
+    rubric_id: str
+
 class EvaluationRequest(BaseModel):
-    """Input for Step 2: Evaluation. PASS THE FULL RUBRIC HERE."""
+    """Input for Step 2: Evaluation. Pass the rubric_id from Step 1 (or the full rubric)."""
     student_ans: str
-    rubric: Rubric
\ No newline at end of file
+    rubric_id: Optional[str] = None
+    rubric: Optional[Rubric] = None
+    use_cache: bool = Field(True, description="Reuse the grade of an identical (or near-identical) earlier answer.")
+
+    @model_validator(mode="after")
+    def check_rubric_source(self):
+        if self.rubric is None and self.rubric_id is None:
+            raise ValueError("Provide either 'rubric_id' or 'rubric'.")
+        return self
+class BatchEvaluationRequest(BaseModel):
+    """Input for batch evaluation: one rubric, a whole class of answers."""
+    rubric_id: Optional[str] = None
+    rubric: Optional[Rubric] = None
+    student_answers: List[str]
+    student_ids: Optional[List[str]] = Field(None, description="Optional IDs, same order as student_answers.")
+    use_cache: bool = True
+
+    @model_validator(mode="after")
+    def check_rubric_source(self):
+        if self.rubric is None and self.rubric_id is None:
+            raise ValueError("Provide either 'rubric_id' or 'rubric'.")
+        return self
+
+class JobAnswer(BaseModel):
+    student_id: str
+    student_ans: str
+
+class JobQuestion(BaseModel):
+    """One exam question and every student's answer to it."""
+    question: str
+    base_ans: str
+    total_score: float
+    class_level: str = "10"
+    subject: str = "Science"
+    chapter: str = "General"
+    rubric_id: Optional[str] = Field(None, description="Grade against this registered rubric instead of generating one per student.")
+    answers: List[JobAnswer]
+
+class GradingJobRequest(BaseModel):
+    """Input for a background grading session (a whole exam)."""
+    questions: List[JobQuestion]
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: Literal["queued", "running", "completed", "cancelled"]
+    total: int
+    done: int
+    failed: int
+    cancelled: int
+    running: int
+    pending: int
+    created_at: float
+    updated_at: float
+
+class JobResult(BaseModel):
+    seq: int
+    question_index: int
+    student_id: str
+    status: Literal["pending", "running", "done", "failed", "cancelled"]
+    rubric_id: Optional[str] = None
+    report: Optional[ConsensusReport] = None
+    error: Optional[str] = None
+
+class JobResultsPage(BaseModel):
+    job_id: str
+    offset: int
+    limit: int
+    total: int
+    items: List[JobResult]
+
+class SheetQuestion(BaseModel):
+    """One question of a paper together with the student's answer to it."""
+    question: str
+    base_ans: str
+    total_score: float
+    student_ans: str
+    class_level: str = "10"
+    subject: str = "Science"
+    chapter: str = "General"
+    rubric_id: Optional[str] = Field(None, description="Grade against this registered rubric instead of generating one.")
+
+class AnswerSheetRequest(BaseModel):
+    """Input for grading one student's whole answer sheet in a single call."""
+    student_id: Optional[str] = None
+    questions: List[SheetQuestion]
+    use_cache: bool = True
+
+class QuestionGrade(BaseModel):
+    question_index: int
+    rubric_id: Optional[str] = None
+    score: Optional[float] = Field(None, description="None when the question could not be graded.")
+    max_score: float
+    hitl_flag: bool = Field(..., description="Runs disagreed, or the question could not be graded.")
+    report: Optional[ConsensusReport] = None
+    error: Optional[str] = None
+
+class AnswerSheetReport(BaseModel):
+    """Per-question consensus grades and the paper total."""
+    student_id: Optional[str] = None
+    total_score: float = Field(..., description="Sum over the graded questions only.")
+    max_score: float
+    complete: bool = Field(..., description="False when a question could not be graded: the total is not final.")
+    hitl_flag: bool = Field(..., description="True when any question needs a human look.")
+    flagged_questions: List[int]
+    ungraded_questions: List[int]
+    questions: List[QuestionGrade]
@@ -0,0 +1,174 @@
+import os
+import json
+import uuid
+import numpy as np
+
+def _replace_file(path: str, name: str, write):
+    """Writes to a temp file and swaps it in, so readers (and live mmaps) never see a partial file."""
+    tmp = os.path.join(path, name + ".tmp")
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, os.path.join(path, name))
+
+# --- Retrieval Backends ---
+# Every backend answers a top-k similarity query with Pinecone-shaped matches:
+# [{"id": ..., "score": ..., "metadata": {...}}, ...]
+# `filter` is a plain equality dict on chunk metadata, e.g. {"class": "10", "subject": "Science"}.
+# Chapter names are compared case-insensitively: sources and requests spell them
+# "Scientific Study", "Scientific study" or "scientific study".
+
+CASEFOLDED_FIELDS = ("Unit_name",)
+
+
+def _fold(key: str, value):
+    return value.casefold() if key in CASEFOLDED_FIELDS and isinstance(value, str) else value
+
+
+def matches_filter(metadata: dict, filter: dict) -> bool:
+    return all(_fold(k, metadata.get(k)) == _fold(k, v) for k, v in filter.items())
+
+
+def _pinecone_condition(key: str, value) -> dict:
+    if key not in CASEFOLDED_FIELDS or not isinstance(value, str):
+        return {"$eq": value}
+    # Pinecone cannot casefold stored metadata: match the usual spellings of the name
+    variants = {value, value.casefold(), value.capitalize(), value.title(), value.upper()}
+    return {"$in": sorted(variants)}
+
+class VectorBackend:
+    """Interface for anything that can answer a top-k vector query."""
+
+    # Changes whenever the indexed content changes (used to invalidate caches)
+    version = "unversioned"
+
+    def query(self, vector, top_k: int = 3, filter: dict = None):
+        raise NotImplementedError
+
+
+class PineconeBackend(VectorBackend):
+    """Thin wrapper around a Pinecone index (network round-trip per query)."""
+
+    def __init__(self, index, version: str = None):
+        self.index = index
+        self.version = version or self.default_version()
+
+    @staticmethod
+    def default_version() -> str:
+        # Pinecone has no content version; bump INDEX_VERSION after re-ingesting
+        return os.environ.get("INDEX_VERSION", "1")
+
+    def query(self, vector, top_k: int = 3, filter: dict = None):
+        pinecone_filter = {k: _pinecone_condition(k, v) for k, v in filter.items()} if filter else None
+        results = self.index.query(vector=vector, top_k=top_k, include_metadata=True, filter=pinecone_filter)
+        return [
+            {"id": m["id"], "score": m["score"], "metadata": dict(m["metadata"] or {})}
+            for m in results["matches"]
+        ]
+
+
+class LocalIndex(VectorBackend):
+    """
+    In-process index: a memory-mapped NumPy matrix of unit-normalised embeddings
+    plus a JSON metadata sidecar. Vectors can be stored as int8 with a per-row
+    scale, which cuts memory 4x at a negligible cost in ranking quality.
+
+    Layout of `path/`:
+        manifest.json   dim, count, quantized, version
+        vectors.npy     float32 [count, dim] or int8 [count, dim]
+        scales.npy      float32 [count] (int8 only)
+        metadata.json   {"ids": [...], "metadata": [...]}
+    """
+
+    BLOCK_ROWS = 65536  # rows scored per matmul, bounds temporary memory for int8
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        with open(os.path.join(path, "metadata.json"), "r", encoding="utf-8") as f:
+            sidecar = json.load(f)
+
+        self.ids = sidecar["ids"]
+        self.metadata = sidecar["metadata"]
+        self.quantized = self.manifest["quantized"]
+        self.version = self.manifest["version"]
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(path, "scales.npy")) if self.quantized else None
+        self._partitions = {}  # frozen filter -> row indices
+
+    @staticmethod
+    def build(path: str, ids, vectors, metadata, quantize: bool = False):
+        """Writes a new index to `path` and returns it loaded."""
+        os.makedirs(path, exist_ok=True)
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2:
+            # No vectors: np.asarray([]) is 1-D, keep the [count, dim] shape
+            matrix = matrix.reshape(len(matrix), 0)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.maximum(norms, 1e-12)
+
+        if quantize:
+            scales = np.abs(matrix).max(axis=1, initial=0.0) / 127.0
+            scales = np.maximum(scales, 1e-12).astype(np.float32)
+            stored = np.round(matrix / scales[:, None]).astype(np.int8)
+            _replace_file(path, "scales.npy", lambda f: np.save(f, scales))
+        else:
+            stored = matrix
+        _replace_file(path, "vectors.npy", lambda f: np.save(f, stored))
+
+        sidecar = {"ids": list(ids), "metadata": list(metadata)}
+        _replace_file(path, "metadata.json", lambda f: f.write(json.dumps(sidecar, ensure_ascii=False).encode("utf-8")))
+
+        manifest = {
+            "dim": int(matrix.shape[1]) if len(matrix) else 0,
+            "count": int(len(matrix)),
+            "quantized": quantize,
+            "version": uuid.uuid4().hex,
+        }
+        # Manifest goes last so a half-written index is never picked up
+        _replace_file(path, "manifest.json", lambda f: f.write(json.dumps(manifest).encode("utf-8")))
+        return LocalIndex(path)
+
+    def partition(self, filter: dict) -> np.ndarray:
+        """Row indices whose metadata matches `filter` (computed once per filter)."""
+        key = tuple(sorted(filter.items()))
+        rows = self._partitions.get(key)
+        if rows is None:
+            rows = np.array(
+                [i for i, meta in enumerate(self.metadata) if matches_filter(meta, filter)],
+                dtype=np.int64,
+            )
+            self._partitions[key] = rows
+        return rows
+
+    def _scores(self, q: np.ndarray, rows: np.ndarray = None) -> np.ndarray:
+        if rows is not None:
+            # Only the partition is scored, so cost follows the partition size
+            block = self.vectors[rows].astype(np.float32)
+            scores = block @ q
+            return scores * self.scales[rows] if self.quantized else scores
+        if not self.quantized:
+            return np.asarray(self.vectors @ q)
+        out = np.empty(len(self.ids), dtype=np.float32)
+        for start in range(0, len(out), self.BLOCK_ROWS):
+            block = self.vectors[start:start + self.BLOCK_ROWS].astype(np.float32)
+            out[start:start + len(block)] = (block @ q) * self.scales[start:start + len(block)]
+        return out
+
+    def query(self, vector, top_k: int = 3, filter: dict = None):
+        rows = self.partition(filter) if filter else None
+        if not self.ids or (rows is not None and len(rows) == 0):
+            return []
+        q = np.asarray(vector, dtype=np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+
+        scores = self._scores(q, rows)
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        row_ids = rows[top] if rows is not None else top
+
+        return [
+            {"id": self.ids[i], "score": float(s), "metadata": self.metadata[i]}
+            for i, s in zip(row_ids, scores[top])
+        ]
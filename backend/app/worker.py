@@ -0,0 +1,119 @@
+import os
+import uuid
+import socket
+import asyncio
+import argparse
+import traceback
+
+from .jobs import job_queue, JOB_LEASE_SECONDS
+from .rubric_store import rubric_store
+from .checkpoints import resumable_invoke, close_savers, forget
+from .cache import content_key
+from .llm_scheduler import llm_scheduler, llm_priority, BATCH
+from .providers import providers
+
+# --- Grading Worker ---
+# Run as many of these as the LLM quota allows, independently of the API:
+#   cd backend && LLM_PROCESSES=3 python -m app.worker --concurrency 8
+# Each process grades up to `concurrency` tasks at a time and shares the LLM scheduler
+# between them; workers on different machines only need to share jobs.db and rubrics.db.
+# The scheduler is per process: set LLM_PROCESSES (API + workers, here the API and two
+# workers) on all of them so they split the quota instead of each spending all of it.
+
+WORKER_CONCURRENCY = int(os.environ.get("WORKER_CONCURRENCY", 8))
+WORKER_POLL_SECONDS = float(os.environ.get("WORKER_POLL_SECONDS", 1.0))
+
+
+async def run_task(task: dict) -> dict:
+    """
+    Rubric (unless already checkpointed) then evaluation for one (question, student).
+    Both graphs run checkpointed under the task's ID, so a task picked up again after a
+    worker died keeps the LLM calls that had already finished.
+    """
+    payload = task["payload"]
+    rubric_id = task["rubric_id"]
+    key = f"{task['job_id']}#{task['seq']}"
+
+    if rubric_id is None:
+        result, _ = await resumable_invoke(
+            "rubric", {"inputs": payload["rubric_request"]}, key, content_key(payload["rubric_request"])
+        )
+        rubric_id = rubric_store.put(result["rubric"])
+        # A crash after this point resumes at the evaluation step
+        await asyncio.to_thread(job_queue.checkpoint_rubric, task["job_id"], task["seq"], task["worker"], rubric_id)
+
+    rubric = rubric_store.get(rubric_id)
+    if rubric is None:
+        raise ValueError(f"Unknown rubric_id '{rubric_id}'.")
+
+    result, _ = await resumable_invoke("evaluate", {
+        "inputs": {"student_ans": payload["student_ans"], "use_cache": True},
+        "rubric": rubric,
+        "rubric_id": rubric_id,
+    }, key, rubric_id)
+    report = result.get("final_report")
+    if not report:
+        raise RuntimeError("Evaluation failed.")
+    for run in report.individual_runs:
+        run.student_id = payload["student_id"]
+    return report.model_dump()
+
+
+async def slot_loop(worker: str, stop: asyncio.Event):
+    while not stop.is_set():
+        task = await asyncio.to_thread(job_queue.claim, worker)
+        if task is None:
+            try:
+                await asyncio.wait_for(stop.wait(), WORKER_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        name = f"{task['job_id']}#{task['seq']}"
+        try:
+            report = await run_task(task)
+            if await asyncio.to_thread(job_queue.complete, task["job_id"], task["seq"], worker, report):
+                print(f"✅ {name} graded")
+                # The job queue holds the result now: the checkpoints are no longer needed
+                await forget(name)
+            else:
+                print(f"⚠️ {name} graded, but its lease was lost: result dropped")
+        except Exception as e:
+            print(f"❌ {name} failed (attempt {task['attempts']}): {e}")
+            traceback.print_exc()
+            await asyncio.to_thread(job_queue.fail, task["job_id"], task["seq"], worker, str(e), task["attempts"])
+
+
+async def heartbeat(worker: str, stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), JOB_LEASE_SECONDS / 3)
+        except asyncio.TimeoutError:
+            await asyncio.to_thread(job_queue.renew, worker)
+
+
+async def run_worker(concurrency: int = WORKER_CONCURRENCY, stop: asyncio.Event = None):
+    # Every LLM call made by a worker is background work
+    llm_priority.set(BATCH)
+    worker = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    stop = stop or asyncio.Event()
+    # Build the clients up front; a provider that fails here is retried on first use
+    await asyncio.to_thread(providers.warm_up)
+    stats = llm_scheduler.stats()
+    print(f"👷 Worker {worker} started with {concurrency} slots "
+          f"(LLM share: 1/{stats['processes']}, {stats['rpm']:g} RPM, {stats['tpm']:g} TPM)")
+    try:
+        await asyncio.gather(heartbeat(worker, stop), *(slot_loop(worker, stop) for _ in range(concurrency)))
+    finally:
+        await close_savers()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs grading jobs from the job queue.")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY)
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_worker(args.concurrency))
+    except KeyboardInterrupt:
+        # Leases of tasks in flight expire and another worker resumes them
+        pass
@@ -1,185 +1,480 @@
+import os
+import asyncio
 import logging
-from typing import TypedDict, Optional
+import operator
+from typing import TypedDict, Optional, List, Annotated
 from langgraph.graph import StateGraph, END
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langgraph.types import Send
 
-from .schema import Rubric, GradingReport, RubricRequest, ConsensusReport
-from .retriever import get_relevant_context
+from .schema import (
+    Rubric, BaseRubric, StudentRubricDelta, RetrievedChunk,
+    GradingReport, ConsensusReport,
+    QuestionGrade, AnswerSheetReport,
+)
+from .retriever import aget_relevant_contexts, aget_scoped_contexts, retrieval_scope, dedupe_chunks
+from .cache import LRUCache, content_key
+from .objective import objective_rubric, grade_objective
+from .grade_cache import grade_cache
+from .rubric_store import rubric_fingerprint, rubric_store
+from .llm_scheduler import llm_scheduler, LLMOverloadedError
+from .metrics import timed_node
+from .providers import providers, gemini
+from . import prompts
 
 # Config
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("workflow")
 
 # LLMs
-llm_gen = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.1)
-llm_eval = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.4)
+# Built on first use by the provider registry (see providers.py), not at import.
+# Rubric generation is split: a per-question base rubric and a small per-student delta.
+# include_raw keeps the AIMessage so llm_scheduler can count prompt/completion tokens.
+providers.register("llm_gen", gemini(temperature=0.1))
+providers.register("llm_eval", gemini(temperature=0.4))
+providers.register("llm_base", lambda: providers.get("llm_gen").with_structured_output(BaseRubric, include_raw=True))
+providers.register("llm_delta", lambda: providers.get("llm_gen").with_structured_output(StudentRubricDelta, include_raw=True))
+providers.register("llm_grade", lambda: providers.get("llm_eval").with_structured_output(GradingReport, include_raw=True))
 
-structured_llm_gen = llm_gen.with_structured_output(Rubric)
-structured_llm_eval = llm_eval.with_structured_output(GradingReport)
+# Consensus grading
+# EVAL_RUNS runs are fired concurrently. In adaptive mode we start with EVAL_MIN_RUNS,
+# stop early if they agree within EVAL_AGREEMENT_TOLERANCE, and escalate up to
+# EVAL_MAX_RUNS when the spread crosses HITL_VARIANCE_THRESHOLD.
+EVAL_RUNS = int(os.environ.get("EVAL_RUNS", 3))
+EVAL_ADAPTIVE = os.environ.get("EVAL_ADAPTIVE", "false").lower() == "true"
+EVAL_MIN_RUNS = int(os.environ.get("EVAL_MIN_RUNS", 2))
+EVAL_AGREEMENT_TOLERANCE = float(os.environ.get("EVAL_AGREEMENT_TOLERANCE", 0.5))
+EVAL_MAX_RUNS = int(os.environ.get("EVAL_MAX_RUNS", 5))
+EVAL_MAX_CONCURRENCY = int(os.environ.get("EVAL_MAX_CONCURRENCY", 5))
+HITL_VARIANCE_THRESHOLD = 2
+
+# Answer sheets: questions of one paper graded at the same time
+SHEET_MAX_CONCURRENCY = int(os.environ.get("SHEET_MAX_CONCURRENCY", 16))
 
 # --- State Definitions ---
 class RubricState(TypedDict):
     inputs: dict
-    rag_data: dict
+    base_context: List[RetrievedChunk]
+    student_context: List[RetrievedChunk]
+    base_rubric: Optional[BaseRubric]
     rubric: Optional[Rubric]
 
 class EvalState(TypedDict):
     inputs: dict
     rubric: Optional[Rubric]
-    # Change this from GradingReport to ConsensusReport
+    rubric_id: Optional[str]
+    eval_prefix: str
+    eval_prompt: str
+    # Every finished grading run is appended here (runs execute in parallel)
+    runs: Annotated[List[GradingReport], operator.add]
     final_report: Optional[ConsensusReport]
 
+class SheetState(TypedDict):
+    # student_id, use_cache and "questions": one rubric-style inputs dict per question
+    inputs: dict
+    # Per question: pre-fetched RubricState fields ({} when no retrieval is needed)
+    prefetched: List[dict]
+    # One QuestionGrade per question, in completion order
+    grades: Annotated[List[QuestionGrade], operator.add]
+    sheet_report: Optional[AnswerSheetReport]
+
+# --- Base Rubric Memo ---
+# The student-independent half of a rubric only depends on (question, base_ans, total_score)
+# and the retrieval scope its context came from (class, subject, chapter), so it is generated
+# once and shared by every student answering that question.
+# Bump BASE_RUBRIC_VERSION whenever the base prompt or the key changes.
+BASE_RUBRIC_VERSION = "3"
+base_rubric_cache = LRUCache(
+    "base_rubric",
+    max_bytes=int(os.environ.get("BASE_RUBRIC_CACHE_MB", 32)) * 1024 * 1024,
+    disk_path=os.environ.get("BASE_RUBRIC_CACHE_DB"),
+    version=BASE_RUBRIC_VERSION,
+)
+_base_rubric_inflight = {}  # key -> asyncio.Task, so concurrent students share one generation
+
+def base_rubric_key(inputs: dict) -> str:
+    # Same question, other chapter: different context, so a different base rubric
+    return content_key(inputs["question"], inputs["base_ans"], inputs["total_score"], inputs_scope(inputs))
+
 # --- NODES ---
 
-def retrieval_node(state: RubricState):
+@timed_node("classify")
+async def classify_node(state: RubricState):
+    """Objective questions (MCQ, numeric, one-word) get a rubric without retrieval or LLM calls."""
+    rubric = objective_rubric(state["inputs"])
+    if rubric is not None:
+        logger.info("⚡ Objective Question: Local Rubric...")
+    return {"rubric": rubric}
+
+def route_rubric(state: RubricState):
+    return END if state.get("rubric") is not None else "retrieve"
+
+def retrieval_plan(inputs: dict):
+    """
+    The queries one rubric needs, plus the memoized base rubric entry if there is one
+    (then only the student context is fetched).
+    """
+    q = inputs["question"]
+    student_query = f"{q} {inputs['student_ans']}"
+    cached = base_rubric_cache.get(base_rubric_key(inputs))
+    if cached is not None:
+        return [student_query], cached
+    return [f"{q} {inputs['base_ans']}", student_query], None
+
+def retrieval_update(cached, results: List[List[RetrievedChunk]]) -> dict:
+    """Rubric state fields from the results of the retrieval_plan queries."""
+    if cached is not None:
+        logger.info("♻️ Reusing Base Rubric...")
+        base_context = [RetrievedChunk(**c) for c in cached["base_context"]]
+        (student_context,) = results
+        base_ids = {c.chunk_id for c in base_context}
+        return {
+            "base_rubric": BaseRubric(**cached["base_rubric"]),
+            "base_context": base_context,
+            "student_context": [c for c in student_context if c.chunk_id not in base_ids],
+        }
+
+    base_context, student_context = dedupe_chunks(results)
+    return {"base_rubric": None, "base_context": base_context, "student_context": student_context}
+
+def inputs_scope(inputs: dict) -> dict:
+    return retrieval_scope(inputs.get("class_level"), inputs.get("subject"), inputs.get("chapter"))
+
+@timed_node("retrieve")
+async def retrieval_node(state: RubricState):
+    """
+    Fetches base + student context in one multi-query call (one embed, concurrent searches).
+    If the base rubric is already memoized, only the student context is fetched.
+    Skipped when the caller already fetched the context (answer-sheet grading).
+    """
+    if state.get("student_context") is not None:
+        return {}
     logger.info("🔍 Retrieving Context...")
-    q = state["inputs"]["question"]
-    base_ans = state["inputs"]["base_ans"]
-    student_ans = state["inputs"]["student_ans"]
-    
-    base_context = get_relevant_context(f"{q} {base_ans}")
-    student_context = get_relevant_context(f"{q} {student_ans}")
-    
-    return {"rag_data": {"base": base_context, "student": student_context}}
-
-def rubric_generator_node(state: RubricState):
-    logger.info("🧠 Generating Rubric...")
+    queries, cached = retrieval_plan(state["inputs"])
+    results = await aget_relevant_contexts(queries, scope=inputs_scope(state["inputs"]), dedupe=False)
+    return retrieval_update(cached, results)
+
+@timed_node("base")
+async def base_rubric_node(state: RubricState):
+    """Student-independent rubric: memoized per (question, base_ans, total_score, scope)."""
+    if state.get("base_rubric") is not None:
+        return {}
+
     inputs = state["inputs"]
-    rag = state["rag_data"]
-
-    prompt = f"""
-    ROLE: You are an expert Lead Teacher creating a precise grading rubric.
-    
-    TASK:
-    Analyze the provided question, perfect answer, and student response. Use the 
-    Textbook Context as the ultimate scientific truth to verify all claims.
-    
-    INPUT DATA:
-    - Question: {inputs['question']}
-    - Perfect Answer: {inputs['base_ans']}
-    - Student's Written Answer: {inputs['student_ans']}
-    - Textbook Context (Standard): {[c.content for c in rag['base']]}
-    - Textbook Context (Student-specific): {[c.content for c in rag['student']]}
-    
-    INSTRUCTIONS:
-    1. THE BREAKDOWN: Break the 'Perfect Answer' into the smallest individual facts or steps (Information Bits). 
-       Assign a portion of the total {inputs['total_score']} marks to each bit.
-    
-    2. STUDENT ANALYSIS: Identify and list every individual claim the student made in their written answer.
-    
-    3. FLEXIBILITY CHECK: Look at the 'Student-specific Textbook Context'. If the student mentioned a 
-       fact that is correct according to the textbook but NOT in the perfect answer, list it as an 'alternative_valid_point'.
-    
-    4. INTENT & POLICY: 
-       - Identify the core concept the student must prove they understand (question_intent).
-       - Set 'assumptions' (e.g., acceptable synonyms or rounding).
-       - Set 'strict_policies' (e.g., marks deducted if units are missing).
-    
-    5. MAPPING: For the student's claims, explain in the 'reasoning' field how well they match 
-       the perfect answer or the textbook notes.
-    """
+    key = base_rubric_key(inputs)
+    task = _base_rubric_inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_generate_base_rubric(inputs, key, state["base_context"]))
+        _base_rubric_inflight[key] = task
+        task.add_done_callback(lambda _: _base_rubric_inflight.pop(key, None))
+    base_rubric = await asyncio.shield(task)
+    return {"base_rubric": base_rubric}
+
+async def _generate_base_rubric(inputs: dict, key: str, base_context: List[RetrievedChunk]):
+    logger.info("🧠 Generating Base Rubric...")
+
+    prompt = prompts.base_rubric_prompt(inputs, base_context)
+    base_rubric = await llm_scheduler.invoke(providers.get("llm_base"), prompt, name="base_rubric")
+    base_rubric_cache.set(key, {
+        "base_rubric": base_rubric.model_dump(),
+        "base_context": [c.model_dump() for c in base_context],
+    })
+    return base_rubric
+
+@timed_node("generate")
+async def rubric_generator_node(state: RubricState):
+    logger.info("🧠 Generating Student Delta...")
+    inputs = state["inputs"]
+    base_rubric = state["base_rubric"]
+    student_context = state["student_context"]
+
+    prompt = prompts.student_delta_prompt(inputs, base_rubric, student_context, state["base_context"])
 
+    delta = await llm_scheduler.invoke(providers.get("llm_delta"), prompt, name="student_delta")
 
-    rubric = structured_llm_gen.invoke(prompt)
+    rubric = Rubric(
+        sub_class=inputs["class_level"],
+        subject=inputs["subject"],
+        chapter=inputs["chapter"],
+        total_possible_score=inputs["total_score"],
+        question=inputs["question"],
+        base_answer=inputs["base_ans"],
+        base_retrieved_context=state["base_context"],
+        student_retrieved_context=student_context,
+        base_answer_decomposition=base_rubric.base_answer_decomposition,
+        student_answer_decomposition=delta.student_answer_decomposition,
+        logic_guidelines=base_rubric.logic_guidelines,
+        alternative_valid_points=delta.alternative_valid_points,
+    )
     return {"rubric": rubric}
-# app/workflow.py
-
-
-
-
-def evaluator_node(state: EvalState):
-    logger.info("⚖️ Evaluating (3 Parallel Runs)...")    
-    # 1. Recover the Rubric Object from the dictionary
-    rubric_dict = state["inputs"]["rubric"]
-    rubric = Rubric(**rubric_dict)
-    
-    student_ans = state["inputs"]["student_ans"]
-
-    # --- THE METICULOUS PROMPT ---
-    eval_prompt = f"""
-    ROLE: You are a Lead Academic Examiner known for extreme precision.
-    
-    TASK: Grade the STUDENT ANSWER strictly against the provided MASTER RUBRIC. 
-    You must justify every fraction of a mark awarded or deducted.
-    
-    --- 1. THE DATA ---
-    STUDENT ANSWER: "{student_ans}"
-    
-    MASTER RUBRIC:
-    A. ESSENTIAL FACTS (Max Score per item shown): 
-       {rubric.base_answer_decomposition}
-       
-    B. ALTERNATIVE ALLOWED FACTS (Credit these if Essential Facts are missing): 
-       {rubric.alternative_valid_points}
-       
-    C. NEGATIVE MARKING POLICIES (Strict Deductions): 
-       {rubric.logic_guidelines.strict_policies}
-       
-    D. TOTAL MAX SCORE: {rubric.total_possible_score}
-    
-    --- 2. THE STRICT GRADING PROCEDURE ---
-    
-    STEP 1: CLAIM EXTRACTION & MATCHING
-    - Identify every distinct scientific claim in the Student Answer.
-    - Compare each claim against the 'ESSENTIAL FACTS'.
-      - IF MATCH: Award full marks. Status = "Full Match". Quote the Rubric item matched.
-      - IF NO MATCH: Check 'ALTERNATIVE ALLOWED FACTS'.
-        - IF MATCH: Award full marks. Status = "Alternative Correct".
-      - IF NO MATCH IN EITHER: Award 0 marks. Status = "Incorrect".
-      
-    STEP 2: PARTIAL CREDIT CHECK
-    - If a student's claim is vaguely correct but missing keywords (e.g., "It pushes" instead of "Force applied"), check the Rubric's 'assumptions'.
-    - If acceptable, award marks. If too vague, mark "Partial Match" and give 50%.
-    
-    STEP 3: POLICY AUDIT (DEDUCTIONS)
-    - Scan the entire answer against 'NEGATIVE MARKING POLICIES'.
-    - If a rule is violated (e.g., "No units"), apply the deduction immediately.
-    - Record the exact policy text and the amount deducted.
-    
-    STEP 4: FINAL CALCULATION
-    - (Sum of Marks from Claims) - (Total Deductions) = Final Score.
-    - CAP the score: It cannot exceed {rubric.total_possible_score} or be less than 0.
-    
-    STEP 5: GENERATE REPORT
-    - 'scoring_logic_summary': Write a plain-text summary of the math (e.g., "Student earned 2.0 from facts, got 1.0 bonus for alternative, lost 0.5 for missing units.").
-    - 'verdicts': List the judgment for every claim.
-    - 'feedback_for_student': Constructive feedback based on what was missing.
+
+def build_eval_prefix(rubric: Rubric) -> str:
     """
+    Everything in the grading prompt that depends only on the rubric. It is built
+    once per rubric and shared by every run and every student in a batch.
+    """
+    return prompts.eval_prefix(rubric)
+
+def build_eval_prompt(prefix: str, student_ans: str) -> str:
+    # The student answer goes last, so the prefix stays cacheable on the provider side
+    return prompts.eval_prompt(prefix, student_ans)
+
+@timed_node("objective")
+async def objective_node(state: EvalState):
+    """Pre-classification: objective answers are graded locally and skip the LLM runs."""
+    rubric = state.get("rubric")
+    if rubric is None:
+        rubric = Rubric(**state["inputs"]["rubric"])
 
-    # Run the evaluation (Parallel Simulation)
-    # We run 3 times to ensure the logic holds up across different inference paths
-    reports = [structured_llm_eval.invoke(eval_prompt) for _ in range(3)]
+    report = grade_objective(rubric, state["inputs"]["student_ans"])
+    if report is not None:
+        logger.info("⚡ Objective Answer: Graded Locally...")
+    return {"rubric": rubric, "final_report": report}
 
+def route_evaluation(state: EvalState):
+    return END if state.get("final_report") is not None else "lookup"
+
+@timed_node("lookup")
+async def lookup_node(state: EvalState):
+    """Reuses the grade of an identical (or near-identical) answer to the same rubric."""
+    rubric_id = state.get("rubric_id") or rubric_fingerprint(state["rubric"])
+    report = None
+    if state["inputs"].get("use_cache", True):
+        report = grade_cache.get(rubric_id, state["inputs"]["student_ans"])
+        if report is not None:
+            logger.info(f"♻️ Reusing Grade ({report.cache_hit})...")
+    return {"rubric_id": rubric_id, "final_report": report}
+
+def route_lookup(state: EvalState):
+    return END if state.get("final_report") is not None else "evaluate"
+
+@timed_node("evaluate")
+async def evaluator_node(state: EvalState):
+    logger.info("⚖️ Preparing Evaluation...")
+    # 1. Recover the Rubric Object (batch callers pass it pre-parsed)
+    rubric = state.get("rubric")
+    if rubric is None:
+        rubric = Rubric(**state["inputs"]["rubric"])
+
+    prefix = state.get("eval_prefix") or build_eval_prefix(rubric)
+    eval_prompt = build_eval_prompt(prefix, state["inputs"]["student_ans"])
+
+    return {"rubric": rubric, "eval_prefix": prefix, "eval_prompt": eval_prompt}
+
+@timed_node("grade_run")
+async def grade_run_node(payload: dict):
+    """A single grading run. Several of these run concurrently per evaluation."""
+    logger.info(f"📝 Grading Run {payload['run_index'] + 1}...")
+    report = await llm_scheduler.invoke(providers.get("llm_grade"), payload["eval_prompt"], name="grade_run")
+    return {"runs": [report]}
+
+def _runs_needed(scores: List[float]) -> int:
+    """How many more grading runs to schedule given the scores we have so far."""
+    done = len(scores)
+    if not EVAL_ADAPTIVE:
+        return max(EVAL_RUNS - done, 0)
+
+    if done == 0:
+        return min(EVAL_MIN_RUNS, EVAL_RUNS)
+
+    spread = max(scores) - min(scores)
+    if done < EVAL_RUNS:
+        # Early stop: the first runs already agree
+        return 0 if spread <= EVAL_AGREEMENT_TOLERANCE else EVAL_RUNS - done
+    if spread > HITL_VARIANCE_THRESHOLD and done < EVAL_MAX_RUNS:
+        # Disagreement: get extra opinions before flagging for a human
+        return EVAL_MAX_RUNS - done
+    return 0
+
+def _tightest_cluster(scores: List[float], size: int) -> List[float]:
+    """The `size` scores that lie closest together (used to drop outlier runs)."""
+    ordered = sorted(scores)
+    windows = [ordered[i:i + size] for i in range(len(ordered) - size + 1)]
+    return min(windows, key=lambda w: w[-1] - w[0])
+
+def dispatch_runs(state: EvalState):
+    """Fans out the missing grading runs, or finishes when consensus is reached."""
+    runs = state.get("runs") or []
+    needed = _runs_needed([r.final_score for r in runs])
+    if needed == 0:
+        return END
+    logger.info(f"🔀 Dispatching {needed} Grading Run(s)...")
+    return [
+        Send("grade_run", {"eval_prompt": state["eval_prompt"], "run_index": len(runs) + i})
+        for i in range(needed)
+    ]
+
+def build_consensus(reports: List[GradingReport]) -> ConsensusReport:
+    """Consensus over the runs finished so far (also used for provisional results while streaming)."""
     # --- CONSENSUS LOGIC ---
     scores = [r.final_score for r in reports]
-    avg_score = sum(scores) / 3
-    
+
     # Calculate Variance
     variance = max(scores) - min(scores)
-    is_flagged = variance > 2
 
-    # Choose the report that is closest to the average (most representative)
-    consensus = ConsensusReport(
+    # If we escalated with extra runs, judge agreement on the closest EVAL_RUNS scores
+    core = scores
+    if len(scores) > EVAL_RUNS:
+        core = _tightest_cluster(scores, EVAL_RUNS)
+    avg_score = sum(core) / len(core)
+    is_flagged = max(core) - min(core) > HITL_VARIANCE_THRESHOLD
+
+    return ConsensusReport(
         consensus_score=round(avg_score, 2),
         score_variance=round(variance, 2),
         hitl_flag=is_flagged,
-        individual_runs=reports  # <--- WE SAVE ALL 3 HERE
+        individual_runs=list(reports)  # <--- WE SAVE ALL RUNS HERE
     )
 
+@timed_node("consensus")
+async def consensus_node(state: EvalState):
+    logger.info("🧮 Building Consensus...")
+    reports = state["runs"]
+    consensus = build_consensus(reports)
+
+    # Final (not provisional) consensus: remember it for identical answers
+    if _runs_needed([r.final_score for r in reports]) == 0 and state.get("rubric_id"):
+        grade_cache.put(state["rubric_id"], state["inputs"]["student_ans"], consensus)
+
     return {"final_report": consensus}
 
 # --- 1. Rubric Graph ---
 rubric_workflow = StateGraph(RubricState)
+rubric_workflow.add_node("classify", classify_node)
 rubric_workflow.add_node("retrieve", retrieval_node)
+rubric_workflow.add_node("base", base_rubric_node)
 rubric_workflow.add_node("generate", rubric_generator_node)
-rubric_workflow.set_entry_point("retrieve")
-rubric_workflow.add_edge("retrieve", "generate")
+rubric_workflow.set_entry_point("classify")
+rubric_workflow.add_conditional_edges("classify", route_rubric, ["retrieve", END])
+rubric_workflow.add_edge("retrieve", "base")
+rubric_workflow.add_edge("base", "generate")
 rubric_workflow.add_edge("generate", END)
 rubric_app = rubric_workflow.compile()
 
 # --- 2. Eval Graph (Direct) ---
 eval_workflow = StateGraph(EvalState)
+eval_workflow.add_node("objective", objective_node)
+eval_workflow.add_node("lookup", lookup_node)
 eval_workflow.add_node("evaluate", evaluator_node)
-eval_workflow.set_entry_point("evaluate")
-eval_workflow.add_edge("evaluate", END)
-eval_app = eval_workflow.compile()
\ No newline at end of file
+eval_workflow.add_node("grade_run", grade_run_node)
+eval_workflow.add_node("consensus", consensus_node)
+eval_workflow.set_entry_point("objective")
+eval_workflow.add_conditional_edges("objective", route_evaluation, ["lookup", END])
+eval_workflow.add_conditional_edges("lookup", route_lookup, ["evaluate", END])
+eval_workflow.add_conditional_edges("evaluate", dispatch_runs, ["grade_run", END])
+eval_workflow.add_edge("grade_run", "consensus")
+eval_workflow.add_conditional_edges("consensus", dispatch_runs, ["grade_run", END])
+eval_app = eval_workflow.compile().with_config(max_concurrency=EVAL_MAX_CONCURRENCY)
+
+# --- 3. Answer Sheet Graph ---
+# One student's whole paper: the context of every question is fetched with one batched
+# embed call, then each question goes through the rubric and eval graphs in parallel,
+# so a sheet takes about as long as its slowest question.
+
+@timed_node("sheet_retrieve")
+async def sheet_retrieval_node(state: SheetState):
+    """Batched retrieval for every question that needs a generated, non-objective rubric."""
+    questions = state["inputs"]["questions"]
+    plans = {}
+    for i, inputs in enumerate(questions):
+        if inputs.get("rubric_id") is None and objective_rubric(inputs) is None:
+            plans[i] = retrieval_plan(inputs)
+
+    queries, scopes = [], []
+    for i, (qs, _) in plans.items():
+        queries.extend(qs)
+        scopes.extend([inputs_scope(questions[i])] * len(qs))
+    if queries:
+        logger.info(f"🔍 Retrieving Context for {len(plans)} Question(s)...")
+    results = await aget_scoped_contexts(queries, scopes) if queries else []
+
+    prefetched, pos = [{} for _ in questions], 0
+    for i, (qs, cached) in plans.items():
+        prefetched[i] = retrieval_update(cached, results[pos:pos + len(qs)])
+        pos += len(qs)
+    return {"prefetched": prefetched}
+
+def dispatch_questions(state: SheetState):
+    sheet = state["inputs"]
+    logger.info(f"🔀 Dispatching {len(sheet['questions'])} Question(s)...")
+    return [
+        Send("grade_question", {
+            "index": i,
+            "inputs": inputs,
+            "prefetched": state["prefetched"][i],
+            "student_id": sheet.get("student_id"),
+            "use_cache": sheet.get("use_cache", True),
+        })
+        for i, inputs in enumerate(sheet["questions"])
+    ]
+
+@timed_node("grade_question")
+async def grade_question_node(payload: dict):
+    """Rubric (unless one is registered) and consensus grade for one question of the sheet."""
+    inputs = payload["inputs"]
+    rubric_id = inputs.get("rubric_id")
+    try:
+        if rubric_id is None:
+            result = await rubric_app.ainvoke({"inputs": inputs, **payload["prefetched"]})
+            rubric = result["rubric"]
+            rubric_id = rubric_store.put(rubric)
+        else:
+            rubric = rubric_store.get(rubric_id)
+            if rubric is None:
+                raise ValueError(f"Unknown rubric_id '{rubric_id}'.")
+
+        result = await eval_app.ainvoke({
+            "inputs": {"student_ans": inputs["student_ans"], "use_cache": payload["use_cache"]},
+            "rubric": rubric,
+            "rubric_id": rubric_id,
+        })
+        report = result.get("final_report")
+        if not report:
+            raise RuntimeError("Evaluation failed.")
+    except LLMOverloadedError:
+        # Not the question's fault: fail the sheet so the caller retries it later
+        raise
+    except Exception as e:
+        logger.error(f"❌ Question {payload['index'] + 1} failed: {e}")
+        grade = QuestionGrade(
+            question_index=payload["index"], rubric_id=rubric_id,
+            max_score=inputs["total_score"], hitl_flag=True, error=str(e),
+        )
+        return {"grades": [grade]}
+
+    if payload["student_id"]:
+        for run in report.individual_runs:
+            run.student_id = payload["student_id"]
+    grade = QuestionGrade(
+        question_index=payload["index"], rubric_id=rubric_id, score=report.consensus_score,
+        max_score=inputs["total_score"], hitl_flag=report.hitl_flag, report=report,
+    )
+    return {"grades": [grade]}
+
+@timed_node("sheet_total")
+async def sheet_total_node(state: SheetState):
+    logger.info("🧾 Totalling Answer Sheet...")
+    grades = sorted(state["grades"], key=lambda g: g.question_index)
+    flagged = [g.question_index for g in grades if g.hitl_flag]
+    # An ungraded question is not a zero: leave it out of the total and say so
+    ungraded = [g.question_index for g in grades if g.score is None]
+    report = AnswerSheetReport(
+        student_id=state["inputs"].get("student_id"),
+        total_score=round(sum(g.score for g in grades if g.score is not None), 2),
+        max_score=sum(g.max_score for g in grades),
+        complete=not ungraded,
+        hitl_flag=bool(flagged),
+        flagged_questions=flagged,
+        ungraded_questions=ungraded,
+        questions=grades,
+    )
+    return {"sheet_report": report}
+
+sheet_workflow = StateGraph(SheetState)
+sheet_workflow.add_node("prefetch", sheet_retrieval_node)
+sheet_workflow.add_node("grade_question", grade_question_node)
+sheet_workflow.add_node("total", sheet_total_node)
+sheet_workflow.set_entry_point("prefetch")
+sheet_workflow.add_conditional_edges("prefetch", dispatch_questions, ["grade_question"])
+sheet_workflow.add_edge("grade_question", "total")
+sheet_workflow.add_edge("total", END)
+sheet_app = sheet_workflow.compile().with_config(max_concurrency=SHEET_MAX_CONCURRENCY)
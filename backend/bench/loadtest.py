@@ -0,0 +1,105 @@
+"""
+Load test: async request path vs. the old blocking handlers.
+
+Run from the `backend/` folder:
+    python -m bench.loadtest --requests 200 --llm-latency 0.5
+
+Both apps run the same graphs against the stubs in `bench.stubs`. The blocking
+baseline holds one threadpool worker per request for its whole duration, which
+is what the old `def` handlers did.
+"""
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+
+from . import stubs
+
+stubs.install()
+# The stubs have no quota: lift the LLM scheduler limits so we measure the app itself
+for key, value in {"LLM_RPM": "1000000", "LLM_TPM": "1000000000",
+                   "LLM_INITIAL_CONCURRENCY": "10000", "LLM_MAX_CONCURRENCY": "10000"}.items():
+    os.environ.setdefault(key, value)
+# Keep benchmark rubrics, jobs and checkpoints out of the real stores
+_scratch = tempfile.mkdtemp(prefix="drona-loadtest-")
+os.environ.setdefault("RUBRIC_STORE_DB", os.path.join(_scratch, "rubrics.db"))
+os.environ.setdefault("JOBS_DB", os.path.join(_scratch, "jobs.db"))
+os.environ.setdefault("CHECKPOINT_DB", os.path.join(_scratch, "checkpoints.db"))
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+
+from app.main import app as async_app  # noqa: E402
+from app.schema import EvaluationRequest, ConsensusReport  # noqa: E402
+from app.workflow import eval_app  # noqa: E402
+
+RUBRIC_REQUEST = {
+    "question": "Why is joule a derived unit?",
+    "base_ans": "Work = force x displacement, so J = N x m, derived from base units.",
+    "student_ans": "Because it is made from newton and metre.",
+    "total_score": 2.0,
+}
+
+
+def build_blocking_app(loop) -> FastAPI:
+    blocking = FastAPI()
+
+    @blocking.post("/evaluate", response_model=ConsensusReport)
+    def evaluate_student(request: EvaluationRequest):
+        # The graph runs on the main loop while this worker thread blocks on it
+        inputs = {"student_ans": request.student_ans, "use_cache": False}
+        future = asyncio.run_coroutine_threadsafe(
+            eval_app.ainvoke({"inputs": inputs, "rubric": request.rubric}), loop
+        )
+        return future.result()["final_report"]
+
+    return blocking
+
+
+async def run_load(app, rubric: dict, n_requests: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one(i):
+            t0 = time.perf_counter()
+            r = await client.post("/evaluate", json={"student_ans": f"answer {i}", "rubric": rubric, "use_cache": False})
+            r.raise_for_status()
+            latencies.append(time.perf_counter() - t0)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(n_requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": n_requests,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(n_requests / elapsed, 1),
+        "p50_s": round(latencies[len(latencies) // 2], 3),
+        "max_s": round(latencies[-1], 3),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    args = parser.parse_args()
+    stubs.settings.llm_latency = args.llm_latency
+
+    transport = httpx.ASGITransport(app=async_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        r = await client.post("/generate-rubric", json=RUBRIC_REQUEST)
+        r.raise_for_status()
+        rubric = r.json()
+
+    blocking_app = build_blocking_app(asyncio.get_running_loop())
+    for name, app in (("blocking", blocking_app), ("async", async_app)):
+        result = await run_load(app, rubric, args.requests)
+        print(f"{name:>9}: {result}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
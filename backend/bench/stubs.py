@@ -0,0 +1,181 @@
+"""
+Deterministic local stand-ins for Gemini and Pinecone.
+
+Call `install()` BEFORE importing anything from `app`, so the app modules pick
+up the stubs instead of the real clients. No API keys or network needed.
+"""
+import asyncio
+import hashlib
+import random
+import time
+import typing
+from typing import Literal, get_args, get_origin
+
+from pydantic import BaseModel
+
+EMBED_DIM = 1024
+
+
+class StubSettings:
+    llm_latency = 0.5        # seconds per LLM call
+    embed_latency = 0.05     # seconds per embed call
+    query_latency = 0.05     # seconds per index query
+    llm_error_rate = 0.0     # fraction of LLM calls that fail
+    llm_error_code = 429     # 429 (rate limited) or 503 (transient)
+    embed_error_rate = 0.0
+    query_error_rate = 0.0
+    # Separate from the per-prompt seeds, so injected failures are reproducible too
+    rng = random.Random(0)
+
+
+settings = StubSettings()
+
+
+class StubAPIError(Exception):
+    """Looks like a provider error to llm_scheduler.is_rate_limited / is_transient."""
+
+    def __init__(self, code: int):
+        status = {429: "RESOURCE_EXHAUSTED", 503: "UNAVAILABLE"}.get(code, "INTERNAL")
+        super().__init__(f"{code} {status} (injected by bench.stubs)")
+        self.code = code
+
+
+def _maybe_fail(rate: float, code: int = 503):
+    if rate and settings.rng.random() < rate:
+        raise StubAPIError(code)
+
+
+def _seed(text: str) -> int:
+    return int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def fake_instance(model_cls, rnd: random.Random):
+    """Builds a valid instance of any of our Pydantic schemas from its field types."""
+    values = {}
+    for name, field in model_cls.model_fields.items():
+        values[name] = _fake_value(field.annotation, name, rnd)
+    return model_cls(**values)
+
+
+def _fake_value(annotation, name, rnd):
+    origin = get_origin(annotation)
+    if origin is typing.Union:
+        args = [a for a in get_args(annotation) if a is not type(None)]
+        return _fake_value(args[0], name, rnd)
+    if origin is Literal:
+        return get_args(annotation)[0]
+    if origin in (list, typing.List):
+        (item,) = get_args(annotation)
+        return [_fake_value(item, name, rnd) for _ in range(2)]
+    if origin in (dict, typing.Dict):
+        return {"policy": "stub", "amount": "0"}
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return fake_instance(annotation, rnd)
+    if annotation is bool:
+        return False
+    if annotation is float:
+        return round(rnd.uniform(1.0, 4.0), 1) if "score" in name else 1.0
+    if annotation is int:
+        return 1
+    return f"stub {name}"
+
+
+# --- Gemini ---
+
+class _StubMessage:
+    def __init__(self, prompt, parsed):
+        # Same ~4 characters per token rule the scheduler uses
+        self.usage_metadata = {
+            "input_tokens": len(str(prompt)) // 4,
+            "output_tokens": len(parsed.model_dump_json()) // 4,
+        }
+
+
+class StubStructuredLLM:
+    def __init__(self, schema, include_raw=False):
+        self.schema = schema
+        self.include_raw = include_raw
+
+    def _respond(self, prompt):
+        parsed = fake_instance(self.schema, random.Random(_seed(str(prompt))))
+        if self.include_raw:
+            return {"raw": _StubMessage(prompt, parsed), "parsed": parsed, "parsing_error": None}
+        return parsed
+
+    def invoke(self, prompt, *args, **kwargs):
+        time.sleep(settings.llm_latency)
+        _maybe_fail(settings.llm_error_rate, settings.llm_error_code)
+        return self._respond(prompt)
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        await asyncio.sleep(settings.llm_latency)
+        _maybe_fail(settings.llm_error_rate, settings.llm_error_code)
+        return self._respond(prompt)
+
+
+class StubChatModel:
+    def __init__(self, *args, **kwargs):
+        self.kwargs = kwargs
+
+    def with_structured_output(self, schema, include_raw=False, **kwargs):
+        return StubStructuredLLM(schema, include_raw)
+
+
+# --- Pinecone ---
+
+class _Embedding:
+    def __init__(self, values):
+        self.values = values
+
+
+class _StubInference:
+    def embed(self, model, inputs, parameters=None):
+        time.sleep(settings.embed_latency)
+        _maybe_fail(settings.embed_error_rate)
+        out = []
+        for text in inputs:
+            rnd = random.Random(_seed(text))
+            out.append(_Embedding([rnd.uniform(-1, 1) for _ in range(EMBED_DIM)]))
+        return out
+
+
+class _StubIndex:
+    def query(self, vector=None, top_k=3, include_metadata=True, **kwargs):
+        time.sleep(settings.query_latency)
+        _maybe_fail(settings.query_error_rate)
+        return {"matches": [
+            {
+                "id": f"stub_chunk_{i}",
+                "score": 0.9 - i * 0.05,
+                "metadata": {
+                    "text_content": f"Stub textbook passage {i}.",
+                    "class": "10", "subject": "Science", "type": "Book",
+                    "Unit_index": 1, "Unit_name": "Scientific study",
+                },
+            }
+            for i in range(top_k)
+        ]}
+
+    def upsert(self, vectors, **kwargs):
+        return {"upserted_count": len(vectors)}
+
+    def describe_index_stats(self, **kwargs):
+        time.sleep(settings.query_latency)
+        return {"dimension": EMBED_DIM, "total_vector_count": 0}
+
+
+class StubPinecone:
+    def __init__(self, *args, **kwargs):
+        self.inference = _StubInference()
+
+    def Index(self, *args, **kwargs):
+        return _StubIndex()
+
+
+def install():
+    """Swaps the real client classes for the stubs."""
+    import pinecone
+    import langchain_google_genai
+
+    pinecone.Pinecone = StubPinecone
+    langchain_google_genai.ChatGoogleGenerativeAI = StubChatModel
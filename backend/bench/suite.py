@@ -0,0 +1,328 @@
+"""
+Offline benchmark suite: the real graphs and FastAPI app against `bench.stubs`.
+
+Run from the `backend/` folder:
+    python -m bench.suite                                  # all scenarios, default levels
+    python -m bench.suite --concurrency 1,16,64 --llm-latency 0.2 --llm-error-rate 0.05
+    python -m bench.suite --baseline bench/results/main.json   # exit 1 on a regression
+
+For every scenario and concurrency level it records throughput, p50/p99 latency,
+errors and peak traced memory per in-flight request, plus the (de)serialization
+cost of our request/response models, and the API's cold-start cost (import time in a
+fresh interpreter, then warm-up of the stubbed providers). Results are written as JSON.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+
+from . import stubs
+
+stubs.install()
+# The stubs have no quota: lift the LLM scheduler limits so we measure the app itself
+for key, value in {"LLM_RPM": "1000000", "LLM_TPM": "1000000000",
+                   "LLM_INITIAL_CONCURRENCY": "10000", "LLM_MAX_CONCURRENCY": "10000"}.items():
+    os.environ.setdefault(key, value)
+# Keep benchmark rubrics, jobs and checkpoints out of the real stores
+_scratch = tempfile.mkdtemp(prefix="drona-bench-")
+os.environ.setdefault("RUBRIC_STORE_DB", os.path.join(_scratch, "rubrics.db"))
+os.environ.setdefault("JOBS_DB", os.path.join(_scratch, "jobs.db"))
+os.environ.setdefault("CHECKPOINT_DB", os.path.join(_scratch, "checkpoints.db"))
+
+import httpx  # noqa: E402
+
+from app.main import app as api  # noqa: E402
+from app.schema import Rubric, ConsensusReport, EvaluationRequest  # noqa: E402
+from app.workflow import rubric_app, eval_app  # noqa: E402
+from app.providers import providers  # noqa: E402
+from app.responses import encode, report_view  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+DEFAULT_LEVELS = "1,8,32,128"
+
+RUBRIC_INPUTS = {
+    "question": "Why is joule a derived unit?",
+    "base_ans": "Work = force x displacement, so J = N x m, which is derived from the base units kg, m and s.",
+    "total_score": 2.0,
+    "class_level": "10",
+    "subject": "Science",
+    "chapter": "General",
+}
+
+
+def student_answer(i: int) -> str:
+    # Unique per request so the grade and retrieval caches do not short-circuit the run
+    return f"Because it is made from newton and metre (answer {i})."
+
+
+# --- Scenarios ---
+# Each is `async (i, ctx) -> None` and raises on failure.
+
+async def graph_rubric(i, ctx):
+    result = await rubric_app.ainvoke({"inputs": {**RUBRIC_INPUTS, "student_ans": student_answer(i)}})
+    if result.get("rubric") is None:
+        raise RuntimeError("no rubric")
+
+
+async def graph_evaluate(i, ctx):
+    result = await eval_app.ainvoke({
+        "inputs": {"student_ans": student_answer(i), "use_cache": False},
+        "rubric": ctx["rubric"],
+    })
+    if result.get("final_report") is None:
+        raise RuntimeError("no report")
+
+
+async def http_generate_rubric(i, ctx):
+    r = await ctx["client"].post("/generate-rubric", json={**RUBRIC_INPUTS, "student_ans": student_answer(i)})
+    r.raise_for_status()
+
+
+async def http_evaluate(i, ctx):
+    r = await ctx["client"].post(
+        "/evaluate", json={"rubric_id": ctx["rubric_id"], "student_ans": student_answer(i), "use_cache": False}
+    )
+    r.raise_for_status()
+
+
+SCENARIOS = {
+    "graph_rubric": graph_rubric,
+    "graph_evaluate": graph_evaluate,
+    "http_generate_rubric": http_generate_rubric,
+    "http_evaluate": http_evaluate,
+}
+
+
+def percentile(sorted_values, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(q / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def run_level(scenario, ctx, concurrency: int, n_requests: int, offset: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], []
+
+    async def one(i):
+        async with semaphore:
+            t0 = time.perf_counter()
+            try:
+                await scenario(offset + i, ctx)
+                latencies.append(time.perf_counter() - t0)
+            except Exception as e:
+                errors.append(type(e).__name__)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n_requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "ok": len(latencies),
+        "errors": len(errors),
+        "error_types": sorted(set(errors)),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+async def measure_memory(scenario, ctx, concurrency: int, offset: int) -> float:
+    """Peak traced allocation during one full wave of `concurrency` requests, per request (KiB)."""
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        await asyncio.gather(*(scenario(offset + i, ctx) for i in range(concurrency)), return_exceptions=True)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round((peak - baseline) / concurrency / 1024, 1)
+
+
+def measure_serialization(rubric: Rubric, report: ConsensusReport, repeat: int = 2000) -> dict:
+    """Microseconds per (de)serialization of the payloads that cross the API boundary."""
+    rubric_json = rubric.model_dump_json()
+    report_json = report.model_dump_json()
+    request_json = json.dumps({"student_ans": student_answer(0), "rubric": json.loads(rubric_json)})
+
+    cases = {
+        "rubric_parse": (lambda: Rubric.model_validate_json(rubric_json), len(rubric_json)),
+        "rubric_dump": (lambda: rubric.model_dump_json(), len(rubric_json)),
+        "evaluation_request_parse": (lambda: EvaluationRequest.model_validate_json(request_json), len(request_json)),
+        "consensus_parse": (lambda: ConsensusReport.model_validate_json(report_json), len(report_json)),
+        "consensus_dump": (lambda: report.model_dump_json(), len(report_json)),
+        # What /evaluate actually sends per ?view= and Accept
+        "encode_json": (lambda: encode(report), len(report_json)),
+        "encode_msgpack": (lambda: encode(report, "application/msgpack"), len(encode(report, "application/msgpack").body)),
+        "encode_representative": (lambda: encode(report_view(report, "representative")),
+                                            len(encode(report_view(report, "representative")).body)),
+        "encode_summary": (lambda: encode(report_view(report, "summary")),
+                                     len(encode(report_view(report, "summary")).body)),
+    }
+    results = {}
+    for name, (fn, size) in cases.items():
+        fn()  # warm up
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        results[name] = {"us_per_op": round((time.perf_counter() - start) / repeat * 1e6, 2), "bytes": size}
+    return results
+
+
+def measure_startup(repeat: int = 3) -> dict:
+    """
+    Seconds to import app.main in a fresh interpreter (real client libraries, no stubs,
+    no API keys: the import must not connect anywhere), and to warm up the stubbed providers.
+    """
+    code = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    env = {**os.environ, "PINECONE_API_KEY": "", "GOOGLE_API_KEY": ""}
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    imports = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], cwd=backend_dir, env=env,
+                             capture_output=True, text=True, check=True)
+        imports.append(float(out.stdout.strip().splitlines()[-1]))
+
+    start = time.perf_counter()
+    providers.warm_up()
+    return {"import_s": round(statistics.median(imports), 3), "warm_up_s": round(time.perf_counter() - start, 3)}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Throughput drops or p99 increases beyond `tolerance` (a fraction) vs. the baseline run."""
+    regressions = []
+    for name, levels in results["scenarios"].items():
+        old_levels = {lvl["concurrency"]: lvl for lvl in baseline.get("scenarios", {}).get(name, [])}
+        for lvl in levels:
+            old = old_levels.get(lvl["concurrency"])
+            if not old:
+                continue
+            where = f"{name} @ {lvl['concurrency']}"
+            if old["throughput_rps"] and lvl["throughput_rps"] < old["throughput_rps"] * (1 - tolerance):
+                regressions.append(f"{where}: throughput {old['throughput_rps']} -> {lvl['throughput_rps']} rps")
+            if old["p99_ms"] and lvl["p99_ms"] > old["p99_ms"] * (1 + tolerance):
+                regressions.append(f"{where}: p99 {old['p99_ms']} -> {lvl['p99_ms']} ms")
+    old_import = baseline.get("startup", {}).get("import_s")
+    if old_import and results["startup"]["import_s"] > old_import * (1 + tolerance):
+        regressions.append(f"startup import: {old_import} -> {results['startup']['import_s']} s")
+    for name, case in results["serialization"].items():
+        old = baseline.get("serialization", {}).get(name)
+        if old and case["us_per_op"] > old["us_per_op"] * (1 + tolerance):
+            regressions.append(f"serialization {name}: {old['us_per_op']} -> {case['us_per_op']} us/op")
+    return regressions
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the grading graphs and API.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma-separated subset of {list(SCENARIOS)}")
+    parser.add_argument("--concurrency", default=DEFAULT_LEVELS, help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=0, help="requests per level (default: max(20, 4 x concurrency))")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--query-latency", type=float, default=0.02)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-error-code", type=int, default=503, choices=(429, 503))
+    parser.add_argument("--embed-error-rate", type=float, default=0.0)
+    parser.add_argument("--query-error-rate", type=float, default=0.0)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--out", default=None, help="result file (default: bench/results/bench-<time>.json)")
+    parser.add_argument("--baseline", default=None, help="earlier result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed regression vs. the baseline")
+    args = parser.parse_args()
+
+    s = stubs.settings
+    s.llm_latency, s.embed_latency, s.query_latency = args.llm_latency, args.embed_latency, args.query_latency
+    s.llm_error_rate, s.llm_error_code = args.llm_error_rate, args.llm_error_code
+    s.embed_error_rate, s.query_error_rate = args.embed_error_rate, args.query_error_rate
+    s.rng = random.Random(0)
+
+    levels = [int(c) for c in args.concurrency.split(",")]
+    names = [n for n in args.scenarios.split(",") if n]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {sorted(unknown)}")
+
+    # Before anything touches the providers, so warm-up starts cold
+    startup = measure_startup()
+
+    transport = httpx.ASGITransport(app=api)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        # Fixtures: one real rubric and report, produced by the stubbed graphs (without injected errors)
+        error_rates = s.llm_error_rate, s.embed_error_rate, s.query_error_rate
+        s.llm_error_rate = s.embed_error_rate = s.query_error_rate = 0.0
+        r = await client.post("/generate-rubric", json={**RUBRIC_INPUTS, "student_ans": student_answer(-1)})
+        r.raise_for_status()
+        stored = r.json()
+        rubric = Rubric.model_validate(stored)
+        report = (await eval_app.ainvoke({"inputs": {"student_ans": student_answer(-1), "use_cache": False},
+                                          "rubric": rubric}))["final_report"]
+        s.llm_error_rate, s.embed_error_rate, s.query_error_rate = error_rates
+
+        ctx = {"client": client, "rubric": rubric, "rubric_id": stored["rubric_id"]}
+        results = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "stubs": {k: getattr(s, k) for k in (
+                    "llm_latency", "embed_latency", "query_latency",
+                    "llm_error_rate", "llm_error_code", "embed_error_rate", "query_error_rate",
+                )},
+            },
+            "startup": startup,
+            "serialization": measure_serialization(rubric, report),
+            "scenarios": {},
+        }
+
+        offset = 0
+        for name in names:
+            scenario = SCENARIOS[name]
+            results["scenarios"][name] = []
+            for concurrency in levels:
+                n_requests = args.requests or max(20, 4 * concurrency)
+                level = await run_level(scenario, ctx, concurrency, n_requests, offset)
+                offset += n_requests
+                if not args.no_memory:
+                    level["mem_per_inflight_kib"] = await measure_memory(scenario, ctx, concurrency, offset)
+                    offset += concurrency
+                results["scenarios"][name].append(level)
+                print(f"{name:>22} @ {concurrency:<4} {level['throughput_rps']:>8} rps  "
+                      f"p50 {level['p50_ms']:>8} ms  p99 {level['p99_ms']:>8} ms  "
+                      f"errors {level['errors']:<4} mem {level.get('mem_per_inflight_kib', '-')} KiB")
+
+    print(f"{'startup':>26}: import {startup['import_s']} s, warm-up {startup['warm_up_s']} s")
+    for name, case in results["serialization"].items():
+        print(f"{name:>26}: {case['us_per_op']:>8} us/op  ({case['bytes']} bytes)")
+
+    out = args.out or os.path.join(RESULTS_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} vs. {args.baseline}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
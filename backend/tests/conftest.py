@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+
+# Tests import the app as `app.*`, the same way `python -m app.worker` does from backend/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# Keep test rubrics, jobs and checkpoints out of the real stores
+_scratch = tempfile.mkdtemp(prefix="drona-tests-")
+os.environ.setdefault("RUBRIC_STORE_DB", os.path.join(_scratch, "rubrics.db"))
+os.environ.setdefault("JOBS_DB", os.path.join(_scratch, "jobs.db"))
+os.environ.setdefault("CHECKPOINT_DB", os.path.join(_scratch, "checkpoints.db"))
+
+# Gemini and Pinecone are never reached from tests: clients are built from the stubs
+from bench import stubs  # noqa: E402
+
+stubs.install()
+stubs.settings.llm_latency = 0
+stubs.settings.embed_latency = 0
+stubs.settings.query_latency = 0
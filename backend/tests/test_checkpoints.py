@@ -0,0 +1,147 @@
+import asyncio
+import random
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app import checkpoints, workflow
+from app.checkpoints import resumable_invoke, close_savers
+from app.schema import Rubric, GradingReport
+from bench.stubs import fake_instance
+
+RUBRIC = fake_instance(Rubric, random.Random(0))
+
+
+class FlakyScheduler:
+    """Stands in for llm_scheduler: grading calls listed in `fail_on` raise."""
+
+    def __init__(self, fail_on=()):
+        self.fail_on = set(fail_on)
+        self.calls = 0
+
+    async def invoke(self, runnable, prompt, priority=None, name="llm"):
+        self.calls += 1
+        if self.calls in self.fail_on:
+            # Fail after the other runs of the step have finished, as a slow call would
+            await asyncio.sleep(0.05)
+            raise ValueError("model blew up")
+        return fake_instance(GradingReport, random.Random(self.calls))
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    scheduler = FlakyScheduler(fail_on={2})
+    monkeypatch.setattr(workflow, "llm_scheduler", scheduler)
+    monkeypatch.setattr(workflow, "EVAL_ADAPTIVE", False)
+    monkeypatch.setattr(workflow, "EVAL_RUNS", 3)
+    return scheduler
+
+
+def evaluate(key: str):
+    state = {
+        "inputs": {"student_ans": "Because J = N x m.", "use_cache": False},
+        "rubric": RUBRIC,
+        "rubric_id": "rub_test",
+    }
+    return resumable_invoke("evaluate", state, key, "rub_test")
+
+
+def run(*coros):
+    """Runs the calls one after another on a fresh loop, closing its checkpointer after."""
+    async def main():
+        results = []
+        try:
+            for coro in coros:
+                try:
+                    results.append(await coro)
+                except Exception as e:
+                    results.append(e)
+        finally:
+            await close_savers()
+        return results
+    return asyncio.run(main())
+
+
+def test_retry_reruns_only_the_failed_grading_run(scheduler):
+    failed, (result, replayed) = run(evaluate("retry"), evaluate("retry"))
+    assert isinstance(failed, ValueError)
+    assert not replayed
+    assert len(result["final_report"].individual_runs) == 3
+    # Three runs fired, one failed; the retry paid for that one only
+    assert scheduler.calls == 4
+
+
+def test_finished_run_is_replayed(scheduler):
+    scheduler.fail_on.clear()
+    (first, replayed_first), (second, replayed_second) = run(evaluate("replay"), evaluate("replay"))
+    assert (replayed_first, replayed_second) == (False, True)
+    assert second["final_report"] == first["final_report"]
+    assert scheduler.calls == 3
+
+
+def test_resume_survives_a_new_loop(scheduler):
+    # The API restarted between the failure and the retry
+    (failed,) = run(evaluate("restart"))
+    ((result, replayed),) = run(evaluate("restart"))
+    assert isinstance(failed, ValueError) and not replayed
+    assert scheduler.calls == 4
+
+
+def test_close_savers_stops_the_connection_thread(scheduler):
+    scheduler.fail_on.clear()
+    before = {t for t in threading.enumerate() if not t.daemon}
+    run(evaluate("close"))
+    assert {t for t in threading.enumerate() if not t.daemon} <= before
+    assert not checkpoints._loops
+
+
+async def stored_threads() -> int:
+    saver = await checkpoints._loop_state()["saver"]
+    async with saver.conn.execute("SELECT COUNT(DISTINCT thread_id) FROM checkpoints") as cur:
+        return (await cur.fetchone())[0]
+
+
+def test_forget_deletes_the_key_threads(scheduler):
+    scheduler.fail_on.clear()
+
+    async def scenario():
+        await evaluate("forget")
+        await evaluate("keep")
+        before = await stored_threads()
+        deleted = await checkpoints.forget("forget")
+        _, replayed = await evaluate("forget")
+        return before, deleted, await stored_threads(), replayed
+
+    ((before, deleted, after, replayed),) = run(scenario())
+    assert deleted == 1 and not replayed
+    assert after == before      # "forget" was graded again, "keep" untouched
+    assert scheduler.calls == 9
+
+
+def test_idle_threads_are_pruned(scheduler, monkeypatch):
+    scheduler.fail_on.clear()
+    clock = [1_000_000.0]
+    monkeypatch.setattr(checkpoints, "time", SimpleNamespace(time=lambda: clock[0]))
+
+    async def scenario():
+        await evaluate("old")
+        clock[0] += 3600
+        await evaluate("new")
+        pruned = await checkpoints.prune_checkpoints(max_age=1800)
+        _, old_replayed = await evaluate("old")
+        _, new_replayed = await evaluate("new")
+        return pruned, old_replayed, new_replayed
+
+    ((pruned, old_replayed, new_replayed),) = run(scenario())
+    assert pruned == 1
+    assert (old_replayed, new_replayed) == (False, True)
+
+
+def test_pruning_runs_on_its_own(scheduler, monkeypatch):
+    scheduler.fail_on.clear()
+    monkeypatch.setattr(checkpoints, "CHECKPOINT_TTL_SECONDS", 0)
+    monkeypatch.setattr(checkpoints, "CHECKPOINT_PRUNE_SECONDS", 0)
+    # Every run prunes the idle threads, but never the one it is running on
+    (_, _, (_, replayed)) = run(evaluate("ttl"), evaluate("other"), evaluate("ttl"))
+    assert not replayed
@@ -0,0 +1,113 @@
+import pytest
+
+from app.grade_cache import GradeCache, normalize_answer, minhash
+from app.schema import ConsensusReport
+
+ANSWER = "Joule is a derived unit because work equals force times displacement, so J = N x m."
+# One word changed: near-identical, but not the same normalised answer
+NEAR = "Joule is a derived unit since work equals force times displacement, so J = N x m."
+OTHER = "Photosynthesis turns light energy into chemical energy stored in glucose."
+
+
+def report(score: float = 1.5) -> ConsensusReport:
+    return ConsensusReport(consensus_score=score, score_variance=0.0, hitl_flag=False, individual_runs=[])
+
+
+def test_exact_hit_ignores_case_punctuation_and_spacing():
+    cache = GradeCache(10, 10)
+    cache.put("rub_1", ANSWER, report())
+    hit = cache.get("rub_1", "  " + ANSWER.upper().replace(",", "") + "!")
+    assert hit.consensus_score == 1.5
+    assert hit.cache_hit == "exact"
+
+
+def test_grades_are_per_rubric():
+    cache = GradeCache(10, 10)
+    cache.put("rub_1", ANSWER, report())
+    assert cache.get("rub_2", ANSWER) is None
+
+
+def test_returned_report_is_a_copy():
+    cache = GradeCache(10, 10)
+    cache.put("rub_1", ANSWER, report())
+    cache.get("rub_1", ANSWER).hitl_flag = True
+    assert cache.get("rub_1", ANSWER).hitl_flag is False
+
+
+def test_near_duplicates_are_ignored_when_off():
+    cache = GradeCache(10, 10, near_dup_mode="off")
+    cache.put("rub_1", ANSWER, report())
+    assert cache.get("rub_1", NEAR) is None
+
+
+def test_near_duplicate_reuse():
+    cache = GradeCache(10, 10, near_dup_mode="reuse", threshold=0.9)
+    cache.put("rub_1", ANSWER, report())
+    hit = cache.get("rub_1", NEAR)
+    assert hit.cache_hit == "near_duplicate"
+    assert hit.hitl_flag is False
+    assert cache.get("rub_1", OTHER) is None
+
+
+def test_near_duplicate_flag_mode_asks_for_review():
+    cache = GradeCache(10, 10, near_dup_mode="flag", threshold=0.9)
+    cache.put("rub_1", ANSWER, report())
+    assert cache.get("rub_1", NEAR).hitl_flag is True
+
+
+def test_minhash_estimates_similarity():
+    a, b, c = (minhash(normalize_answer(t)) for t in (ANSWER, NEAR, OTHER))
+    assert (a == a).mean() == 1.0
+    assert (a == b).mean() > (a == c).mean()
+
+
+def test_lru_bounds():
+    cache = GradeCache(max_rubrics=2, per_rubric=2)
+    for answer in ("one", "two", "three"):
+        cache.put("rub_1", answer, report())
+    assert cache.get("rub_1", "one") is None
+    assert cache.get("rub_1", "three") is not None
+
+    cache.put("rub_2", "x", report())
+    cache.get("rub_1", "three")  # rub_1 is now the most recently used
+    cache.put("rub_3", "x", report())
+    assert cache.get("rub_2", "x") is None
+    assert cache.get("rub_1", "three") is not None
+
+
+def test_evict_rubric_and_stats():
+    cache = GradeCache(10, 10)
+    cache.put("rub_1", "a", report())
+    cache.put("rub_1", "b", report())
+    cache.get("rub_1", "a")
+    cache.get("rub_1", "c")
+    assert cache.evict_rubric("rub_1") == 2
+    assert cache.get("rub_1", "a") is None
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["misses"], stats["answers"]) == (1, 2, 0)
+
+
+def test_normalisation_keeps_numbers_signs_and_relations():
+    assert normalize_answer("  The speed is 9.8 m/s, roughly!  ") == "the speed is 9.8 m/s roughly"
+    assert normalize_answer("1,000 J.") == "1,000 j"
+
+
+@pytest.mark.parametrize("cached, answer", [
+    ("-10 m/s", "10 m/s"),
+    ("a > b", "a < b"),
+    ("x ∝ e", "x = e"),
+    ("v = u + at", "v = u - at"),
+    ("9.8 m/s2", "98 m/s2"),
+])
+def test_sign_and_relation_variants_miss(cached, answer):
+    cache = GradeCache(10, 10, near_dup_mode="reuse", threshold=0.0)
+    cache.put("rub_1", cached, report())
+    assert cache.get("rub_1", answer) is None
+
+
+def test_near_duplicate_must_keep_every_number():
+    long = "The acceleration of the ball is 10 m/s2 because the net force on it stays constant all the way down."
+    cache = GradeCache(10, 10, near_dup_mode="reuse", threshold=0.5)
+    cache.put("rub_1", long, report())
+    assert cache.get("rub_1", long.replace("10 m/s2", "-10 m/s2")) is None
+    assert cache.get("rub_1", long.replace("because", "since")).cache_hit == "near_duplicate"
@@ -0,0 +1,179 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app import jobs
+from app.jobs import JobQueue, open_jobs_db
+from app.schema import GradingJobRequest
+
+
+class Clock:
+    """Stands in for the `time` module so leases can expire on demand."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(jobs, "time", clock)
+    monkeypatch.setattr(jobs, "JOB_LEASE_SECONDS", 60)
+    monkeypatch.setattr(jobs, "JOB_MAX_ATTEMPTS", 3)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    db = open_jobs_db(str(tmp_path / "jobs.db"))
+    return JobQueue(lambda: db)
+
+
+def submit(queue, students=("s1", "s2")) -> str:
+    request = GradingJobRequest(questions=[{
+        "question": "Why is joule a derived unit?",
+        "base_ans": "J = N x m",
+        "total_score": 2,
+        "answers": [{"student_id": s, "student_ans": f"answer of {s}"} for s in students],
+    }])
+    return queue.submit(request)["job_id"]
+
+
+def task_status(queue, job_id):
+    return [item["status"] for item in queue.results(job_id)]
+
+
+def test_submit_and_claim_in_order(queue):
+    job_id = submit(queue)
+    assert queue.status(job_id)["status"] == "queued"
+
+    first, second = queue.claim("w1"), queue.claim("w2")
+    assert (first["seq"], second["seq"]) == (0, 1)
+    assert first["payload"]["student_id"] == "s1"
+    assert first["attempts"] == 1 and first["worker"] == "w1"
+    assert queue.claim("w3") is None
+    assert queue.status(job_id)["running"] == 2
+
+
+def test_complete_finishes_the_job(queue):
+    job_id = submit(queue, ["s1"])
+    task = queue.claim("w1")
+    assert queue.complete(job_id, task["seq"], "w1", {"consensus_score": 2})
+    assert queue.status(job_id)["status"] == "completed"
+    assert queue.results(job_id)[0]["report"] == {"consensus_score": 2}
+
+
+def test_failures_are_retried_then_failed(queue):
+    job_id = submit(queue, ["s1"])
+    for attempt in (1, 2):
+        task = queue.claim("w1")
+        assert task["attempts"] == attempt
+        assert queue.fail(job_id, task["seq"], "w1", "boom", task["attempts"])
+        assert task_status(queue, job_id) == ["pending"]
+
+    task = queue.claim("w1")
+    queue.fail(job_id, task["seq"], "w1", "boom", task["attempts"])
+    assert task_status(queue, job_id) == ["failed"]
+    assert queue.claim("w1") is None
+
+
+def test_expired_lease_is_reclaimed(queue, clock):
+    job_id = submit(queue, ["s1"])
+    queue.claim("w1")
+    assert queue.claim("w2") is None
+
+    clock.now += 61
+    task = queue.claim("w2")
+    assert (task["job_id"], task["seq"]) == (job_id, 0)
+    assert task["worker"] == "w2" and task["attempts"] == 2
+
+
+def test_heartbeat_keeps_the_lease(queue, clock):
+    submit(queue, ["s1"])
+    queue.claim("w1")
+    clock.now += 50
+    queue.renew("w1")
+    clock.now += 50
+    assert queue.claim("w2") is None
+
+
+def test_stale_worker_cannot_overwrite_the_new_owner(queue, clock):
+    job_id = submit(queue, ["s1"])
+    queue.claim("w1")
+    clock.now += 61
+    task = queue.claim("w2")
+
+    # w1 comes back after its lease was taken over
+    assert not queue.checkpoint_rubric(job_id, task["seq"], "w1", "rub_stale")
+    assert not queue.complete(job_id, task["seq"], "w1", {"consensus_score": 0})
+    assert not queue.fail(job_id, task["seq"], "w1", "late", 3)
+    item = queue.results(job_id)[0]
+    assert (item["status"], item["rubric_id"], item["report"]) == ("running", None, None)
+
+    assert queue.checkpoint_rubric(job_id, task["seq"], "w2", "rub_1")
+    assert queue.complete(job_id, task["seq"], "w2", {"consensus_score": 2})
+    item = queue.results(job_id)[0]
+    assert (item["status"], item["rubric_id"], item["report"]) == ("done", "rub_1", {"consensus_score": 2})
+
+
+def test_task_whose_workers_keep_dying_is_failed(queue, clock):
+    job_id = submit(queue, ["s1", "s2"])
+    for _ in range(3):
+        queue.claim("w1")          # takes s1 (again)
+        clock.now += 61
+    # s1 is out of attempts: it is failed and s2 is handed out instead
+    task = queue.claim("w2")
+    assert task["payload"]["student_id"] == "s2"
+    assert queue.results(job_id)[0]["status"] == "failed"
+    assert queue.results(job_id)[0]["error"] == "Worker lost"
+
+
+def test_cancel_stops_pending_tasks_and_lets_running_ones_finish(queue):
+    job_id = submit(queue, ["s1", "s2"])
+    task = queue.claim("w1")
+    assert queue.cancel(job_id)
+    assert task_status(queue, job_id) == ["running", "cancelled"]
+    assert queue.claim("w2") is None
+
+    assert queue.complete(job_id, task["seq"], "w1", {"consensus_score": 1})
+    assert task_status(queue, job_id) == ["done", "cancelled"]
+    assert queue.status(job_id)["status"] == "cancelled"
+
+
+def test_cancelled_job_does_not_retry_a_failed_task(queue):
+    job_id = submit(queue, ["s1"])
+    task = queue.claim("w1")
+    queue.cancel(job_id)
+    queue.fail(job_id, task["seq"], "w1", "boom", task["attempts"])
+    assert task_status(queue, job_id) == ["cancelled"]
+
+
+def test_cancelled_job_does_not_stay_running_after_its_worker_died(queue, clock):
+    job_id = submit(queue, ["s1", "s2"])
+    queue.claim("w1")
+    queue.cancel(job_id)
+    clock.now += 61
+    assert queue.claim("w2") is None
+    assert task_status(queue, job_id) == ["cancelled", "cancelled"]
+    assert queue.status(job_id)["running"] == 0
+
+
+def test_results_are_paged_in_submission_order(queue):
+    job_id = submit(queue, [f"s{i}" for i in range(5)])
+    page = queue.results(job_id, offset=2, limit=2)
+    assert [(item["seq"], item["student_id"]) for item in page] == [(2, "s2"), (3, "s3")]
+
+
+def test_importing_the_queue_opens_no_database(tmp_path):
+    # A fresh interpreter, since this one imported app.jobs long ago
+    db = tmp_path / "lazy.db"
+    subprocess.run(
+        [sys.executable, "-c", "import app.jobs, app.main, app.worker"],
+        check=True, env={**os.environ, "JOBS_DB": str(db)}, cwd=os.path.dirname(os.path.dirname(__file__)),
+    )
+    assert not db.exists()
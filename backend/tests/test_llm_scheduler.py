@@ -0,0 +1,28 @@
+import asyncio
+
+from app.llm_scheduler import LLMScheduler
+
+QUOTA = dict(rpm=1200, tpm=900_000, initial=16, min_limit=2, max_limit=64, target_latency=30.0, max_retries=0)
+
+
+def test_single_process_gets_the_whole_quota():
+    stats = LLMScheduler.share(processes=1, **QUOTA).stats()
+    assert (stats["rpm"], stats["tpm"], stats["concurrency_limit"]) == (1200, 900_000, 16)
+
+
+def test_processes_split_the_quota():
+    schedulers = [LLMScheduler.share(processes=3, **QUOTA) for _ in range(3)]
+    assert sum(s.requests.capacity for s in schedulers) == 1200
+    assert sum(s.tokens.capacity for s in schedulers) == 900_000
+    assert sum(s.max_limit for s in schedulers) <= 64
+    assert all(s.stats()["processes"] == 3 and s.limit == 5 for s in schedulers)
+
+
+def test_tiny_share_still_makes_progress():
+    scheduler = LLMScheduler.share(processes=100, **dict(QUOTA, max_limit=4, initial=4))
+    assert scheduler.max_limit == 1 and scheduler.min_limit == 1 and scheduler.limit == 1
+
+    async def call():
+        return "ok"
+
+    assert asyncio.run(scheduler.run(call, 10)) == "ok"
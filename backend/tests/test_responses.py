@@ -0,0 +1,30 @@
+import pytest
+
+from app.responses import wants_msgpack
+
+
+@pytest.mark.parametrize("accept", [
+    "application/msgpack",
+    "application/x-msgpack",
+    "Application/MsgPack",
+    "application/msgpack, application/json",
+    "application/json;q=0.5, application/msgpack",
+    "application/msgpack;q=0.8, */*;q=0.1",
+])
+def test_msgpack_requested(accept):
+    assert wants_msgpack(accept)
+
+
+@pytest.mark.parametrize("accept", [
+    None,
+    "",
+    "*/*",
+    "application/json",
+    "application/msgpack;q=0",
+    "application/msgpack; q=0.0, application/json",
+    "application/msgpack;q=0.5, application/json",
+    "application/msgpack;q=oops",
+    "text/plain, application/msgpackish",
+])
+def test_json_otherwise(accept):
+    assert not wants_msgpack(accept)
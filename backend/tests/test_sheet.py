@@ -0,0 +1,77 @@
+import asyncio
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import workflow
+from app.main import app
+from app.llm_scheduler import LLMOverloadedError
+from app.rubric_store import rubric_store
+from app.schema import Rubric, GradingReport
+from bench.stubs import fake_instance
+
+RUBRIC_ID = rubric_store.put(fake_instance(Rubric, random.Random(1)))
+
+
+class Scheduler:
+    """Stands in for llm_scheduler: raises `error` for answers marked UNGRADABLE."""
+
+    def __init__(self, error=None):
+        self.error = error
+
+    async def invoke(self, runnable, prompt, priority=None, name="llm"):
+        if self.error is not None and "UNGRADABLE" in prompt:
+            raise self.error
+        return fake_instance(GradingReport, random.Random(prompt))
+
+
+def use_scheduler(monkeypatch, error=None):
+    monkeypatch.setattr(workflow, "llm_scheduler", Scheduler(error))
+    monkeypatch.setattr(workflow, "EVAL_ADAPTIVE", False)
+
+
+def sheet(*answers):
+    return {"student_id": "s1", "use_cache": False, "questions": [
+        {"question": f"Question {i}?", "base_ans": "A long model answer.", "total_score": 5,
+         "student_ans": answer, "rubric_id": RUBRIC_ID}
+        for i, answer in enumerate(answers)
+    ]}
+
+
+def grade(request):
+    return asyncio.run(workflow.sheet_app.ainvoke({"inputs": request}))["sheet_report"]
+
+
+def test_total_sums_every_question(monkeypatch):
+    use_scheduler(monkeypatch)
+    report = grade(sheet("first answer", "second answer"))
+    assert report.complete and report.ungraded_questions == []
+    assert report.max_score == 10
+    assert report.total_score == round(sum(q.score for q in report.questions), 2)
+    assert [q.question_index for q in report.questions] == [0, 1]
+
+
+def test_ungraded_question_is_not_a_zero(monkeypatch):
+    use_scheduler(monkeypatch, ValueError("model returned garbage"))
+    report = grade(sheet("first answer", "UNGRADABLE", "third answer"))
+    ungraded = report.questions[1]
+    assert ungraded.score is None and "garbage" in ungraded.error
+    assert not report.complete
+    assert report.ungraded_questions == [1]
+    assert 1 in report.flagged_questions
+    assert report.total_score == round(report.questions[0].score + report.questions[2].score, 2)
+    assert report.max_score == 15
+
+
+def test_overload_fails_the_whole_sheet(monkeypatch):
+    use_scheduler(monkeypatch, LLMOverloadedError("quota", retry_after=12))
+    with pytest.raises(LLMOverloadedError):
+        grade(sheet("first answer", "UNGRADABLE"))
+
+
+def test_overloaded_sheet_endpoint_asks_to_retry(monkeypatch):
+    use_scheduler(monkeypatch, LLMOverloadedError("quota", retry_after=12))
+    response = TestClient(app).post("/evaluate-sheet", json=sheet("UNGRADABLE"))
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "12"
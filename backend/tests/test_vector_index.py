@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from app.lexical_index import BM25Index
+from app.retriever import retrieval_scope
+from app.vector_index import LocalIndex, PineconeBackend
+
+METADATA = [
+    {"class": "10", "subject": "Science", "Unit_index": 1},
+    {"class": "10", "subject": "Science", "Unit_index": 2},
+    {"class": "9", "subject": "Science", "Unit_index": 1},
+]
+VECTORS = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.6, 0.8, 0.0]]
+
+
+@pytest.mark.parametrize("quantize", [False, True])
+def test_build_and_query(tmp_path, quantize):
+    index = LocalIndex.build(str(tmp_path), ["a", "b", "c"], VECTORS, METADATA, quantize=quantize)
+    matches = index.query([1.0, 0.1, 0.0], top_k=2)
+    assert [m["id"] for m in matches] == ["a", "c"]
+    assert index.query([0.0, 1.0, 0.0], top_k=1, filter={"class": "10"})[0]["id"] == "b"
+    assert index.query([1.0, 0.0, 0.0], filter={"class": "12"}) == []
+
+
+@pytest.mark.parametrize("quantize", [False, True])
+def test_empty_index(tmp_path, quantize):
+    index = LocalIndex.build(str(tmp_path), [], [], [], quantize=quantize)
+    assert index.manifest["count"] == 0 and index.manifest["dim"] == 0
+    assert index.query([1.0, 0.0, 0.0]) == []
+    assert index.query([1.0, 0.0, 0.0], filter={"class": "10"}) == []
+    assert np.load(tmp_path / "vectors.npy").shape == (0, 0)
+
+
+def test_chapter_name_filter_ignores_case(tmp_path):
+    metadata = [dict(meta, Unit_name="Scientific study") for meta in METADATA]
+    index = LocalIndex.build(str(tmp_path), ["a", "b", "c"], VECTORS, metadata)
+    scope = retrieval_scope("10", "Science", "Scientific Study")
+    assert scope["Unit_name"] == "scientific study"
+    assert {m["id"] for m in index.query([1.0, 0.0, 0.0], filter=scope)} == {"a", "b"}
+
+
+def test_bm25_chapter_name_filter_ignores_case(tmp_path):
+    metadata = [{"class": "10", "Unit_name": "Force and Laws of Motion"}, {"class": "10", "Unit_name": "Sound"}]
+    index = BM25Index.build(str(tmp_path), ["a", "b"], ["inertia of rest", "inertia of sound"], metadata, [])
+    matches = index.query("inertia", filter=retrieval_scope("10", None, "force and laws of motion"))
+    assert [m["id"] for m in matches] == ["a"]
+
+
+def test_pinecone_filter_matches_common_spellings():
+    calls = []
+
+    class Index:
+        def query(self, **kwargs):
+            calls.append(kwargs["filter"])
+            return {"matches": []}
+
+    PineconeBackend(Index()).query([1.0], filter={"class": "10", "Unit_name": "scientific study"})
+    assert calls[0]["class"] == {"$eq": "10"}
+    assert "Scientific study" in calls[0]["Unit_name"]["$in"]
+    assert "Scientific Study" in calls[0]["Unit_name"]["$in"]
@@ -0,0 +1,421 @@
+import os
+import re
+import json
+import hashlib
+import argparse
+from itertools import chain, islice
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from backend.app.prompts import count_tokens
+
+# --- Chunker ---
+# Turns raw chapter text (data/chapter1.txt) and Q&A notes (data/chapter1_notes.txt)
+# into the chunk JSON that vectorstore.py ingests:
+#   Book:  {"chunk_id", "title", "content", "metadata": {..., "type": "Book", "page", "topic"}}
+#   Notes: {"chunk_id", "question", "answer", "metadata": {..., "type": "Notes"}}
+#
+# Files are read line by line and chunks are written as soon as a section ends, so a whole
+# book is never held in memory. Chunks follow headings, activities and question/answer
+# boundaries; long sections are split into token-bounded windows that overlap a little.
+# IDs are a readable slug plus a hash of the chunk's content, so re-chunking unchanged
+# text gives the same IDs and the ingest checkpoint skips them.
+#
+#   python chunker.py data/chapter1.txt data/chapter1_notes.txt --out-dir data/chunks
+#   python vectorstore.py data/chunks/chapter1.json data/chunks/chapter1_notes.json
+# vectorstore.py also accepts the .txt files directly and chunks them on the fly.
+
+MAX_TOKENS = 300      # matches PROMPT_CHUNK_TOKENS, so prompts never cut a chunk short
+OVERLAP_TOKENS = 40   # tail of the previous window repeated at the start of the next
+MIN_TOKENS = 25       # smaller sections are merged into the next one
+DEFAULT_CLASS = "10"
+DEFAULT_SUBJECT = "Science"
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$")
+PAGE_RE = re.compile(r"^(?:#{1,6}\s*)?\**\s*Page\s+(\d+)\b", re.IGNORECASE)
+BOLD_LINE_RE = re.compile(r"^\*{2,3}([^*]+?)\*{2,3}:?$")
+ACTIVITY_RE = re.compile(r"^\W*(Activity\s+\d+(?:\.\d+)*)\W*$", re.IGNORECASE)
+RULE_RE = re.compile(r"^\s*(?:-{3,}|\*{3,}|_{3,})\s*$")
+NOISE_RE = re.compile(r"^[\s\-–—]*Advertisement[\s\-–—]*$", re.IGNORECASE)
+CHAPTER_RE = re.compile(r"^(?:Chapter|Unit)\s*[–—:.\-]?\s*(\d+)\s*[–—:.\-]?\s*(.*)$", re.IGNORECASE)
+LABEL_RE = re.compile(r"^(\d+|[a-z]{1,4})\.\s+\S")
+ROMAN_RE = re.compile(r"^(?:i{1,3}|iv|v|vi{1,3}|ix|x)$")
+ANSWER_RE = re.compile(r"^Ans(?:wer)?\s*[:.\-]\s*", re.IGNORECASE)
+CHOSEN_OPTION_RE = re.compile(r"^[ivx]+\.\s*\(.+\)\s*$")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(\"'$])")
+
+
+def clean(line: str) -> str:
+    """Drops markdown emphasis and heading marks."""
+    line = re.sub(r"^#{1,6}\s+", "", line.strip())
+    return re.sub(r"\*{1,3}([^*]+?)\*{1,3}", r"\1", line).strip()
+
+
+def slug(text: str, words: int = 6) -> str:
+    return "_".join(re.findall(r"[a-z0-9]+", text.lower())[:words]) or "chunk"
+
+
+def chunk_id(title: str, text: str, metadata: dict) -> str:
+    """Readable prefix + content hash: stable across runs, changes only with the chunk itself."""
+    raw = json.dumps([text, metadata.get("type"), metadata.get("Unit_index")], ensure_ascii=False)
+    return f"{slug(title)}_{hashlib.sha256(raw.encode('utf-8')).hexdigest()[:12]}"
+
+
+# --- Token windows ---
+
+def split_units(paragraphs, limit: int):
+    """
+    (text, page) paragraphs -> (text, page, starts_paragraph) units of at most `limit`
+    tokens: whole paragraphs when they fit, else sentences, else runs of words.
+    """
+    for text, page in paragraphs:
+        if count_tokens(text) <= limit:
+            yield text, page, True
+            continue
+        first = True
+        for sentence in SENTENCE_RE.split(text):
+            pieces = [sentence]
+            if count_tokens(sentence) > limit:
+                words, pieces, current = sentence.split(), [], []
+                for word in words:
+                    if current and count_tokens(" ".join(current + [word])) > limit:
+                        pieces.append(" ".join(current))
+                        current = []
+                    current.append(word)
+                pieces.append(" ".join(current))
+            for piece in pieces:
+                yield piece, page, first
+                first = False
+
+
+def windows(paragraphs, max_tokens: int = MAX_TOKENS, overlap: int = OVERLAP_TOKENS):
+    """Packs paragraphs into windows of <= max_tokens; each window starts with the last ~overlap tokens of the previous one."""
+    overlap = min(overlap, max_tokens // 2)
+    window, size = [], 0
+    for unit in split_units(paragraphs, max_tokens - overlap):
+        cost = count_tokens(unit[0]) + 1
+        if window and size + cost > max_tokens:
+            yield window
+            tail, tail_size = [], 0
+            for previous in reversed(window):
+                previous_cost = count_tokens(previous[0]) + 1
+                if tail_size + previous_cost > overlap:
+                    break
+                tail.insert(0, previous)
+                tail_size += previous_cost
+            window, size = tail, tail_size
+        window.append(unit)
+        size += cost
+    if window:
+        yield window
+
+
+def join_units(units) -> str:
+    return "".join(("\n" if starts else " ") + text for text, _, starts in units).strip()
+
+
+# --- Metadata ---
+
+def infer_metadata(path: str, class_level: str = None, subject: str = None) -> dict:
+    """
+    class / subject / Unit_index from the path when the caller does not set them:
+    .../class10/science/chapter3_notes.txt -> class "10", subject "Science", Unit_index 3.
+    Unit_name and type are filled in while reading the file.
+    """
+    parts = os.path.normpath(os.path.abspath(path)).split(os.sep)
+    meta = {"class": class_level, "subject": subject}
+    for i, part in enumerate(parts[:-1]):
+        match = re.fullmatch(r"class[ _-]?(\d+)", part, re.IGNORECASE)
+        if match:
+            meta["class"] = meta["class"] or match.group(1)
+            if i + 1 < len(parts) - 1:
+                meta["subject"] = meta["subject"] or parts[i + 1].replace("_", " ").title()
+    meta["class"] = meta["class"] or DEFAULT_CLASS
+    meta["subject"] = meta["subject"] or DEFAULT_SUBJECT
+    match = re.search(r"(?:chapter|unit|ch)[ _-]?(\d+)", os.path.basename(path), re.IGNORECASE)
+    if match:
+        meta["Unit_index"] = int(match.group(1))
+    return meta
+
+
+def detect_type(lines, path: str, peek: int = 200):
+    """'Notes' for question/answer files, else 'Book'. Returns (type, lines) with the peeked lines put back."""
+    head = list(islice(lines, peek))
+    lines = chain(head, lines)
+    if "note" in os.path.basename(path).lower() or any(ANSWER_RE.match(line.strip()) for line in head):
+        return "Notes", lines
+    return "Book", lines
+
+
+# --- Book chapters ---
+
+class _Section:
+    def __init__(self, title: str, topic: str, activity: bool = False):
+        self.title = title
+        self.topic = topic
+        self.activity = activity
+        self.paragraphs = []  # (text, page)
+
+    def tokens(self) -> int:
+        return sum(count_tokens(text) for text, _ in self.paragraphs)
+
+
+def _book_chunks(section: _Section, meta: dict, max_tokens: int, overlap: int):
+    parts = list(windows(section.paragraphs, max_tokens, overlap))
+    for n, units in enumerate(parts, start=1):
+        content = join_units(units)
+        pages = sorted({page for _, page, _ in units}, key=int)
+        title = section.title if len(parts) == 1 else f"{section.title} (part {n})"
+        metadata = {**meta, "type": "Book"}
+        if len(pages) == 1:
+            metadata["page"] = pages[0]
+        else:
+            metadata["pages"] = f"{pages[0]}-{pages[-1]}"
+        if section.topic:
+            metadata["topic"] = section.topic
+        yield {"chunk_id": chunk_id(title, content, metadata), "title": title, "content": content, "metadata": metadata}
+
+
+def iter_book(lines, meta: dict, max_tokens: int = MAX_TOKENS, overlap: int = OVERLAP_TOKENS):
+    page, topic = "1", None
+    section = _Section(meta.get("Unit_name") or "Introduction", None)
+    paragraph = []
+    carry = []  # paragraphs of a too-small section, prepended to the next one
+
+    def end_paragraph():
+        if paragraph:
+            section.paragraphs.append(("\n".join(paragraph), page))
+            paragraph.clear()
+
+    def flush(next_section):
+        nonlocal section, carry
+        end_paragraph()
+        section.paragraphs = carry + section.paragraphs
+        carry = []
+        if section.tokens() < MIN_TOKENS and not next_section.activity:
+            carry = section.paragraphs
+        elif section.paragraphs:
+            yield from _book_chunks(section, meta, max_tokens, overlap)
+        section = next_section
+
+    for raw in lines:
+        line = raw.rstrip()
+        stripped = line.strip()
+        if NOISE_RE.match(stripped):
+            continue
+        if PAGE_RE.match(stripped):
+            end_paragraph()
+            page = PAGE_RE.match(stripped).group(1)
+            continue
+
+        heading = HEADING_RE.match(stripped)
+        bold = BOLD_LINE_RE.match(stripped)
+        activity = ACTIVITY_RE.match(clean(stripped)) if (heading or bold) else None
+        if activity:
+            yield from flush(_Section(activity.group(1), topic, activity=True))
+            continue
+        if heading:
+            title = clean(heading.group(2))
+            if not meta.get("Unit_name") and len(heading.group(1)) <= 2:
+                meta["Unit_name"] = re.sub(r"^[\d.]+\s*", "", title)
+            if len(heading.group(1)) <= 3:
+                topic = title
+            yield from flush(_Section(title, topic))
+            continue
+        if section.activity and stripped.startswith("**Title:**") and ":" not in section.title:
+            section.title = f"{section.title}: {clean(stripped).split(':', 1)[1].strip()}"
+        if not stripped or RULE_RE.match(stripped) or bold:
+            # Bold sub-headings start a paragraph of their own (a preferred split point)
+            end_paragraph()
+            if bold:
+                section.paragraphs.append((clean(stripped), page))
+            continue
+        paragraph.append(clean(stripped))
+
+    yield from flush(_Section("", None))
+    if carry:
+        section.paragraphs = carry
+        section.title = meta.get("Unit_name") or "Summary"
+        yield from _book_chunks(section, meta, max_tokens, overlap)
+
+
+# --- Question / answer notes ---
+
+def _qa_chunks(group, question_lines, answer_lines, meta, max_tokens, overlap, title=None):
+    question = "\n".join(question_lines).strip()
+    if not answer_lines:
+        # MCQs mark the right option in brackets instead of giving an answer
+        answer_lines = [line for line in question_lines if CHOSEN_OPTION_RE.match(line.strip())]
+    if not question and not answer_lines:
+        return
+    if group:
+        question = f"{group}\n\n{question}"
+    metadata = {**meta, "type": "Notes"}
+    if group:
+        metadata["topic"] = re.sub(r"^\d+\.\s*", "", group).rstrip(":. ")
+
+    # Long answers are split; every part repeats the question (so a long question can
+    # still push a part past max_tokens)
+    budget = max(max_tokens - count_tokens(question), max_tokens // 3)
+    paragraphs = [(line, "") for line in "\n".join(answer_lines).split("\n\n") if line.strip()]
+    parts = list(windows(paragraphs, budget, overlap)) or [[]]
+    for n, units in enumerate(parts, start=1):
+        answer = join_units(units)
+        text = f"{question}\n{answer}"
+        title = title or question_lines[0]
+        item_id = chunk_id(title if len(parts) == 1 else f"{title} part {n}", text, metadata)
+        yield {"chunk_id": item_id, "question": question, "answer": answer, "metadata": metadata}
+
+
+def _intro_chunk(lines, meta: dict) -> dict:
+    """Text before the first question, filed under the chapter name."""
+    question, answer = meta.get("Unit_name") or "Introduction", " ".join(lines)
+    metadata = {**meta, "type": "Notes"}
+    return {"chunk_id": chunk_id(question, answer, metadata), "question": question, "answer": answer, "metadata": metadata}
+
+
+def iter_notes(lines, meta: dict, max_tokens: int = MAX_TOKENS, overlap: int = OVERLAP_TOKENS):
+    group = None            # "2. Give reason:" heading of the current block of questions
+    stem = []               # lettered question that roman-numbered sub-questions belong to
+    stem_open = False       # still reading the stem (no option / sub-question / answer yet)
+    title = None
+    expected = "a"          # next question letter
+    question, answer = [], []
+    in_answer, blank_before = False, True
+    preamble, chapter_pending = [], False
+
+    def flush():
+        nonlocal question, answer, in_answer, title
+        items = list(_qa_chunks(group, question, answer, meta, max_tokens, overlap, title)) if question else []
+        question, answer, in_answer, title = [], [], False, None
+        return items
+
+    for raw in lines:
+        line = raw.rstrip()
+        stripped = clean(line)
+        if NOISE_RE.match(stripped) or RULE_RE.match(stripped):
+            continue
+        if not stripped:
+            if in_answer and answer and answer[-1] != "":
+                answer.append("")
+            blank_before = True
+            continue
+
+        chapter = CHAPTER_RE.match(stripped)
+        if chapter and not question:
+            meta.setdefault("Unit_index", int(chapter.group(1)))
+            if chapter.group(2):
+                meta.setdefault("Unit_name", chapter.group(2))
+            else:
+                chapter_pending = True
+            continue
+        if chapter_pending:
+            meta.setdefault("Unit_name", stripped)
+            chapter_pending = False
+            continue
+
+        label = LABEL_RE.match(stripped)
+        label = label.group(1) if label else None
+        is_group = (label and label.isdigit() and (blank_before or not in_answer)
+                    and len(stripped.split()) <= 15 and stripped[-1] in ":.?")
+        is_letter = label == expected
+        is_sub = label and ROMAN_RE.match(label) and in_answer and blank_before
+
+        if is_group or is_letter or is_sub:
+            yield from flush()
+            if preamble:
+                yield _intro_chunk(preamble, meta)
+                preamble = []
+            if is_group:
+                group, stem, expected = stripped, [], "a"
+            else:
+                if is_letter:
+                    stem, stem_open = [stripped], True
+                    expected = chr(ord(label) + 1)
+                else:
+                    question.extend(stem)
+                    title = stripped
+                question.append(stripped)
+        elif ANSWER_RE.match(stripped) and question:
+            in_answer, stem_open = True, False
+            answer.append(ANSWER_RE.sub("", stripped))
+        elif in_answer:
+            answer.append(stripped)
+        elif question:
+            if label:
+                stem_open = False
+            elif stem_open:
+                stem.append(stripped)
+            question.append(stripped)
+        else:
+            preamble.append(stripped)
+        blank_before = False
+
+    yield from flush()
+    if preamble:
+        yield _intro_chunk(preamble, meta)
+
+
+# --- Files ---
+
+def iter_file(path: str, class_level: str = None, subject: str = None, doc_type: str = None,
+              max_tokens: int = MAX_TOKENS, overlap: int = OVERLAP_TOKENS):
+    """Streams the chunks of one raw text file (duplicate chunks are emitted once)."""
+    meta = infer_metadata(path, class_level, subject)
+    with open(path, "r", encoding="utf-8") as f:
+        lines = iter(f)
+        detected, lines = detect_type(lines, path)
+        parse = iter_notes if (doc_type or detected) == "Notes" else iter_book
+        seen = set()
+        for item in parse(lines, meta, max_tokens, overlap):
+            if item["chunk_id"] not in seen:
+                seen.add(item["chunk_id"])
+                yield item
+
+
+def chunk_file(path: str, out_path: str, **options) -> int:
+    """Writes the chunks of `path` to `out_path` as a JSON array, one item at a time."""
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    tmp = out_path + ".tmp"
+    count = 0
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("[")
+        for item in iter_file(path, **options):
+            f.write(",\n  " if count else "\n  ")
+            f.write(json.dumps(item, ensure_ascii=False))
+            count += 1
+        f.write("\n]\n")
+    # Swapped in at the end, so readers never see a half-written file
+    os.replace(tmp, out_path)
+    return count
+
+
+def output_path(path: str, out_dir: str = None) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(out_dir or os.path.dirname(path), f"{stem}.json" if out_dir else f"{stem}.chunks.json")
+
+
+def chunk_files(paths, out_dir: str = None, workers: int = None, **options):
+    """Chunks several files in parallel (one process per file). Returns {input: (output, count)}."""
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers or min(len(paths), os.cpu_count() or 1)) as pool:
+        futures = {pool.submit(chunk_file, path, output_path(path, out_dir), **options): path for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            results[path] = (output_path(path, out_dir), future.result())
+            print(f"Chunked {path} -> {results[path][0]} ({results[path][1]} chunks)")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split raw chapter / notes text files into retrieval chunks.")
+    parser.add_argument("files", nargs="+", help="Raw .txt / .md files.")
+    parser.add_argument("--out-dir", default=None, help="Output folder (default: <file>.chunks.json next to each input).")
+    parser.add_argument("--workers", type=int, default=None, help="Files chunked in parallel.")
+    parser.add_argument("--max-tokens", type=int, default=MAX_TOKENS)
+    parser.add_argument("--overlap", type=int, default=OVERLAP_TOKENS)
+    parser.add_argument("--class", dest="class_level", default=None, help=f"Class (default: from the path, else {DEFAULT_CLASS}).")
+    parser.add_argument("--subject", default=None, help=f"Subject (default: from the path, else {DEFAULT_SUBJECT}).")
+    parser.add_argument("--type", dest="doc_type", choices=["Book", "Notes"], default=None, help="Skip type detection.")
+    args = parser.parse_args()
+
+    chunk_files(args.files, args.out_dir, args.workers, class_level=args.class_level, subject=args.subject,
+                doc_type=args.doc_type, max_tokens=args.max_tokens, overlap=args.overlap)
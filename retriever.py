@@ -2,14 +2,20 @@ from pinecone import Pinecone
 import os
 from dotenv import load_dotenv
 from schema import RetrievedChunk # Import your schema
+from backend.app.vector_index import PineconeBackend, LocalIndex
 # Load environment variables from .env file
 load_dotenv()
 
 # Now this will work
 pc = Pinecone(api_key=os.environ.get("PINECONE_API_KEY"))
-index = pc.Index("dronacharya")
 EMBED_MODEL = "llama-text-embed-v2"
 
+# "pinecone" or "local" (build it with: python vectorstore.py --backend local)
+if os.environ.get("RETRIEVAL_BACKEND", "pinecone") == "local":
+    backend = LocalIndex(os.environ.get("LOCAL_INDEX_DIR", "data/local_index"))
+else:
+    backend = PineconeBackend(pc.Index("dronacharya"))
+
 def get_relevant_context(query: str, top_k: int = 3):
     # Generate embedding for the query
     res = pc.inference.embed(
@@ -19,8 +25,8 @@ def get_relevant_context(query: str, top_k: int = 3):
     )
     query_vec = res[0].values
     
-    # Search Pinecone
-    results = index.query(vector=query_vec, top_k=top_k, include_metadata=True)
+    # Search the index (Pinecone or local)
+    matches = backend.query(query_vec, top_k=top_k)
     
     # chunks = []
     # for match in results['matches']:
@@ -31,7 +37,7 @@ def get_relevant_context(query: str, top_k: int = 3):
     
 
     chunks = []
-    for match in results['matches']:
+    for match in matches:
         # Create the object instead of a dictionary
         chunks.append(RetrievedChunk(
             content=match['metadata']['text_content'],
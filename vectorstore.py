@@ -1,80 +1,367 @@
 import json
 import os
+import argparse
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pinecone import Pinecone, ServerlessSpec
+from backend.app.vector_index import LocalIndex
+from backend.app.lexical_index import BM25Index
+import chunker
 
 # 1. Configuration - Add your API Key here
-PINECONE_API_KEY = "..."
+PINECONE_API_KEY = os.environ.get("PINECONE_API_KEY", "...")
 INDEX_NAME = "dronacharya"
 EMBED_MODEL = "llama-text-embed-v2"  # As per your documentation request
+LOCAL_INDEX_DIR = "data/local_index"
+LEXICAL_INDEX_DIR = "data/bm25_index"
+DATA_FILES = ["data/chapter1_2.json", "data/chapter1_notes.json"]
 
-# Initialize Pinecone
+# Pipeline tuning
+EMBED_BATCH_SIZE = 96      # max inputs per Pinecone inference call for llama-text-embed-v2
+EMBED_CONCURRENCY = 4      # embedding calls in flight
+UPSERT_CONCURRENCY = 2     # upserts in flight (they overlap with embedding)
+PINECONE_STATE_FILE = "data/.ingest_state_pinecone.json"
+
+# Initialize Pinecone (the inference API is used for both backends)
 pc = Pinecone(api_key=PINECONE_API_KEY)
 
-# 2. Create Index if it doesn't exist
-# llama-text-embed-v2 typically outputs 1024 or 3072 dimensions. 
-# We'll use 1024 for this example.
-if INDEX_NAME not in pc.list_indexes().names():
-    pc.create_index(
-        name=INDEX_NAME,
-        dimension=1024, 
-        metric="cosine",
-        spec=ServerlessSpec(cloud="aws", region="us-east-1")
-    )
+def get_pinecone_index():
+    # 2. Create Index if it doesn't exist
+    # llama-text-embed-v2 typically outputs 1024 or 3072 dimensions.
+    # We'll use 1024 for this example.
+    if INDEX_NAME not in pc.list_indexes().names():
+        pc.create_index(
+            name=INDEX_NAME,
+            dimension=1024,
+            metric="cosine",
+            spec=ServerlessSpec(cloud="aws", region="us-east-1")
+        )
+    return pc.Index(INDEX_NAME)
 
-index = pc.Index(INDEX_NAME)
+# --- Reading ---
 
-def process_and_upload(file_path):
-    print(f"Processing {file_path}...")
-    
+def iter_chunks(file_path, block_size=1 << 16):
+    """
+    Streams the items of a top-level JSON array without loading the whole file.
+    Raw chapter / notes text (.txt, .md) is chunked on the fly by chunker.py.
+    """
+    if not file_path.endswith(".json"):
+        yield from chunker.iter_file(file_path)
+        return
+    decoder = json.JSONDecoder()
     with open(file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    vectors_to_upsert = []
-
-    for item in data:
-        # Prepare the text for embedding
-        # For Book chunks, we use title + content. 
-        # For Notes, we use question + answer.
-        text_to_embed = ""
-        if "content" in item:
-            text_to_embed = f"{item.get('title', '')} {item['content']}"
-        else:
-            text_to_embed = f"{item['question']} {item['answer']}"
-
-        # 3. Generate Cloud Embedding using Pinecone Inference API (FREE TIER)
-        # Note: 'input_type' can be 'passage' for storage
-        embedding_response = pc.inference.embed(
-            model=EMBED_MODEL,
-            inputs=[text_to_embed],
-            parameters={"input_type": "passage", "truncate": "END"}
-        )
-        
-        vector_values = embedding_response[0].values
+        buf = f.read(block_size).lstrip()
+        if not buf.startswith("["):
+            raise ValueError(f"{file_path} is not a JSON array")
+        buf = buf[1:]
+        eof = False
+        while True:
+            buf = buf.lstrip().lstrip(",").lstrip()
+            if buf.startswith("]"):
+                return
+            try:
+                item, end = decoder.raw_decode(buf)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                more = f.read(block_size)
+                eof = not more
+                buf += more
+                continue
+            yield item
+            buf = buf[end:]
 
-        # 4. Prepare Metadata
+def chunk_text(item):
+    # For Book chunks, we use title + content.
+    # For Notes, we use question + answer.
+    if "content" in item:
+        return f"{item.get('title', '')} {item['content']}"
+    return f"{item['question']} {item['answer']}"
+
+def chunk_hash(item):
+    """Changes whenever anything that ends up in the index changes."""
+    raw = json.dumps([EMBED_MODEL, chunk_text(item), item["metadata"]], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def embed_batch(items):
+    """One Pinecone inference call for a whole batch of chunks."""
+    texts = [chunk_text(item) for item in items]
+    # Note: 'input_type' can be 'passage' for storage
+    embedding_response = pc.inference.embed(
+        model=EMBED_MODEL,
+        inputs=texts,
+        parameters={"input_type": "passage", "truncate": "END"}
+    )
+
+    records = []
+    for item, text, emb in zip(items, texts, embedding_response):
         # We preserve every field from your metadata request
-        metadata = item["metadata"]
-        metadata["text_content"] = text_to_embed # Store text for retrieval
-        
-        vectors_to_upsert.append({
-            "id": item["chunk_id"],
-            "values": vector_values,
-            "metadata": metadata
-        })
-
-    # 5. Upsert in batches of 50
-    for i in range(0, len(vectors_to_upsert), 50):
-        batch = vectors_to_upsert[i : i + 50]
-        index.upsert(vectors=batch)
-    
-    print(f"Successfully uploaded {len(vectors_to_upsert)} chunks from {file_path}")
-
-# Run for both files
-try:
-    process_and_upload("data/chapter1_2.json")
-    process_and_upload("data/chapter1_notes.json")
-    print("\nAll data is now stored in Pinecone.")
-except FileNotFoundError as e:
-    print(f"Error: Ensure your JSON files are in the same folder as this script. {e}")
-except Exception as e:
-    print(f"An error occurred: {e}")
\ No newline at end of file
+        metadata = dict(item["metadata"])
+        metadata["text_content"] = text # Store text for retrieval
+        records.append({"id": item["chunk_id"], "values": list(emb.values), "metadata": metadata})
+    return records
+
+# --- Checkpoint ---
+
+class IngestState:
+    """chunk_id -> {hash, file} of everything already stored. Saved after every batch."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.chunks = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.chunks = json.load(f)
+
+    def is_current(self, chunk_id, digest):
+        return self.chunks.get(chunk_id, {}).get("hash") == digest
+
+    def mark(self, entries):
+        with self.lock:
+            for chunk_id, digest, file_path in entries:
+                self.chunks[chunk_id] = {"hash": digest, "file": file_path}
+            self._save()
+
+    def forget(self, chunk_ids):
+        with self.lock:
+            for chunk_id in chunk_ids:
+                self.chunks.pop(chunk_id, None)
+            self._save()
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.chunks, f)
+        os.replace(tmp, self.path)
+
+# --- Sinks ---
+
+class PineconeSink:
+    def __init__(self, index):
+        self.index = index
+
+    def has(self, chunk_id):
+        return True
+
+    def write(self, records):
+        # 5. Upsert in batches of 50
+        for i in range(0, len(records), 50):
+            self.index.upsert(vectors=records[i : i + 50])
+
+    def delete(self, chunk_ids):
+        if chunk_ids:
+            self.index.delete(ids=list(chunk_ids))
+
+    def finish(self):
+        pass
+
+class LocalSink:
+    """
+    Collects records for the in-process index. Unchanged chunks reuse the vectors of
+    the existing index; newly embedded records are appended to pending.jsonl first,
+    so a crashed run resumes without re-embedding them.
+    """
+
+    def __init__(self, path, quantize=False):
+        self.path = path
+        self.quantize = quantize
+        self.pending_path = os.path.join(path, "pending.jsonl")
+        self.lock = threading.Lock()
+        self.records = {}
+        os.makedirs(path, exist_ok=True)
+
+        if os.path.exists(os.path.join(path, "manifest.json")):
+            old = LocalIndex(path)
+            for i, chunk_id in enumerate(old.ids):
+                values = old.vectors[i].astype("float32")
+                if old.quantized:
+                    values = values * old.scales[i]
+                self.records[chunk_id] = {"id": chunk_id, "values": values.tolist(), "metadata": old.metadata[i]}
+        if os.path.exists(self.pending_path):
+            with open(self.pending_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.records[record["id"]] = record
+
+    def has(self, chunk_id):
+        return chunk_id in self.records
+
+    def write(self, records):
+        with self.lock:
+            with open(self.pending_path, 'a', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    self.records[record["id"]] = record
+
+    def delete(self, chunk_ids):
+        with self.lock:
+            for chunk_id in chunk_ids:
+                self.records.pop(chunk_id, None)
+
+    def finish(self):
+        records = list(self.records.values())
+        LocalIndex.build(
+            self.path,
+            ids=[r["id"] for r in records],
+            vectors=[r["values"] for r in records],
+            metadata=[r["metadata"] for r in records],
+            quantize=self.quantize,
+        )
+        if os.path.exists(self.pending_path):
+            os.remove(self.pending_path)
+        print(f"Built local index with {len(records)} chunks at {self.path} (int8: {self.quantize})")
+
+class LexicalBuilder:
+    """
+    Collects every chunk read (embedded or skipped) for the BM25 index. Chunks of files
+    that were not part of this run are carried over from the existing index, so
+    ingesting one file does not drop the others.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.docs = {}  # chunk_id -> (text, metadata, file)
+        self.old = BM25Index(path) if os.path.exists(os.path.join(path, "manifest.json")) else None
+
+    def add(self, item, file_path):
+        metadata = dict(item["metadata"])
+        metadata["text_content"] = chunk_text(item)
+        self.docs[item["chunk_id"]] = (metadata["text_content"], metadata, file_path)
+
+    def finish(self, file_paths):
+        if self.old is not None:
+            processed = set(file_paths)
+            for chunk_id, metadata, file_path in zip(self.old.ids, self.old.metadata, self.old.files):
+                if file_path not in processed and chunk_id not in self.docs:
+                    self.docs[chunk_id] = (metadata.get("text_content", ""), metadata, file_path)
+
+        ids = list(self.docs)
+        index = BM25Index.build(
+            self.path,
+            ids=ids,
+            texts=[self.docs[i][0] for i in ids],
+            metadata=[self.docs[i][1] for i in ids],
+            files=[self.docs[i][2] for i in ids],
+        )
+        print(f"Built BM25 index with {len(ids)} chunks and {index.manifest['terms']} terms at {self.path}")
+
+def build_lexical_only(file_paths, lexical):
+    """BM25 index without any embedding calls."""
+    for file_path in file_paths:
+        print(f"Processing {file_path}...")
+        for item in iter_chunks(file_path):
+            lexical.add(item, file_path)
+    lexical.finish(file_paths)
+
+# --- Pipeline ---
+
+def ingest(file_paths, sink, state, batch_size=EMBED_BATCH_SIZE, concurrency=EMBED_CONCURRENCY, lexical=None):
+    """
+    Streams chunks from the files, skips the ones whose content hash is unchanged,
+    embeds the rest in batches (several calls in flight) and hands every embedded
+    batch straight to an upsert pool, so storing overlaps with embedding.
+    With a LexicalBuilder, the BM25 index is rebuilt from the same pass over the files.
+    """
+    stats = {"embedded": 0, "skipped": 0, "deleted": 0}
+    seen = set()
+    embed_pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="embed")
+    upsert_pool = ThreadPoolExecutor(max_workers=UPSERT_CONCURRENCY, thread_name_prefix="upsert")
+    in_flight = deque()
+
+    def submit(batch):
+        # Embedding runs on embed_pool; the upsert for that batch is queued on upsert_pool
+        def embed_then_queue():
+            records = embed_batch([item for item, _, _ in batch])
+            return upsert_pool.submit(write, batch, records)
+        return embed_pool.submit(embed_then_queue)
+
+    def write(batch, records):
+        sink.write(records)
+        # Only checkpoint once the batch is safely stored
+        state.mark([(item["chunk_id"], digest, file_path) for item, digest, file_path in batch])
+        return len(records)
+
+    def drain(limit):
+        # Backpressure: keep at most `limit` batches in flight
+        while len(in_flight) > limit:
+            stats["embedded"] += in_flight.popleft().result().result()
+
+    try:
+        batch = []
+        for file_path in file_paths:
+            print(f"Processing {file_path}...")
+            for item in iter_chunks(file_path):
+                chunk_id = item["chunk_id"]
+                seen.add(chunk_id)
+                if lexical is not None:
+                    lexical.add(item, file_path)
+                digest = chunk_hash(item)
+                if state.is_current(chunk_id, digest) and sink.has(chunk_id):
+                    stats["skipped"] += 1
+                    continue
+                batch.append((item, digest, file_path))
+                if len(batch) == batch_size:
+                    in_flight.append(submit(batch))
+                    batch = []
+                    drain(concurrency * 2)
+        if batch:
+            in_flight.append(submit(batch))
+        drain(0)
+
+        # Chunks that disappeared from the files we just read are removed from the index
+        processed = set(file_paths)
+        stale = [cid for cid, entry in state.chunks.items() if entry["file"] in processed and cid not in seen]
+        sink.delete(stale)
+        state.forget(stale)
+        stats["deleted"] = len(stale)
+
+        sink.finish()
+        if lexical is not None:
+            lexical.finish(file_paths)
+    finally:
+        embed_pool.shutdown(wait=True)
+        upsert_pool.shutdown(wait=True)
+
+    print(f"Embedded {stats['embedded']}, skipped {stats['skipped']} unchanged, deleted {stats['deleted']} stale chunks.")
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed the data files into a vector index.")
+    parser.add_argument("files", nargs="*", default=DATA_FILES, help="JSON chunk files (or raw .txt/.md chapters and notes) to ingest.")
+    parser.add_argument("--backend", choices=["pinecone", "local"], default="pinecone")
+    parser.add_argument("--quantize", action="store_true", help="Store local vectors as int8.")
+    parser.add_argument("--out", default=LOCAL_INDEX_DIR, help="Local index directory.")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=EMBED_CONCURRENCY)
+    parser.add_argument("--full", action="store_true", help="Ignore the checkpoint and re-embed everything.")
+    parser.add_argument("--lexical-out", default=LEXICAL_INDEX_DIR, help="BM25 index directory.")
+    parser.add_argument("--no-lexical", action="store_true", help="Do not build the BM25 index.")
+    parser.add_argument("--lexical-only", action="store_true", help="Only build the BM25 index (no embedding).")
+    args = parser.parse_args()
+
+    if args.lexical_only:
+        build_lexical_only(args.files, LexicalBuilder(args.lexical_out))
+        raise SystemExit(0)
+    lexical = None if args.no_lexical else LexicalBuilder(args.lexical_out)
+
+    if args.backend == "local":
+        sink = LocalSink(args.out, quantize=args.quantize)
+        state_path = os.path.join(args.out, "ingest_state.json")
+    else:
+        sink = PineconeSink(get_pinecone_index())
+        state_path = PINECONE_STATE_FILE
+    if args.full and os.path.exists(state_path):
+        os.remove(state_path)
+
+    try:
+        ingest(args.files, sink, IngestState(state_path), batch_size=args.batch_size,
+               concurrency=args.concurrency, lexical=lexical)
+        print(f"\nAll data is now stored in {'the local index' if args.backend == 'local' else 'Pinecone'}.")
+    except FileNotFoundError as e:
+        print(f"Error: Ensure your JSON files are in the same folder as this script. {e}")
+    except Exception as e:
+        print(f"An error occurred (re-run to resume from the last checkpoint): {e}")